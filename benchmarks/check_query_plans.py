@@ -0,0 +1,214 @@
+"""
+查询计划检查：确保 Database 的每个方法都能走索引。
+
+在一个临时数据库上应用全部迁移，逐个调用 Database 的公开数据方法，
+通过 SQLite 的 trace 回调收集它实际执行的每一条 SQL，
+再对每条 SQL 运行 EXPLAIN QUERY PLAN。只要出现全表扫描（SCAN）或临时排序就判定失败，
+以非零状态码退出，便于在 CI 或发布前运行。
+缺少示例参数或调用出错的方法同样判定失败，除非在 EXPECTED_ERRORS 中写明原因。
+同时检查查询统计：执行了 SQL 的方法必须以自己的方法名出现在 get_query_stats() 中，
+而不是记在 pipeline 等内部执行接口名下。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.check_query_plans
+"""
+
+import asyncio
+import inspect
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+# 不属于数据访问 API 的方法（生命周期、备份、迁移，以及执行任意语句的流水线接口）
+SKIPPED_METHODS = {
+    "connect",
+    "close",
+    "cleanup_old_backups",
+    "backup_database",
+    "start_backup_loop",
+    "start_metrics_log_loop",
+    "start_compaction_loop",
+    "pipeline",
+    # 等待数据回填的完成标记，不执行查询
+    "wait_for_migration",
+}
+
+# 有意读取整张表的方法及原因
+ALLOWED_FULL_SCANS = {
+    "get_all_followed_competitions": "比赛检查循环需要遍历所有被关注的比赛",
+    "get_all_follower_edges": "启动时构建内存关注者索引，需要读取全部关注关系",
+}
+
+# 已知无法检查的方法及原因；其余方法缺少示例参数或执行出错都判定为失败
+EXPECTED_ERRORS = {
+    "add_thread_to_join_queue": "thread_join_queue 表没有对应的迁移，相关方法目前没有调用方",
+    "get_oldest_thread_from_join_queue": "thread_join_queue 表没有对应的迁移，相关方法目前没有调用方",
+    "update_join_queue_status": "thread_join_queue 表没有对应的迁移，相关方法目前没有调用方",
+}
+
+# 按参数名提供调用示例参数；新方法若使用了新的参数名，需要在这里补充
+SAMPLE_ARGUMENTS = {
+    "user_id": 1,
+    "author_id": 2,
+    "author_name": "author",
+    "message_id": 3,
+    "channel_id": 4,
+    "guild_id": 5,
+    "thread_id": 6,
+    "post_id": 7,
+    "thread_name": "thread",
+    "initial_ids": ["a"],
+    "new_ids": ["a", "b"],
+    "author_ids": [2],
+    "thread_ids": [6],
+    "member_ids": [1],
+    "added_at": datetime.now(timezone.utc),
+    "since_timestamp": datetime(1970, 1, 1),
+    # since 为 None 时使用数据库中的上次查看时间，加上 mark_viewed_at 会执行完整的流水线
+    "since": None,
+    "mark_viewed_at": datetime.now(timezone.utc),
+    "is_subscribed": True,
+    "followed_keywords": ["kw"],
+    "blocked_keywords": ["bad"],
+    "search_content": "a kw title",
+    "rule": "kw AND NOT tag:bad",
+    "tag_ids": [11, 12],
+    "available_tag_ids": [11, 12, 13],
+    "include_tags": 0b01,
+    "exclude_tags": 0b10,
+    "exclude_user_id": 0,
+    "limit": 10,
+    "page_size": 10,
+    "cursor": (1704067200000, 1),
+    "status": "pending",
+    "policy": None,
+    "authors": [(2, "author")],
+    "posts": [(7, 2)],
+    "last_views": [(1, datetime.now(timezone.utc))],
+    "favorites_data": [(1, 8, "thread", 5, datetime.now(timezone.utc))],
+}
+
+
+def _full_scans(plan_rows: list[tuple]) -> list[str]:
+    """
+    从 EXPLAIN QUERY PLAN 的输出中找出全表/全索引扫描，
+    以及需要临时 B 树排序的查询（说明 ORDER BY 没有被索引覆盖）。
+    """
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        if detail.startswith(("SCAN CONSTANT ROW", "SCAN (subquery")):
+            # 常量行和已物化的子查询结果不是对表的扫描
+            continue
+        if detail.startswith("SCAN"):
+            scans.append(detail)
+        elif detail.startswith("USE TEMP B-TREE"):
+            scans.append(detail)
+    return scans
+
+
+async def _collect_statements(
+    db_path: str,
+) -> tuple[dict[str, list[str] | Exception], list[str]]:
+    from src.core.database import Database
+
+    os.environ["DB_NAME"] = db_path
+    # 让所有查询都经过同一个连接，以便 trace 回调能看到全部语句
+    os.environ["DB_READ_POOL_SIZE"] = "0"
+    db = Database()
+    await db.connect()
+
+    statements: list[str] = []
+    assert db.conn is not None
+    await db.conn.set_trace_callback(statements.append)
+
+    collected: dict[str, list[str] | Exception] = {}
+    # 执行了 SQL、查询统计却没有记在自己名下的方法
+    unlabelled: list[str] = []
+    try:
+        # 按定义顺序调用，使 add_post 等方法能用上 ensure_author_exists 写入的前置数据
+        for name, func in vars(Database).items():
+            if name.startswith("_") or name in SKIPPED_METHODS:
+                continue
+            if not inspect.iscoroutinefunction(func):
+                continue
+            method = getattr(db, name)
+            params = inspect.signature(method).parameters
+            missing = [p for p in params if p not in SAMPLE_ARGUMENTS]
+            if missing:
+                collected[name] = KeyError(f"缺少示例参数: {missing}")
+                continue
+            statements.clear()
+            before = db.metrics.methods.get(name)
+            calls_before = before.calls if before else 0
+            try:
+                await method(**{p: SAMPLE_ARGUMENTS[p] for p in params})
+            except sqlite3.OperationalError as e:
+                # 例如方法引用的表在迁移中并不存在
+                collected[name] = e
+                continue
+            except sqlite3.Error:
+                # 约束冲突等不影响查询计划，已执行的语句照常检查
+                pass
+            except Exception as e:
+                collected[name] = e
+                continue
+            collected[name] = list(dict.fromkeys(statements))
+            after = db.metrics.methods.get(name)
+            if statements and (after.calls if after else 0) == calls_before:
+                unlabelled.append(name)
+    finally:
+        await db.close()
+    return collected, unlabelled
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plans.db")
+        collected, unlabelled = asyncio.run(_collect_statements(db_path))
+
+        failures = 0
+        errors = 0
+        explain_conn = sqlite3.connect(db_path)
+        for name in sorted(collected):
+            result = collected[name]
+            if isinstance(result, Exception):
+                if name in EXPECTED_ERRORS:
+                    print(f"SKIP  {name}: {EXPECTED_ERRORS[name]} ({result})")
+                else:
+                    errors += 1
+                    print(f"FAIL  {name}: 无法检查: {result!r}")
+                continue
+            if name in EXPECTED_ERRORS:
+                errors += 1
+                print(f"FAIL  {name}: 已能正常检查，请从 EXPECTED_ERRORS 中移除")
+                continue
+            scans = []
+            for sql in result:
+                keyword = sql.lstrip().split(None, 1)[0].upper()
+                if keyword in {"PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE"}:
+                    continue
+                plan = explain_conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+                scans.extend(_full_scans(plan))
+            if scans and name not in ALLOWED_FULL_SCANS:
+                failures += 1
+                print(f"FAIL  {name}: {'; '.join(scans)}")
+            elif scans:
+                print(f"ALLOW {name}: {ALLOWED_FULL_SCANS[name]}")
+            else:
+                print(f"OK    {name}")
+        explain_conn.close()
+
+    for name in unlabelled:
+        print(f"FAIL  {name}: 查询统计没有记在该方法名下")
+
+    print(f"\n{failures} 个方法存在全表扫描")
+    print(f"{errors} 个方法无法检查")
+    print(f"{len(unlabelled)} 个方法的查询统计标签不正确")
+    return 1 if failures or errors or unlabelled else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""
+Database 全方法规模基准测试。
+
+在临时 SQLite 文件上按比例生成接近真实分布的数据（数十万用户、数百万条关注关系、
+带关键词的频道订阅、大收藏夹、活跃帖子成员等），然后在每个数据规模下逐个调用
+Database 的公开数据方法并计时，同时记录每个方法实际执行的 SQL 及其查询计划、
+当前的迁移版本和各表索引。结果写成 JSON 报告，便于与历史报告对比，
+发现查询计划或迁移带来的性能回退。全程离线运行，不需要 Discord 连接。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.db_method_scaling --scales 0.01 0.1 1 --repeat 20 --output report.json
+
+--scales 1 对应完整规模（约 30 万用户、200 万条关注关系），生成数据需要几十秒。
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from benchmarks.check_query_plans import SKIPPED_METHODS, _full_scans
+from src.core.snowflake import snowflake_lower_bound
+
+# 基准中不调用的方法：compact 会按保留策略删除生成的数据，影响其后所有方法的测量
+BENCH_SKIPPED_METHODS = SKIPPED_METHODS | {"compact"}
+
+# 规模为 1 时各类数据的数量
+BASE_SIZES = {
+    "users": 300_000,
+    "authors": 20_000,
+    "followers": 2_000_000,
+    "author_posts": 400_000,
+    "last_views": 150_000,
+    "channels": 40,
+    "subscriptions": 30_000,
+    "favorites": 300_000,
+    # 单个重度用户的收藏数，用于测量收藏夹分页
+    "heavy_user_favorites": 20_000,
+    "active_threads": 5_000,
+    "active_members": 300_000,
+    "competitions": 1_000,
+    "competition_subscriptions": 30_000,
+}
+
+KEYWORDS = [
+    "原创", "同人", "教程", "插画", "短篇", "长篇", "完结", "连载", "汉化", "剧情",
+    "甜文", "治愈", "悬疑", "科幻", "奇幻", "日常", "搞笑", "恋爱", "冒险", "历史",
+    "guide", "fanart", "oneshot", "comic", "wip", "complete", "translation", "mod",
+    "tutorial", "music", "cosplay", "fantasy", "scifi", "mystery", "romance", "horror",
+    "sketch", "3d", "pixel", "chibi",
+]
+
+HEAVY_USER_ID = 1
+MAIN_GUILD_ID = 1
+# 只有少量数据的服务器，clear_active_thread_members 在这里执行，不会清空主服务器的数据
+SPARE_GUILD_ID = 2
+# 写入方法使用的新 ID 从这里开始，不与生成的数据冲突
+NEW_ID_BASE = 10**12
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def _seed(db_path: str, scale: float, seed: int) -> dict[str, int]:
+    """直接用 sqlite3 批量写入生成的数据（比逐条经由 Database 快得多），返回各表的行数。"""
+    sizes = {name: max(1, int(count * scale)) for name, count in BASE_SIZES.items()}
+    rng = random.Random(seed)
+    now = _now_ms()
+    day = 86_400_000
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    users, authors = sizes["users"], sizes["authors"]
+
+    def skewed(n: int) -> int:
+        # 幂律分布：少数热门作者/频道/帖子拥有大部分关注者
+        return 1 + int(n * rng.random() ** 3)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO authors (author_id, author_name, created_at) VALUES (?, ?, ?)",
+            ((a, f"author_{a}", now - rng.randrange(365 * day)) for a in range(1, authors + 1)),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO followers (user_id, author_id, followed_at) VALUES (?, ?, ?)",
+            (
+                (rng.randint(1, users), min(authors, skewed(authors)), now - rng.randrange(365 * day))
+                for _ in range(sizes["followers"])
+            ),
+        )
+        # 帖子 ID 是雪花 ID：由发帖时间加上序号低位构成
+        conn.executemany(
+            "INSERT OR IGNORE INTO author_posts (post_id, author_id) VALUES (?, ?)",
+            (
+                (snowflake_lower_bound(now - rng.randrange(90 * day)) + p % 4096, min(authors, skewed(authors)))
+                for p in range(1, sizes["author_posts"] + 1)
+            ),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_last_view (user_id, last_viewed_at) VALUES (?, ?)",
+            (
+                (rng.randint(1, users), now - rng.randrange(30 * day))
+                for _ in range(sizes["last_views"])
+            ),
+        )
+
+        channels = sizes["channels"]
+        subscriptions = {
+            (rng.randint(1, users), min(channels, skewed(channels)))
+            for _ in range(sizes["subscriptions"])
+        }
+        conn.executemany(
+            "INSERT INTO keyword_subscriptions (user_id, channel_id, is_subscribed) VALUES (?, ?, ?)",
+            ((u, c, int(rng.random() < 0.6)) for u, c in subscriptions),
+        )
+        keyword_rows = []
+        for user_id, channel_id in subscriptions:
+            for keyword in rng.sample(KEYWORDS, rng.randint(0, 5)):
+                keyword_rows.append((channel_id, "followed", keyword, user_id))
+            for keyword in rng.sample(KEYWORDS, rng.randint(0, 2)):
+                keyword_rows.append((channel_id, "blocked", keyword, user_id))
+        conn.executemany(
+            "INSERT OR IGNORE INTO subscription_keywords (channel_id, kind, keyword, user_id) VALUES (?, ?, ?, ?)",
+            keyword_rows,
+        )
+
+        favorites = [
+            (HEAVY_USER_ID, t, f"thread_{t}", MAIN_GUILD_ID, now - t * 60_000)
+            for t in range(1, sizes["heavy_user_favorites"] + 1)
+        ]
+        threads = sizes["active_threads"] * 10
+        favorites.extend(
+            (rng.randint(2, users), rng.randint(1, threads), "thread", MAIN_GUILD_ID, now - rng.randrange(365 * day))
+            for _ in range(sizes["favorites"])
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO thread_favorites (user_id, thread_id, thread_name, guild_id, added_at) VALUES (?, ?, ?, ?, ?)",
+            favorites,
+        )
+
+        active_threads = sizes["active_threads"]
+        conn.executemany(
+            "INSERT OR IGNORE INTO active_thread_members (thread_id, user_id, guild_id, last_seen, thread_name) VALUES (?, ?, ?, ?, ?)",
+            (
+                (t, u, MAIN_GUILD_ID, now, f"thread_{t}")
+                for t, u in (
+                    (min(active_threads, skewed(active_threads)), rng.randint(1, users))
+                    for _ in range(sizes["active_members"])
+                )
+            ),
+        )
+        # 重度用户也加入一批活跃帖子，备用服务器放少量成员
+        conn.executemany(
+            "INSERT OR IGNORE INTO active_thread_members (thread_id, user_id, guild_id, last_seen, thread_name) VALUES (?, ?, ?, ?, ?)",
+            [(t, HEAVY_USER_ID, MAIN_GUILD_ID, now, f"thread_{t}") for t in range(1, min(active_threads, 200) + 1)]
+            + [(NEW_ID_BASE + t, t, SPARE_GUILD_ID, now, "spare") for t in range(1, 101)],
+        )
+
+        competitions = sizes["competitions"]
+        conn.executemany(
+            "INSERT INTO competitions (message_id, channel_id, guild_id, last_submission_ids) VALUES (?, ?, ?, ?)",
+            ((m, rng.randint(1, channels), MAIN_GUILD_ID, json.dumps([str(m)])) for m in range(1, competitions + 1)),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO competition_subscriptions (user_id, competition_message_id) VALUES (?, ?)",
+            (
+                (rng.randint(1, users), min(competitions, skewed(competitions)))
+                for _ in range(sizes["competition_subscriptions"])
+            ),
+        )
+
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in (
+            "authors",
+            "followers",
+            "author_posts",
+            "user_last_view",
+            "keyword_subscriptions",
+            "subscription_keywords",
+            "thread_favorites",
+            "active_thread_members",
+            "competitions",
+            "competition_subscriptions",
+        )
+    }
+    # 不运行 ANALYZE：线上数据库没有统计信息，查询计划应与线上一致
+    conn.close()
+    return counts
+
+
+@dataclass
+class _Context:
+    """从生成的数据中挑出的“热点”对象，基准调用都落在这些最重的路径上。"""
+
+    hot_author: int
+    busy_follower: int
+    busy_channel: int
+    busy_channel_user: int
+    hot_competition: int
+    active_user: int
+    favorite_cursor: tuple[int, int]
+    now: datetime
+    # 当前时刻的雪花 ID，写入的新帖子都在此之后
+    new_post_id: int
+
+
+def _hot_spots(db_path: str) -> _Context:
+    conn = sqlite3.connect(db_path)
+    try:
+        one = lambda sql: conn.execute(sql).fetchone()  # noqa: E731
+        busy_channel = one(
+            "SELECT channel_id FROM keyword_subscriptions GROUP BY channel_id ORDER BY COUNT(*) DESC LIMIT 1"
+        )[0]
+        return _Context(
+            hot_author=one(
+                "SELECT author_id FROM followers GROUP BY author_id ORDER BY COUNT(*) DESC LIMIT 1"
+            )[0],
+            busy_follower=one(
+                "SELECT user_id FROM followers GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+            )[0],
+            busy_channel=busy_channel,
+            busy_channel_user=one(
+                f"SELECT user_id FROM subscription_keywords WHERE channel_id = {busy_channel} "
+                "GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+            )[0],
+            hot_competition=one(
+                "SELECT competition_message_id FROM competition_subscriptions "
+                "GROUP BY competition_message_id ORDER BY COUNT(*) DESC LIMIT 1"
+            )[0],
+            active_user=HEAVY_USER_ID,
+            # 重度用户收藏夹的中间位置，前后翻页都有数据
+            favorite_cursor=one(
+                f"SELECT added_at, id FROM thread_favorites WHERE user_id = {HEAVY_USER_ID} "
+                f"ORDER BY added_at DESC, id DESC LIMIT 1 OFFSET "
+                f"(SELECT COUNT(*) / 2 FROM thread_favorites WHERE user_id = {HEAVY_USER_ID})"
+            ),
+            now=datetime.now(timezone.utc),
+            new_post_id=snowflake_lower_bound(_now_ms()),
+        )
+    finally:
+        conn.close()
+
+
+# 按参数名提供参数，i 为调用序号；写入方法通过 i 使用不同的新 ID，保证每次调用都真正写入
+Provider = Callable[[_Context, int], Any]
+
+ARGUMENT_PROVIDERS: dict[str, Provider] = {
+    "user_id": lambda c, i: HEAVY_USER_ID,
+    "author_id": lambda c, i: c.hot_author,
+    "author_name": lambda c, i: "author_renamed",
+    "message_id": lambda c, i: c.hot_competition,
+    "channel_id": lambda c, i: c.busy_channel,
+    "guild_id": lambda c, i: MAIN_GUILD_ID,
+    "thread_id": lambda c, i: NEW_ID_BASE + 500_000 + i,
+    "post_id": lambda c, i: c.new_post_id + i,
+    "thread_name": lambda c, i: "bench thread",
+    "initial_ids": lambda c, i: ["a"],
+    "new_ids": lambda c, i: ["a", str(i)],
+    "author_ids": lambda c, i: [c.hot_author],
+    "thread_ids": lambda c, i: [NEW_ID_BASE + 600_000 + i * 100 + k for k in range(100)],
+    "member_ids": lambda c, i: list(range(1, 101)),
+    "created_at": lambda c, i: c.now,
+    "added_at": lambda c, i: c.now,
+    "since_timestamp": lambda c, i: c.now - timedelta(days=30),
+    "since": lambda c, i: None,
+    "mark_viewed_at": lambda c, i: c.now,
+    "is_subscribed": lambda c, i: True,
+    "followed_keywords": lambda c, i: KEYWORDS[:5],
+    "blocked_keywords": lambda c, i: KEYWORDS[-2:],
+    "search_content": lambda c, i: "原创 长篇 连载 fantasy complete 第二章",
+    "rule": lambda c, i: "原创 (同人 OR 插画) NOT tag:r18",
+    "tag_ids": lambda c, i: [11, 12],
+    "available_tag_ids": lambda c, i: list(range(11, 31)),
+    "include_tags": lambda c, i: 0b01,
+    "exclude_tags": lambda c, i: 0b10,
+    "exclude_user_id": lambda c, i: 0,
+    "limit": lambda c, i: 10,
+    "page_size": lambda c, i: 10,
+    "cursor": lambda c, i: c.favorite_cursor,
+    "status": lambda c, i: "pending",
+    "authors": lambda c, i: [(c.hot_author, "author_renamed"), (1, "author_1")],
+    "posts": lambda c, i: [(c.new_post_id + 100_000 + i * 100 + k, c.hot_author) for k in range(100)],
+    "last_views": lambda c, i: [(u, c.now) for u in range(1, 101)],
+    "favorites_data": lambda c, i: [
+        (HEAVY_USER_ID, NEW_ID_BASE + 600_000 + i * 100 + k, "bench thread", MAIN_GUILD_ID, c.now)
+        for k in range(100)
+    ],
+}
+
+# 个别方法需要与默认值不同的参数
+METHOD_OVERRIDES: dict[str, dict[str, Provider]] = {
+    "add_follower": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "remove_follower": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "get_followed_authors": {"user_id": lambda c, i: c.busy_follower},
+    "get_followed_authors_with_names": {"user_id": lambda c, i: c.busy_follower},
+    "get_followed_authors_with_new_posts": {"user_id": lambda c, i: c.busy_follower},
+    "add_competition_subscriber": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "remove_competition_subscriber": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "ensure_competition_exists": {"message_id": lambda c, i: NEW_ID_BASE + i},
+    "get_keyword_subscription": {"user_id": lambda c, i: c.busy_channel_user},
+    "get_subscribed_channels_for_user": {"user_id": lambda c, i: c.busy_channel_user},
+    "upsert_keyword_subscription": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "set_subscription_keywords": {"user_id": lambda c, i: NEW_ID_BASE + i},
+    "add_favorite": {"thread_id": lambda c, i: NEW_ID_BASE + 700_000 + i},
+    "remove_favorite": {"thread_id": lambda c, i: NEW_ID_BASE + 700_000 + i},
+    "update_active_thread_members": {"thread_id": lambda c, i: 1},
+    "remove_active_thread_member": {"thread_id": lambda c, i: i + 1},
+    "clear_active_thread_members": {"guild_id": lambda c, i: SPARE_GUILD_ID},
+}
+
+
+def _arguments(name: str, params, ctx: _Context, i: int) -> dict[str, Any]:
+    overrides = METHOD_OVERRIDES.get(name, {})
+    return {p: overrides.get(p, ARGUMENT_PROVIDERS[p])(ctx, i) for p in params}
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _schema_snapshot(db_path: str) -> dict[str, Any]:
+    conn = sqlite3.connect(db_path)
+    try:
+        indexes: dict[str, list[str]] = {}
+        for table, sql in conn.execute(
+            "SELECT tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY tbl_name, name"
+        ):
+            indexes.setdefault(table, []).append(sql)
+        return {
+            "user_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+            "indexes": indexes,
+        }
+    finally:
+        conn.close()
+
+
+def _explain(db_path: str, statements: list[str]) -> tuple[list[str], list[str]]:
+    """返回 (查询计划, 其中的全表扫描/临时排序)。"""
+    conn = sqlite3.connect(db_path)
+    plan: list[str] = []
+    scans: list[str] = []
+    try:
+        for sql in statements:
+            keyword = sql.lstrip().split(None, 1)[0].upper()
+            if keyword in {"PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE"}:
+                continue
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            plan.extend(row[-1] for row in rows)
+            scans.extend(_full_scans(rows))
+    finally:
+        conn.close()
+    return plan, scans
+
+
+async def _set_trace(db, callback) -> None:
+    connections = [db.conn]
+    if db.read_pool is not None:
+        connections.extend(db.read_pool._connections)
+    for conn in connections:
+        await conn.set_trace_callback(callback)
+
+
+async def _bench_methods(db_path: str, ctx: _Context, repeat: int) -> dict[str, dict]:
+    from src.core.database import Database
+
+    db = Database()
+    await db.connect()
+    results: dict[str, dict] = {}
+    try:
+        # 先跑只读方法，再跑写入方法，避免写入改变读取时的数据分布
+        methods = [
+            (name, func)
+            for name, func in vars(Database).items()
+            if not name.startswith("_")
+            and name not in BENCH_SKIPPED_METHODS
+            and inspect.iscoroutinefunction(func)
+        ]
+        methods.sort(key=lambda item: not item[0].startswith("get_"))
+        for name, _ in methods:
+            method = getattr(db, name)
+            params = list(inspect.signature(method).parameters)
+            missing = [p for p in params if p not in ARGUMENT_PROVIDERS]
+            if missing:
+                results[name] = {"error": f"缺少参数提供函数: {missing}"}
+                continue
+
+            statements: list[str] = []
+            await _set_trace(db, statements.append)
+            try:
+                started = time.perf_counter()
+                await method(**_arguments(name, params, ctx, 0))
+                first_ms = (time.perf_counter() - started) * 1000
+            except sqlite3.Error as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            finally:
+                await _set_trace(db, None)
+
+            samples: list[float] = []
+            for i in range(1, repeat + 1):
+                started = time.perf_counter()
+                await method(**_arguments(name, params, ctx, i))
+                samples.append((time.perf_counter() - started) * 1000)
+
+            plan, scans = _explain(db_path, list(dict.fromkeys(statements)))
+            results[name] = {
+                "first_ms": round(first_ms, 3),
+                "mean_ms": round(statistics.fmean(samples), 3),
+                "p50_ms": round(statistics.median(samples), 3),
+                "p95_ms": round(_percentile(samples, 95), 3),
+                "max_ms": round(max(samples), 3),
+                "calls": repeat,
+                "plan": plan,
+                "full_scans": scans,
+            }
+            print(
+                f"  {name:<36} p50 {results[name]['p50_ms']:>9.3f}ms "
+                f"p95 {results[name]['p95_ms']:>9.3f}ms"
+                + ("  [SCAN]" if scans else "")
+            )
+    finally:
+        await db.close()
+    return results
+
+
+async def _run_scale(scale: float, args: argparse.Namespace) -> dict:
+    from src.core.database import Database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        os.environ["DB_NAME"] = db_path
+
+        # 在空库上应用全部迁移并计时
+        started = time.perf_counter()
+        db = Database()
+        await db.connect()
+        await db.close()
+        migration_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        row_counts = await asyncio.to_thread(_seed, db_path, scale, args.seed)
+        seed_seconds = time.perf_counter() - started
+        ctx = _hot_spots(db_path)
+        print(
+            f"规模 {scale}: 生成数据 {seed_seconds:.1f}s, "
+            f"followers={row_counts['followers']}, thread_favorites={row_counts['thread_favorites']}"
+        )
+
+        methods = await _bench_methods(db_path, ctx, args.repeat)
+        return {
+            "scale": scale,
+            "row_counts": row_counts,
+            "migration_seconds": round(migration_seconds, 3),
+            "seed_seconds": round(seed_seconds, 3),
+            "db_bytes": os.path.getsize(db_path),
+            "schema": _schema_snapshot(db_path),
+            "methods": methods,
+        }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.01, 0.1])
+    parser.add_argument("--repeat", type=int, default=20, help="每个方法在预热调用之后的调用次数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="db_method_scaling.json", help="JSON 报告的输出路径")
+    args = parser.parse_args()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "settings": {
+            key: os.environ[key]
+            for key in sorted(os.environ)
+            if key.startswith("DB_") and key != "DB_NAME"
+        },
+        "scales": [],
+    }
+    for scale in args.scales:
+        report["scales"].append(await _run_scale(scale, args))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
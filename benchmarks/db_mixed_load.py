@@ -0,0 +1,145 @@
+"""
+混合读写负载下的数据库延迟基准测试。
+
+对比「所有查询都走唯一写连接」(DB_READ_POOL_SIZE=0) 与「只读连接池」两种配置，
+在并发的关注/取关写入背景下，测量通知热路径和收藏夹分页查询的 p50/p99 延迟。
+加上 --memory-baseline 时，还会用纯内存后端跑同样的负载，作为不含磁盘 I/O 的对照基线。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.db_mixed_load --pool-sizes 0 3 --operations 5000 --memory-baseline
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _seed(db, authors: int, followers_per_author: int, favorites: int) -> None:
+    from src.core.database import Database
+
+    for author_id in range(1, authors + 1):
+        await db.ensure_author_exists(author_id, f"author_{author_id}")
+        followers = [
+            100_000 + author_id * followers_per_author + i
+            for i in range(followers_per_author)
+        ]
+        if isinstance(db, Database):
+            await db._executemany(
+                "INSERT OR IGNORE INTO followers (user_id, author_id) VALUES (?, ?)",
+                [(user_id, author_id) for user_id in followers],
+            )
+        else:
+            for user_id in followers:
+                await db.add_follower(user_id, author_id, f"author_{author_id}")
+    now = datetime.now(timezone.utc)
+    await db.add_favorites_in_batch(
+        [
+            (1, 10_000 + i, f"thread_{i}", 1, now - timedelta(minutes=i))
+            for i in range(favorites)
+        ]
+    )
+
+
+async def _run_scenario(pool_size: Optional[int], args: argparse.Namespace) -> dict:
+    """pool_size 为 None 时使用纯内存后端。"""
+    from src.core.database import Database
+    from src.core.memory_database import InMemoryDatabase
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_NAME"] = os.path.join(tmp, "bench.db")
+        os.environ["DB_READ_POOL_SIZE"] = str(pool_size or 0)
+        db = InMemoryDatabase() if pool_size is None else Database()
+        await db.connect()
+        try:
+            await _seed(db, args.authors, args.followers, args.favorites)
+            rng = random.Random(args.seed)
+            # 与 FavoritesService 一样，页边界索引只构建一次并缓存
+            boundaries = await db.get_user_favorites_page_boundaries(1, 10)
+            read_latencies: list[float] = []
+            write_latencies: list[float] = []
+
+            async def one_operation() -> None:
+                roll = rng.random()
+                start = time.perf_counter()
+                if roll < args.write_ratio:
+                    user_id = rng.randint(1, 50_000)
+                    author_id = rng.randint(1, args.authors)
+                    if rng.random() < 0.5:
+                        await db.add_follower(user_id, author_id, f"author_{author_id}")
+                    else:
+                        await db.remove_follower(user_id, author_id)
+                    write_latencies.append(time.perf_counter() - start)
+                    return
+                if roll < args.write_ratio + (1 - args.write_ratio) / 2:
+                    await db.get_followers_for_author(rng.randint(1, args.authors))
+                else:
+                    await db.get_user_favorites_after(1, 10, rng.choice(boundaries))
+                read_latencies.append(time.perf_counter() - start)
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def bounded() -> None:
+                async with semaphore:
+                    await one_operation()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(bounded() for _ in range(args.operations)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await db.close()
+
+    return {
+        "pool_size": "mem" if pool_size is None else pool_size,
+        "ops_per_sec": args.operations / elapsed,
+        "read_p50_ms": statistics.median(read_latencies) * 1000,
+        "read_p99_ms": _percentile(read_latencies, 99) * 1000,
+        "write_p50_ms": statistics.median(write_latencies) * 1000,
+        "write_p99_ms": _percentile(write_latencies, 99) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 3])
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--followers", type=int, default=500)
+    parser.add_argument("--favorites", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--memory-baseline", action="store_true", help="额外用纯内存后端跑一遍作为对照"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'pool':>5} {'ops/s':>10} {'read p50':>10} {'read p99':>10} "
+        f"{'write p50':>10} {'write p99':>10}"
+    )
+    scenarios: list[Optional[int]] = list(args.pool_sizes)
+    if args.memory_baseline:
+        scenarios.append(None)
+    for pool_size in scenarios:
+        r = await _run_scenario(pool_size, args)
+        print(
+            f"{r['pool_size']:>5} {r['ops_per_sec']:>10.0f} "
+            f"{r['read_p50_ms']:>8.2f}ms {r['read_p99_ms']:>8.2f}ms "
+            f"{r['write_p50_ms']:>8.2f}ms {r['write_p99_ms']:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+内存关注者索引基准测试。
+
+在临时 SQLite 文件上生成关注关系（作者热度服从 Zipf 分布：少数热门作者拥有大量关注者），
+然后比较新帖通知解析收件人的两种方式：每次查询数据库 (get_followers_for_author)，
+与 AuthorFollowService 的内存索引。报告索引的构建耗时、内存占用（并与 dict[int, set[int]] 对比），
+以及按作者热度抽样的查找延迟 p50/p99。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.follower_index --authors 20000 --users 300000 --edges 2000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _set_index_bytes(edges: list[tuple[int, int]]) -> int:
+    """同样的数据存为 dict[int, set[int]] 时的内存占用，作为对照。"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    index: dict[int, set[int]] = {}
+    for author_id, user_id in edges:
+        index.setdefault(author_id, set()).add(user_id)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+    return retained - before
+
+
+async def _seed(db, args: argparse.Namespace, rng: random.Random) -> list[int]:
+    """生成作者和关注关系，返回按热度排序的作者 ID（第一个最热门）。"""
+    # 作者和用户使用雪花 ID 量级的整数，与线上一致（影响 int 对象和数组的大小）
+    base = 10**17
+    author_ids = [base + i for i in range(args.authors)]
+    await db.upsert_authors_in_batch([(a, f"author_{a}") for a in author_ids])
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.authors)]
+    edges: set[tuple[int, int]] = set()
+    while len(edges) < args.edges:
+        batch = rng.choices(author_ids, weights, k=args.edges - len(edges))
+        edges.update(
+            (base * 2 + rng.randrange(args.users), author_id) for author_id in batch
+        )
+    rows = list(edges)
+    for start in range(0, len(rows), 50_000):
+        await db._executemany(
+            "INSERT OR IGNORE INTO followers (user_id, author_id) VALUES (?, ?)",
+            rows[start : start + 50_000],
+        )
+    return author_ids
+
+
+async def run(args: argparse.Namespace) -> None:
+    from src.core.database import Database
+    from src.modules.author_follow.services.author_follow_service import (
+        AuthorFollowService,
+    )
+    from src.modules.author_follow.services.follower_index import FollowerIndex
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_NAME"] = os.path.join(tmp, "bench.db")
+        os.environ["DB_STARTUP_SELF_CHECK"] = "0"
+        db = Database()
+        await db.connect()
+        try:
+            print("生成数据...")
+            author_ids = await _seed(db, args, rng)
+            service = AuthorFollowService(db, follower_index=FollowerIndex())
+
+            started = time.perf_counter()
+            await service.build_follower_index()
+            build_seconds = time.perf_counter() - started
+            stats = service.get_follower_index_stats()
+            assert stats is not None
+            edges = await db.get_all_follower_edges()
+            set_bytes = _set_index_bytes(edges)
+
+            # 新帖按作者热度到来：热门作者发帖更频繁
+            weights = [1 / (rank + 1) ** args.zipf for rank in range(args.authors)]
+            sample = rng.choices(author_ids, weights, k=args.lookups)
+            latencies: dict[str, list[float]] = {"database": [], "index": []}
+            for author_id in sample:
+                started = time.perf_counter()
+                from_db = await db.get_followers_for_author(author_id)
+                latencies["database"].append(time.perf_counter() - started)
+                started = time.perf_counter()
+                from_index = await service.get_author_followers(author_id)
+                latencies["index"].append(time.perf_counter() - started)
+                assert sorted(from_db) == from_index
+            hit_rate = service.get_follower_index_stats()["hit_rate"]
+        finally:
+            await db.close()
+
+    print(f"\n关注关系 {stats['edges']:,} 条，作者 {stats['authors']:,} 位")
+    print(f"索引构建（含读取全表）: {build_seconds:.2f}s，其中构建 {stats['load_seconds']:.2f}s")
+    print(
+        f"内存: 索引 {stats['memory_bytes'] / 2**20:.1f} MiB，"
+        f"dict[int, set[int]] {set_bytes / 2**20:.1f} MiB"
+    )
+    print(f"\n{'方式':<12}{'p50':>12}{'p99':>12}")
+    for name, samples in latencies.items():
+        print(
+            f"{name:<12}{statistics.median(samples) * 1e6:>10.1f}us"
+            f"{_percentile(samples, 99) * 1e6:>10.1f}us"
+        )
+    print(f"\n命中率: {hit_rate}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--authors", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=300_000)
+    parser.add_argument("--edges", type=int, default=500_000, help="关注关系条数")
+    parser.add_argument("--zipf", type=float, default=1.1, help="作者热度的 Zipf 指数")
+    parser.add_argument("--lookups", type=int, default=2000, help="抽样查找次数")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+面板打开延迟基准测试：流水线查询前后对比。
+
+「我的关注」面板 (ProfileService.get_user_profile_data) 和关键词修改 (SubscriptionService.update_subscription)
+原先分别需要多次 await 数据库，每次都要经过 aiosqlite 工作线程往返一次。
+这里在同一个数据库上交替执行旧流程（按改动前的调用顺序逐条 await）和现在的服务方法，
+统计每次打开面板的 p50/p99 延迟，以及每次占用的工作线程往返次数。
+可以加上 --background-writes 在后台持续写入，模拟面板打开时组提交写入器正忙的情况。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.panel_latency --opens 2000 --followed 50 --write-behind both
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+from src.core.snowflake import snowflake_after
+
+USER_ID = 1
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class _HopCounter:
+    """统计 aiosqlite 工作线程往返次数（包括写连接和只读连接）。"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = aiosqlite.Connection._execute
+
+    def __enter__(self) -> "_HopCounter":
+        counter = self
+        original = self._original
+
+        async def counting_execute(conn, fn, *args, **kwargs):
+            counter.count += 1
+            return await original(conn, fn, *args, **kwargs)
+
+        aiosqlite.Connection._execute = counting_execute
+        return self
+
+    def __exit__(self, *exc) -> None:
+        aiosqlite.Connection._execute = self._original
+
+
+async def _seed(db, followed: int, posts_per_author: int) -> None:
+    now = datetime.now(timezone.utc)
+    await db.upsert_authors_in_batch(
+        [(author_id, f"author_{author_id}") for author_id in range(2, followed + 2)]
+    )
+    await db._executemany(
+        "INSERT OR IGNORE INTO followers (user_id, author_id) VALUES (?, ?)",
+        [(USER_ID, author_id) for author_id in range(2, followed + 2)],
+    )
+    await db.add_posts_in_batch(
+        [
+            (snowflake_after(now - timedelta(hours=k, minutes=author_id)), author_id)
+            for author_id in range(2, followed + 2)
+            for k in range(posts_per_author)
+        ]
+    )
+    await db.update_last_views_in_batch([(USER_ID, now - timedelta(days=1))])
+    await db.upsert_keyword_subscription(USER_ID, 100, True, ["原创"], ["广告"])
+
+
+# --- 改动前的流程，调用顺序与原来的服务方法相同 ---
+
+
+async def _legacy_profile(db, write_behind) -> list[dict]:
+    if write_behind is not None:
+        last_view_time = write_behind.pending_last_view(USER_ID)
+        if last_view_time is None:
+            last_view_time = await db.get_last_view(USER_ID)
+        write_behind.stamp_last_view(USER_ID, datetime.now(timezone.utc))
+    else:
+        last_view_time = await db.get_and_update_last_view(USER_ID)
+    followed_authors = await db.get_followed_authors_with_names(USER_ID)
+    if not followed_authors:
+        return []
+    author_ids = [author["author_id"] for author in followed_authors]
+    new_post_counts = await db.get_new_post_counts(author_ids, last_view_time)
+    counts = {item["author_id"]: item["new_posts_count"] for item in new_post_counts}
+    for author in followed_authors:
+        author["new_posts"] = counts.get(author["author_id"], 0)
+    followed_authors.sort(key=lambda x: x.get("new_posts", 0), reverse=True)
+    return followed_authors
+
+
+async def _legacy_update_subscription(db, followed: list[str], blocked: list[str]):
+    async with db.unit_of_work():
+        current = await db.get_keyword_subscription(USER_ID, 100)
+        is_subscribed = current.is_subscribed if current else False
+        await db.upsert_keyword_subscription(USER_ID, 100, is_subscribed, followed, blocked)
+
+
+async def _run(write_behind_enabled: bool, args: argparse.Namespace) -> dict:
+    from src.core.database import Database
+    from src.core.write_behind import WriteBehindBuffer
+    from src.modules.author_follow.services.author_follow_service import (
+        AuthorFollowService,
+    )
+    from src.modules.channel_subscription.services.subscription_service import (
+        SubscriptionService,
+    )
+    from src.modules.user_profile_feature.services.profile_service import ProfileService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_NAME"] = os.path.join(tmp, "bench.db")
+        os.environ["DB_STARTUP_SELF_CHECK"] = "0"
+        db = Database()
+        await db.connect()
+        write_behind = WriteBehindBuffer(db) if write_behind_enabled else None
+        if write_behind is not None:
+            write_behind.start()
+        try:
+            await _seed(db, args.followed, args.posts)
+            profile_service = ProfileService(db, AuthorFollowService(db), write_behind)
+            subscription_service = SubscriptionService(db)
+            rng = random.Random(args.seed)
+            keywords = ["原创", "同人", "教程", "guide", "fanart", "oneshot"]
+
+            flows: dict[str, Callable[[], Awaitable]] = {
+                "profile/before": lambda: _legacy_profile(db, write_behind),
+                "profile/after": lambda: profile_service.get_user_profile_data(USER_ID),
+                "subscription/before": lambda: _legacy_update_subscription(
+                    db, rng.sample(keywords, 2), ["广告"]
+                ),
+                "subscription/after": lambda: subscription_service.update_subscription(
+                    USER_ID, 100, rng.sample(keywords, 2), ["广告"]
+                ),
+            }
+            latencies: dict[str, list[float]] = {name: [] for name in flows}
+            hops: dict[str, int] = {name: 0 for name in flows}
+
+            stop = asyncio.Event()
+
+            async def background_writes() -> None:
+                i = 0
+                while not stop.is_set():
+                    i += 1
+                    await db.add_follower(1_000_000 + i, 2, "author_2")
+
+            writers = [
+                asyncio.create_task(background_writes())
+                for _ in range(args.background_writes)
+            ]
+            try:
+                for _ in range(args.opens):
+                    # 交替执行，让两种流程承受相同的机器与后台负载
+                    for name, flow in flows.items():
+                        with _HopCounter() as counter:
+                            started = time.perf_counter()
+                            await flow()
+                            latencies[name].append(time.perf_counter() - started)
+                        # 后台写入自身的往返也会被计入，仅在没有后台负载时统计往返次数
+                        hops[name] += counter.count
+            finally:
+                stop.set()
+                await asyncio.gather(*writers)
+        finally:
+            if write_behind is not None:
+                await write_behind.close()
+            await db.close()
+
+    return {
+        name: {
+            "p50_ms": statistics.median(samples) * 1000,
+            "p99_ms": _percentile(samples, 99) * 1000,
+            "hops": hops[name] / args.opens if not args.background_writes else None,
+        }
+        for name, samples in latencies.items()
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--opens", type=int, default=1000, help="每种流程执行的次数")
+    parser.add_argument("--followed", type=int, default=50, help="用户关注的作者数")
+    parser.add_argument("--posts", type=int, default=40, help="每位作者的帖子数")
+    parser.add_argument(
+        "--background-writes", type=int, default=0, help="后台持续写入的并发任务数"
+    )
+    parser.add_argument(
+        "--write-behind", choices=["on", "off", "both"], default="both"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    modes = {"on": [True], "off": [False], "both": [False, True]}[args.write_behind]
+    for enabled in modes:
+        results = await _run(enabled, args)
+        print(f"\n=== 延迟写入{'开启' if enabled else '关闭'} ===")
+        print(f"{'流程':<22}{'p50':>10}{'p99':>10}{'往返次数':>10}")
+        for name, r in results.items():
+            hops = f"{r['hops']:.1f}" if r["hops"] is not None else "-"
+            print(f"{name:<22}{r['p50_ms']:>8.3f}ms{r['p99_ms']:>8.3f}ms{hops:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
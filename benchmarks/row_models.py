@@ -0,0 +1,251 @@
+"""
+行模型的内存与耗时基准测试。
+
+对比两种把查询结果转换为 Python 对象的方式：旧的「每行一个 dict」映射，
+与 src.core.row_models 中基于 NamedTuple 的批量映射函数。
+覆盖四类大结果集：频道订阅（含关键词 JOIN 展开）、收藏、比赛（含 JSON 解码）和活跃帖子。
+行数据来自内存 SQLite 的真实查询（row_factory 与线上相同），只测量映射这一步：
+每个映射重复多次取最快一次的耗时，并用 tracemalloc 记录映射结果常驻的内存和映射过程的峰值内存。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.row_models --rows 10000 100000 --repeat 5
+"""
+
+import argparse
+import gc
+import json
+import random
+import sqlite3
+import time
+import tracemalloc
+from typing import Callable
+
+from src.core.row_models import (
+    active_threads_from_rows,
+    competitions_from_rows,
+    favorites_from_rows,
+    subscriptions_from_rows,
+)
+from src.core.timestamps import from_epoch_ms
+
+KEYWORDS = ["原创", "同人", "教程", "插画", "guide", "fanart", "oneshot", "comic"]
+
+
+# --- 旧的 dict 映射，与改为行模型之前的 Database 实现相同 ---
+
+
+def _legacy_subscriptions(rows) -> list[dict]:
+    subscriptions: dict[tuple[int, int], dict] = {}
+    for row in rows:
+        key = (row["user_id"], row["channel_id"])
+        subscription = subscriptions.get(key)
+        if subscription is None:
+            subscription = subscriptions[key] = {
+                "user_id": row["user_id"],
+                "channel_id": row["channel_id"],
+                "is_subscribed": bool(row["is_subscribed"]),
+                "followed_keywords": [],
+                "blocked_keywords": [],
+            }
+        if row["keyword"] is not None:
+            subscription[f"{row['kind']}_keywords"].append(row["keyword"])
+    return list(subscriptions.values())
+
+
+def _legacy_favorites(rows) -> list[dict]:
+    processed_results = []
+    for row in rows:
+        row_dict = dict(row)
+        row_dict["cursor"] = (row_dict["added_at"], row_dict.pop("id"))
+        row_dict["added_at"] = from_epoch_ms(row_dict["added_at"])
+        processed_results.append(row_dict)
+    return processed_results
+
+
+def _legacy_competitions(rows) -> list[dict]:
+    competitions = []
+    for row in rows:
+        competition_dict = dict(row)
+        competition_dict["last_submission_ids"] = json.loads(
+            competition_dict["last_submission_ids"]
+        )
+        for key in ("created_at", "updated_at"):
+            if competition_dict.get(key) is not None:
+                competition_dict[key] = from_epoch_ms(competition_dict[key])
+        competitions.append(competition_dict)
+    return competitions
+
+
+def _legacy_active_threads(rows) -> list[dict]:
+    return [dict(row) for row in rows]
+
+
+# --- 测试数据 ---
+
+
+def _build_rows(conn: sqlite3.Connection, rows: int, rng: random.Random) -> dict[str, list]:
+    """生成四类数据并用与线上相同的 SELECT 取回，返回 {数据类型: 行列表}。"""
+    now_ms = int(time.time() * 1000)
+    conn.executescript(
+        """
+        CREATE TABLE subs (user_id INTEGER, channel_id INTEGER, is_subscribed INTEGER,
+                           rule TEXT, include_tags INTEGER, exclude_tags INTEGER,
+                           kind TEXT, keyword TEXT);
+        CREATE TABLE favs (id INTEGER PRIMARY KEY, thread_id INTEGER, thread_name TEXT,
+                           guild_id INTEGER, added_at INTEGER);
+        CREATE TABLE comps (message_id INTEGER, channel_id INTEGER, guild_id INTEGER,
+                            last_submission_ids TEXT, created_at INTEGER, updated_at INTEGER);
+        CREATE TABLE threads (thread_id INTEGER, thread_name TEXT);
+        """
+    )
+    # 订阅：平均每个订阅约 2 个关键词，约四分之一没有关键词（LEFT JOIN 出一行 NULL）
+    sub_rows = []
+    user_id = 0
+    while len(sub_rows) < rows:
+        user_id += 1
+        keywords = rng.sample(KEYWORDS, rng.choice((0, 1, 2, 3, 4)))
+        if not keywords:
+            sub_rows.append((user_id, 1, 1, None, 0, 0, None, None))
+        for keyword in keywords:
+            sub_rows.append(
+                (
+                    user_id, 1, 1, None, 0, 0,
+                    "blocked" if rng.random() < 0.2 else "followed", keyword,
+                )
+            )
+    conn.executemany("INSERT INTO subs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", sub_rows[:rows])
+    conn.executemany(
+        "INSERT INTO favs (thread_id, thread_name, guild_id, added_at) VALUES (?, ?, ?, ?)",
+        (
+            (10**18 + i, f"帖子标题 {i}", 1, now_ms - rng.randrange(10**9))
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO comps VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                10**18 + i,
+                1,
+                1,
+                json.dumps([str(rng.randrange(10**6)) for _ in range(rng.randint(0, 20))]),
+                now_ms,
+                now_ms,
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO threads VALUES (?, ?)",
+        ((10**18 + i, f"活跃帖子 {i}") for i in range(rows)),
+    )
+    queries = {
+        "subscriptions": (
+            "SELECT user_id, channel_id, is_subscribed, rule, include_tags, exclude_tags,"
+            " kind, keyword FROM subs"
+        ),
+        "favorites": "SELECT id, thread_id, thread_name, guild_id, added_at FROM favs",
+        "competitions": (
+            "SELECT message_id, channel_id, guild_id, last_submission_ids, created_at, updated_at"
+            " FROM comps"
+        ),
+        "active_threads": "SELECT thread_id, thread_name FROM threads",
+    }
+    return {name: conn.execute(sql).fetchall() for name, sql in queries.items()}
+
+
+MAPPERS: dict[str, tuple[Callable, Callable]] = {
+    "subscriptions": (_legacy_subscriptions, subscriptions_from_rows),
+    "favorites": (_legacy_favorites, favorites_from_rows),
+    "competitions": (_legacy_competitions, competitions_from_rows),
+    "active_threads": (_legacy_active_threads, active_threads_from_rows),
+}
+
+
+def _best_times(mappers: list[Callable], rows: list, repeat: int) -> list[float]:
+    """
+    交替调用各个映射函数，分别取最快一次的耗时（秒）。交替执行让机器负载的波动均匀地落在每一方上；
+    与 timeit 相同，计时期间关闭循环垃圾回收，避免回收时机让对比失真。
+    """
+    best = [float("inf")] * len(mappers)
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for i, mapper in enumerate(mappers):
+                started = time.perf_counter()
+                mapper(rows)
+                best[i] = min(best[i], time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def _measure_memory(mapper: Callable, rows: list) -> dict:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = mapper(rows)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "objects": len(result),
+        "retained_bytes": retained - before,
+        "peak_bytes": peak - before,
+    }
+
+
+def run(rows: int, repeat: int, seed: int) -> dict:
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    data = _build_rows(conn, rows, random.Random(seed))
+    conn.close()
+    report = {}
+    for name, (legacy, compact) in MAPPERS.items():
+        old_time, new_time = _best_times([legacy, compact], data[name], repeat)
+        old, new = _measure_memory(legacy, data[name]), _measure_memory(compact, data[name])
+        for item, best in ((old, old_time), (new, new_time)):
+            item["best_ms"] = round(best * 1000, 3)
+            item["us_per_row"] = round(best * 1e6 / max(len(data[name]), 1), 3)
+        report[name] = {
+            "rows": len(data[name]),
+            "dict": old,
+            "row_model": new,
+            "speedup": round(old_time / max(new_time, 1e-9), 2),
+            "memory_ratio": round(
+                new["retained_bytes"] / max(old["retained_bytes"], 1), 3
+            ),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="可选：JSON 报告的输出路径")
+    args = parser.parse_args()
+
+    reports = {}
+    for rows in args.rows:
+        report = reports[rows] = run(rows, args.repeat, args.seed)
+        print(f"\n=== {rows} 行 ===")
+        print(
+            f"{'数据':<16}{'dict ms':>10}{'模型 ms':>10}{'加速':>8}"
+            f"{'dict 内存':>14}{'模型内存':>14}{'内存比':>8}"
+        )
+        for name, item in report.items():
+            print(
+                f"{name:<16}{item['dict']['best_ms']:>10.2f}{item['row_model']['best_ms']:>10.2f}"
+                f"{item['speedup']:>8.2f}{item['dict']['retained_bytes']:>14,}"
+                f"{item['row_model']['retained_bytes']:>14,}{item['memory_ratio']:>8.2f}"
+            )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+频道订阅扇出（新帖 → 需要通知的订阅者）基准测试。
+
+在临时 SQLite 文件上为每个规模（默认 1k / 10k / 100k 订阅者）各建一个论坛频道，
+订阅者的关注词、屏蔽词按中英文混合词表的 Zipf 分布抽取（少数热门词被大量用户使用，长尾词各自只有少数人），
+并按比例带有全量订阅、组合规则和标签筛选。然后在每个频道上回放同一组帖子标题和标签，
+对每个匹配引擎报告吞吐量 (帖/秒)、解析延迟 p50/p99，以及引擎预热后常驻的内存。
+各引擎对同一个帖子得到的收件人必须完全一致，否则报错退出。
+
+匹配引擎可以插拔：ENGINES 中的每一项是一个工厂，接收已填充数据的 Database，返回带有
+async process_new_thread(thread) -> list[int] 的对象（与 SubscriptionService 相同的接口）。
+新的实现在这里注册后即可用 --engines 选中，在同一份数据和帖子上对比。
+
+帖子默认随机生成；也可以用 --corpus 指定 JSON Lines 文件回放真实数据，
+每行形如 {"title": "标题", "tags": ["标签名", ...]}，不在频道标签列表中的标签名会被追加为新标签。
+
+用法 (在项目根目录执行):
+    python -m benchmarks.subscription_fanout --subscribers 1000 10000 100000 --threads 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable
+
+# 热门的中英文关键词（按常见程度排列，排名越靠前被越多用户关注）
+CHINESE_KEYWORDS = [
+    "原创", "同人", "插画", "漫画", "教程", "长篇", "短篇", "完结", "连载", "日常",
+    "奇幻", "科幻", "悬疑", "治愈", "搞笑", "古风", "校园", "恋爱", "冒险", "战斗",
+    "设定", "摸鱼", "手书", "翻译", "汉化", "攻略", "资源", "求助", "分享", "讨论",
+]
+ENGLISH_KEYWORDS = [
+    "fanart", "oneshot", "comic", "guide", "au", "crossover", "fluff", "angst", "wip",
+    "sketch", "lore", "mod", "tutorial", "speedpaint", "cosplay", "meme", "ocs", "ship",
+    "headcanon", "rewrite",
+]
+# 生成长尾词（角色名、作品名等）用的汉字和英文音节
+_HANZI = "星月云风雪花夜光影山海林川岚羽灵晴秋春夏冬梦歌雨铃"
+_SYLLABLES = ["ka", "ri", "to", "mi", "sa", "na", "lu", "vel", "dor", "ion", "ash", "ren"]
+# 标题中不构成关键词的填充词
+_CHINESE_FILLER = ["的", "第一章", "更新", "一个", "关于", "小记", "番外", "合集", "草稿"]
+_ENGLISH_FILLER = ["the", "of", "and", "part", "new", "my", "chapter", "final", "v2"]
+
+# 订阅者构成（比例）
+FULL_FEED_RATIO = 0.3  # 不设关注词，接收全部新帖
+BLOCKED_RATIO = 0.25  # 设有屏蔽词
+RULE_RATIO = 0.05  # 设有组合规则
+TAG_FILTER_RATIO = 0.1  # 设有标签筛选
+CHANNEL_TAG_COUNT = 15
+
+# 与线上一致使用雪花 ID 量级的整数
+CHANNEL_BASE_ID = 10**17
+USER_BASE_ID = 2 * 10**17
+TAG_BASE_ID = 3 * 10**17
+THREAD_BASE_ID = 4 * 10**17
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# --- 匹配引擎 ---
+
+
+def _matcher_engine(db):
+    from src.modules.channel_subscription.services.keyword_matcher import (
+        SubscriptionMatcher,
+    )
+    from src.modules.channel_subscription.services.subscription_service import (
+        SubscriptionService,
+    )
+
+    return SubscriptionService(db, SubscriptionMatcher())
+
+
+def _database_engine(db):
+    from src.modules.channel_subscription.services.subscription_service import (
+        SubscriptionService,
+    )
+
+    return SubscriptionService(db)
+
+
+ENGINES: dict[str, Callable[[Any], Any]] = {
+    # 当前实现：各频道的 Aho-Corasick 自动机 + 倒排表 + 子句/标签位掩码
+    "matcher": _matcher_engine,
+    # 不启用内存索引时的回退路径：每个帖子在 SQLite 中匹配
+    "database": _database_engine,
+}
+
+
+# --- 测试数据 ---
+
+
+class _Vocabulary:
+    """中英文混合关键词表，按 Zipf 分布抽取。"""
+
+    def __init__(self, rng: random.Random, long_tail: int, zipf: float):
+        words = list(CHINESE_KEYWORDS) + list(ENGLISH_KEYWORDS)
+        seen = set(words)
+        while len(words) < len(CHINESE_KEYWORDS) + len(ENGLISH_KEYWORDS) + long_tail:
+            if rng.random() < 0.6:
+                word = "".join(rng.choices(_HANZI, k=rng.randint(2, 3)))
+            else:
+                word = "".join(rng.choices(_SYLLABLES, k=rng.randint(2, 3)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        # 热门词与长尾词交错排名，避免中文或英文整体都排在前面
+        head = words[: len(CHINESE_KEYWORDS) + len(ENGLISH_KEYWORDS)]
+        rng.shuffle(head)
+        self.words = head + words[len(head) :]
+        self.weights = [1 / (rank + 1) ** zipf for rank in range(len(self.words))]
+        self.rng = rng
+
+    def sample(self, count: int) -> list[str]:
+        chosen: set[str] = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(self.words, self.weights, k=count - len(chosen)))
+        return list(chosen)
+
+
+def _tag_id(channel_id: int, index: int) -> int:
+    return TAG_BASE_ID + (channel_id - CHANNEL_BASE_ID) * 100 + index
+
+
+def _channel_tags(channel_id: int, rng: random.Random) -> list[SimpleNamespace]:
+    names = rng.sample(CHINESE_KEYWORDS[:20] + ENGLISH_KEYWORDS[:10], CHANNEL_TAG_COUNT)
+    return [
+        SimpleNamespace(id=_tag_id(channel_id, i), name=name)
+        for i, name in enumerate(names)
+    ]
+
+
+def _random_rule(vocab: _Vocabulary, tags: list[SimpleNamespace]) -> str:
+    a, b, c = vocab.sample(3)
+    shape = vocab.rng.randrange(3)
+    if shape == 0:
+        return f"{a} ({b} OR {c})"
+    if shape == 1:
+        return f"({a} OR {b}) NOT tag:{vocab.rng.choice(tags).name.lower()}"
+    return f'"{a} {b}" OR {c} -{vocab.rng.choice(vocab.words[:10])}'
+
+
+async def _seed_channel(
+    db,
+    channel_id: int,
+    subscribers: int,
+    tags: list[SimpleNamespace],
+    vocab: _Vocabulary,
+) -> list[int]:
+    """写入一个频道的订阅、关键词和标签位槽，返回订阅者 ID。"""
+    rng = vocab.rng
+    # 各频道的订阅者从同一批用户中编号，与实际中一个用户关注多个频道一致
+    user_ids = [USER_BASE_ID + i for i in range(subscribers)]
+    subscription_rows = []
+    keyword_rows = []
+    for user_id in user_ids:
+        followed = [] if rng.random() < FULL_FEED_RATIO else vocab.sample(rng.randint(1, 5))
+        blocked = vocab.sample(rng.randint(1, 2)) if rng.random() < BLOCKED_RATIO else []
+        blocked = [kw for kw in blocked if kw not in followed]
+        rule = _random_rule(vocab, tags) if rng.random() < RULE_RATIO else None
+        include_tags = exclude_tags = 0
+        if rng.random() < TAG_FILTER_RATIO:
+            slots = rng.sample(range(len(tags)), 3)
+            if rng.random() < 0.5:
+                include_tags = (1 << slots[0]) | (1 << slots[1])
+            else:
+                exclude_tags = 1 << slots[2]
+        subscription_rows.append(
+            (user_id, channel_id, 1, rule, include_tags, exclude_tags)
+        )
+        keyword_rows.extend((channel_id, "followed", kw, user_id) for kw in followed)
+        keyword_rows.extend((channel_id, "blocked", kw, user_id) for kw in blocked)
+
+    await db._executemany(
+        "INSERT INTO keyword_subscriptions"
+        " (user_id, channel_id, is_subscribed, rule, include_tags, exclude_tags)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        subscription_rows,
+    )
+    for start in range(0, len(keyword_rows), 50_000):
+        await db._executemany(
+            "INSERT OR IGNORE INTO subscription_keywords (channel_id, kind, keyword, user_id)"
+            " VALUES (?, ?, ?, ?)",
+            keyword_rows[start : start + 50_000],
+        )
+    await db._executemany(
+        "INSERT INTO channel_tag_slots (channel_id, tag_id, slot) VALUES (?, ?, ?)",
+        [(channel_id, tag.id, slot) for slot, tag in enumerate(tags)],
+    )
+    return user_ids
+
+
+def _random_title(vocab: _Vocabulary) -> str:
+    rng = vocab.rng
+    keywords = vocab.sample(rng.randint(0, 3))
+    if rng.random() < 0.6:
+        parts = keywords + rng.sample(_CHINESE_FILLER, rng.randint(1, 3))
+        rng.shuffle(parts)
+        return "【" + parts[0] + "】" + "".join(parts[1:])
+    parts = keywords + rng.sample(_ENGLISH_FILLER, rng.randint(1, 4))
+    rng.shuffle(parts)
+    return " ".join(parts).title()
+
+
+def _load_corpus(path: str) -> list[tuple[str, list[str]]]:
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                corpus.append((item["title"], list(item.get("tags", []))))
+    return corpus
+
+
+def _build_threads(
+    corpus: list[tuple[str, list[str]]],
+    channel_id: int,
+    tags: list[SimpleNamespace],
+    user_ids: list[int],
+    rng: random.Random,
+) -> list[SimpleNamespace]:
+    """把语料转换为与 discord.Thread 接口相同的对象；发帖人从订阅者中随机选取。"""
+    tags_by_name = {tag.name: tag for tag in tags}
+    threads = []
+    for i, (title, tag_names) in enumerate(corpus):
+        applied = []
+        for name in tag_names:
+            tag = tags_by_name.get(name)
+            if tag is None:
+                tag = tags_by_name[name] = SimpleNamespace(
+                    id=_tag_id(channel_id, len(tags_by_name)), name=name
+                )
+            applied.append(tag)
+        threads.append(
+            SimpleNamespace(
+                id=THREAD_BASE_ID + i,
+                parent_id=channel_id,
+                name=title,
+                applied_tags=applied,
+                owner_id=rng.choice(user_ids),
+            )
+        )
+    return threads
+
+
+# --- 测量 ---
+
+
+async def _measure(engine, threads: list[SimpleNamespace]) -> dict:
+    """
+    先在 tracemalloc 下解析第一个帖子（引擎在此时加载频道数据），记录预热耗时和常驻内存；
+    再在不追踪内存的情况下回放全部帖子，统计延迟和吞吐量。
+    """
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    await engine.process_new_thread(threads[0])
+    warmup_seconds = time.perf_counter() - started
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    recipients = []
+    started = time.perf_counter()
+    for thread in threads:
+        t0 = time.perf_counter()
+        result = await engine.process_new_thread(thread)
+        latencies.append(time.perf_counter() - t0)
+        recipients.append(frozenset(result))
+    total = time.perf_counter() - started
+    return {
+        "threads_per_second": round(len(threads) / total, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "warmup_ms": round(warmup_seconds * 1000, 1),
+        "retained_bytes": retained - before,
+        "avg_recipients": round(statistics.mean(len(r) for r in recipients), 1),
+        "_recipients": recipients,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from src.core.database import Database
+
+    unknown = [name for name in args.engines if name not in ENGINES]
+    if unknown:
+        raise SystemExit(f"未知的引擎: {', '.join(unknown)}（可选: {', '.join(ENGINES)}）")
+
+    rng = random.Random(args.seed)
+    vocab = _Vocabulary(rng, args.long_tail, args.zipf)
+    if args.corpus:
+        corpus = _load_corpus(args.corpus)
+    else:
+        corpus = []
+        for _ in range(args.threads):
+            tag_count = rng.choice((0, 1, 1, 2, 3))
+            tag_names = rng.sample(CHINESE_KEYWORDS[:20] + ENGLISH_KEYWORDS[:10], tag_count)
+            corpus.append((_random_title(vocab), tag_names))
+
+    reports: dict = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DB_NAME"] = os.path.join(tmp, "bench.db")
+        os.environ["DB_STARTUP_SELF_CHECK"] = "0"
+        # 大频道上数据库路径的每次匹配都会超过慢查询阈值，避免日志刷屏
+        os.environ.setdefault("DB_SLOW_QUERY_MS", "60000")
+        db = Database()
+        await db.connect()
+        try:
+            for subscribers in args.subscribers:
+                channel_id = CHANNEL_BASE_ID + subscribers
+                tags = _channel_tags(channel_id, rng)
+                print(f"生成 {subscribers:,} 位订阅者的频道...")
+                user_ids = await _seed_channel(db, channel_id, subscribers, tags, vocab)
+                threads = _build_threads(corpus, channel_id, tags, user_ids, rng)
+
+                report = reports[subscribers] = {}
+                expected = None
+                for name in args.engines:
+                    # 每个引擎使用全新的实例，预热时重新加载频道
+                    result = await _measure(ENGINES[name](db), threads)
+                    recipients = result.pop("_recipients")
+                    if expected is None:
+                        expected = recipients
+                    elif recipients != expected:
+                        mismatched = sum(a != b for a, b in zip(recipients, expected))
+                        raise SystemExit(
+                            f"引擎 {name} 在 {mismatched} 个帖子上的收件人与 {args.engines[0]} 不一致"
+                        )
+                    report[name] = result
+        finally:
+            await db.close()
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--subscribers", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--threads", type=int, default=500, help="随机生成的帖子数")
+    parser.add_argument("--corpus", default=None, help="可选：JSON Lines 帖子语料")
+    parser.add_argument(
+        "--engines", nargs="+", default=list(ENGINES), help=f"可选: {', '.join(ENGINES)}"
+    )
+    parser.add_argument("--long-tail", type=int, default=3000, help="长尾关键词数量")
+    parser.add_argument("--zipf", type=float, default=1.05, help="关键词热度的 Zipf 指数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="可选：JSON 报告的输出路径")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run(args))
+    for subscribers, report in reports.items():
+        print(f"\n=== {subscribers:,} 位订阅者 ===")
+        print(
+            f"{'引擎':<12}{'帖/秒':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'预热 ms':>10}{'常驻内存':>14}{'平均收件人':>12}"
+        )
+        for name, item in report.items():
+            print(
+                f"{name:<12}{item['threads_per_second']:>10,.1f}{item['p50_ms']:>10.3f}"
+                f"{item['p99_ms']:>10.3f}{item['warmup_ms']:>10.1f}"
+                f"{item['retained_bytes']:>14,}{item['avg_recipients']:>12.1f}"
+            )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,15 @@ import asyncio
 import pathlib
 from dotenv import load_dotenv, find_dotenv
 from src.core.database import Database
+from src.core.repository import Repository, create_repository
+from src.core.notification_dispatcher import NotificationDispatcher
+from src.core.write_behind import WriteBehindBuffer
 from src.modules.author_follow.services.author_follow_service import AuthorFollowService
+from src.modules.author_follow.services.follower_index import FollowerIndex
 from src.modules.user_profile_feature.services.profile_service import ProfileService
+from src.modules.channel_subscription.services.keyword_matcher import (
+    SubscriptionMatcher,
+)
 from src.modules.channel_subscription.services.subscription_service import (
     SubscriptionService,
 )
@@ -63,12 +70,16 @@ class MyBot(commands.Bot):
         super().__init__(command_prefix=no_prefix, intents=intents)
 
         # 2. 更新服务属性的名称和类型提示
-        self.db: Database | None = None
+        self.db: Repository | None = None
+        self.write_behind: WriteBehindBuffer | None = None
         self.author_follow_service: AuthorFollowService | None = None
         self.profile_service: ProfileService | None = None
         self.subscription_service: SubscriptionService | None = None
         self.favorites_service: FavoritesService | None = None
+        self.notification_dispatcher: NotificationDispatcher | None = None
         self.db_backup_task: asyncio.Task | None = None
+        self.db_metrics_task: asyncio.Task | None = None
+        self.db_compaction_task: asyncio.Task | None = None
         self.scanner_service: ActiveThreadScanner | None = None
 
     def _load_resource_channels(self) -> set[int]:
@@ -103,13 +114,34 @@ class MyBot(commands.Bot):
         这里只做最核心、最快的初始化。
         """
         logger.info("--- 🚀 1. 初始化核心服务 ---")
-        self.db = Database()
+        self.db = create_repository()
         await self.db.connect()
-
-        self.author_follow_service = AuthorFollowService(self.db)
-        self.profile_service = ProfileService(self.db, self.author_follow_service)
-        self.subscription_service = SubscriptionService(self.db)
+        # 帖子记录、作者名称和上次查看时间等记账类写入走延迟写入，不阻塞通知和面板渲染
+        if os.getenv("DB_WRITE_BEHIND_ENABLED", "1") != "0":
+            self.write_behind = WriteBehindBuffer(self.db)
+            self.write_behind.start()
+
+        # 作者 → 关注者的内存索引：新帖通知解析收件人时不读数据库
+        follower_index = (
+            FollowerIndex() if os.getenv("FOLLOWER_INDEX_ENABLED", "1") != "0" else None
+        )
+        self.author_follow_service = AuthorFollowService(
+            self.db, self.write_behind, follower_index
+        )
+        await self.author_follow_service.build_follower_index()
+        self.profile_service = ProfileService(
+            self.db, self.author_follow_service, self.write_behind
+        )
+        # 频道订阅的关键词索引：新帖匹配关注词/屏蔽词时不读数据库
+        subscription_matcher = (
+            SubscriptionMatcher()
+            if os.getenv("SUBSCRIPTION_MATCHER_ENABLED", "1") != "0"
+            else None
+        )
+        self.subscription_service = SubscriptionService(self.db, subscription_matcher)
         self.favorites_service = FavoritesService(self.db)
+        # 各来源的新帖提及统一合并去重后发送，每个帖子只发一组幽灵提及
+        self.notification_dispatcher = NotificationDispatcher()
         self.scanner_service = ActiveThreadScanner(self, self.db)
         logger.info("✅ 核心服务初始化完成。")
 
@@ -162,7 +194,7 @@ class MyBot(commands.Bot):
             and int(backup_interval_hours_str) > 0
         ):
             interval_hours = int(backup_interval_hours_str)
-            if self.db:
+            if isinstance(self.db, Database):
                 self.db_backup_task = self.loop.create_task(
                     self.db.start_backup_loop(interval_hours * 3600)
                 )
@@ -170,6 +202,38 @@ class MyBot(commands.Bot):
         else:
             logger.warning("  - [跳过] 数据库自动备份已禁用。")
 
+        # 数据库查询统计日志
+        metrics_interval_minutes_str = os.getenv("DB_METRICS_LOG_INTERVAL_MINUTES")
+        if (
+            metrics_interval_minutes_str
+            and metrics_interval_minutes_str.isdigit()
+            and int(metrics_interval_minutes_str) > 0
+        ):
+            interval_minutes = int(metrics_interval_minutes_str)
+            if isinstance(self.db, Database):
+                self.db_metrics_task = self.loop.create_task(
+                    self.db.start_metrics_log_loop(interval_minutes * 60)
+                )
+                logger.info("  - [启动] 数据库查询统计日志任务。")
+        else:
+            logger.warning("  - [跳过] 数据库查询统计日志已禁用。")
+
+        # 数据保留清理
+        compaction_interval_hours_str = os.getenv("COMPACTION_INTERVAL_HOURS")
+        if (
+            compaction_interval_hours_str
+            and compaction_interval_hours_str.isdigit()
+            and int(compaction_interval_hours_str) > 0
+        ):
+            interval_hours = int(compaction_interval_hours_str)
+            if isinstance(self.db, Database):
+                self.db_compaction_task = self.loop.create_task(
+                    self.db.start_compaction_loop(interval_hours * 3600)
+                )
+                logger.info("  - [启动] 数据库数据保留清理任务。")
+        else:
+            logger.warning("  - [跳过] 数据库数据保留清理已禁用。")
+
         # 帖子扫描器 (周期性)
         scanner_interval_hours_str = os.getenv("SCANNER_INTERVAL_HOURS")
         if (
@@ -188,6 +252,13 @@ class MyBot(commands.Bot):
         """在机器人关闭时，优雅地清理资源。"""
         logger.info("正在关闭机器人并清理资源...")
 
+        # 0. 断开连接前先把收集窗口中的幽灵提及发送出去，否则重启或部署时这些通知会丢失
+        if self.notification_dispatcher:
+            await self.notification_dispatcher.close()
+            logger.info(
+                "新帖提及统计", extra=self.notification_dispatcher.get_stats()
+            )
+
         # 1. 首先，调用父类的 close 方法。
         # 这会优雅地断开与 Discord 的连接，并停止所有内部任务（如心跳）。
         # 这是解决 "Event loop is closed" 错误的关键。
@@ -200,6 +271,14 @@ class MyBot(commands.Bot):
             self.db_backup_task.cancel()
             logger.info("数据库备份任务已取消。")
 
+        if self.db_metrics_task and not self.db_metrics_task.done():
+            self.db_metrics_task.cancel()
+            logger.info("数据库查询统计日志任务已取消。")
+
+        if self.db_compaction_task and not self.db_compaction_task.done():
+            self.db_compaction_task.cancel()
+            logger.info("数据库数据保留清理任务已取消。")
+
         if (
             self.scanner_service
             and self.scanner_service.task
@@ -208,9 +287,22 @@ class MyBot(commands.Bot):
             self.scanner_service.stop()
             logger.info("活跃帖子扫描任务已停止。")
 
-        # 关闭数据库连接
-        if self.db and self.db.conn:
-            await self.db.conn.close()
+        if self.author_follow_service:
+            stats = self.author_follow_service.get_follower_index_stats()
+            if stats is not None:
+                logger.info("关注者索引统计", extra=stats)
+        if self.subscription_service:
+            stats = self.subscription_service.get_matcher_stats()
+            if stats is not None:
+                logger.info("频道订阅关键词索引统计", extra=stats)
+
+        # 先把延迟写入缓冲区中的数据落盘，再排空待提交的写入并关闭数据库连接
+        if self.write_behind:
+            await self.write_behind.close()
+            logger.info("延迟写入缓冲区已排空。")
+
+        if self.db:
+            await self.db.close()
             logger.info("数据库连接已关闭。")
 
         logger.info("所有自定义资源已成功清理，机器人已完全关闭。")
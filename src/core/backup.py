@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import pathlib
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field
+
+# 压缩/校验时的读写块大小
+_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class BackupReport:
+    """一次备份的结果与耗时统计（时间单位为秒）。"""
+
+    path: str
+    pages: int = 0
+    steps: int = 0
+    # 拷贝阶段：总耗时、持有读快照的时间（WAL 下不阻塞写入），以及单步在工作线程中的最长耗时
+    copy_seconds: float = 0.0
+    snapshot_hold_seconds: float = 0.0
+    max_step_ms: float = 0.0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+    compress_seconds: float = 0.0
+    integrity: str = ""
+    step_durations_ms: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.copy_seconds <= 0:
+            return 0.0
+        return self.raw_bytes / 1024 / 1024 / self.copy_seconds
+
+    def to_log_context(self) -> dict:
+        context = asdict(self)
+        context.pop("step_durations_ms")
+        context["throughput_mb_s"] = round(self.throughput_mb_s, 2)
+        for key in ("copy_seconds", "snapshot_hold_seconds", "compress_seconds"):
+            context[key] = round(context[key], 3)
+        context["max_step_ms"] = round(self.max_step_ms, 3)
+        return context
+
+
+def copy_database(
+    db_name: str, dest_path: pathlib.Path, pages_per_step: int, step_sleep: float
+) -> BackupReport:
+    """
+    在独立的只读连接上分步拷贝数据库（在工作线程中调用）。
+    每步只拷贝 pages_per_step 页，步与步之间休眠 step_sleep 秒，让出 CPU 和 I/O。
+    拷贝期间持有一个读事务：WAL 模式下读快照不会阻塞写连接，
+    同时保证其他连接的写入不会让备份从头重来，得到的是开始时刻的一致快照。
+    """
+    report = BackupReport(path=str(dest_path))
+    uri = f"{pathlib.Path(db_name).resolve().as_uri()}?mode=ro"
+    source = sqlite3.connect(uri, uri=True, isolation_level=None)
+    target = sqlite3.connect(dest_path)
+    last_tick = 0.0
+
+    def on_progress(status: int, remaining: int, total: int):
+        nonlocal last_tick
+        now = time.perf_counter()
+        # 回调在每一步结束后触发，距离上一步结束（含休眠）的时间即为该步的实际耗时
+        report.step_durations_ms.append((now - last_tick) * 1000)
+        report.steps += 1
+        report.pages = total
+        # sqlite3 的 sleep 参数只在 BUSY/LOCKED 时生效，所以步间休眠放在回调里完成
+        if remaining > 0 and step_sleep > 0:
+            time.sleep(step_sleep)
+        last_tick = time.perf_counter()
+
+    try:
+        started_at = time.perf_counter()
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        snapshot_at = last_tick = time.perf_counter()
+        try:
+            source.backup(target, pages=pages_per_step, progress=on_progress)
+        finally:
+            source.execute("COMMIT")
+            report.snapshot_hold_seconds = time.perf_counter() - snapshot_at
+        report.copy_seconds = time.perf_counter() - started_at
+        # 拷贝会带上源库的 WAL 标记，改回普通日志模式，备份才是一个可以单独存放的文件
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    report.max_step_ms = max(report.step_durations_ms, default=0.0)
+    report.raw_bytes = dest_path.stat().st_size
+    return report
+
+
+def check_integrity(path: pathlib.Path) -> str:
+    """对备份文件运行 PRAGMA integrity_check，返回 'ok' 或错误描述。"""
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return "; ".join(str(row[0]) for row in rows)
+
+
+def compress_file(source: pathlib.Path, level: int) -> tuple[pathlib.Path, str]:
+    """
+    将文件流式压缩为 .gz（在工作线程中调用），返回压缩文件路径和原文件的 SHA-256。
+    """
+    dest = source.with_name(source.name + ".gz")
+    digest = hashlib.sha256()
+    with open(source, "rb") as src, gzip.open(dest, "wb", compresslevel=level) as dst:
+        while chunk := src.read(_CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return dest, digest.hexdigest()
+
+
+def verify_compressed(path: pathlib.Path, expected_sha256: str) -> bool:
+    """解压整个 .gz 文件并比对 SHA-256，确认压缩产物完整可用。"""
+    digest = hashlib.sha256()
+    with gzip.open(path, "rb") as src:
+        while chunk := src.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest() == expected_sha256
+
@@ -0,0 +1,102 @@
+import logging
+import os
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+
+def database_file_size(db_name: str) -> int:
+    """数据库主文件与 WAL 文件的大小之和（字节），即数据库实际占用的磁盘空间。"""
+    return sum(
+        os.path.getsize(path)
+        for path in (db_name, f"{db_name}-wal")
+        if os.path.exists(path)
+    )
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (ValueError, TypeError):
+        return default
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    各表的数据保留策略（天数设为 0 表示不清理该表）。
+    删除按 batch_size 分批进行，每批之间暂停 batch_pause_ms，避免长时间占用写锁。
+    """
+
+    # 作者帖子只用于统计“上次查看之后的新帖子数”，过旧的帖子不再有意义
+    author_posts_days: int = 90
+    # 长期未查看的用户，下次查看时按“从未查看”处理（只会统计仍保留的帖子）
+    user_last_view_days: int = 90
+    # 没有任何订阅者、且超过该天数未更新的比赛（连同其作品 ID 列表）
+    orphan_competition_days: int = 7
+    # 既没有关注者也没有帖子记录的作者
+    prune_orphan_authors: bool = True
+    batch_size: int = 500
+    batch_pause_ms: int = 20
+    # 每次增量 VACUUM 归还的页数
+    vacuum_pages_per_step: int = 256
+
+    def __post_init__(self):
+        # last_view 的保留期不能短于帖子：否则被清理的用户下次查看时，
+        # 会把上次查看之前、但仍在保留期内的帖子也算作新帖子
+        if 0 < self.user_last_view_days < self.author_posts_days:
+            logger.warning(
+                "user_last_view 的保留天数短于 author_posts，已自动调整为相同天数",
+                extra={
+                    "user_last_view_days": self.user_last_view_days,
+                    "author_posts_days": self.author_posts_days,
+                },
+            )
+            self.user_last_view_days = self.author_posts_days
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            author_posts_days=_env_int("RETENTION_AUTHOR_POSTS_DAYS", 90),
+            user_last_view_days=_env_int("RETENTION_USER_LAST_VIEW_DAYS", 90),
+            orphan_competition_days=_env_int("RETENTION_ORPHAN_COMPETITION_DAYS", 7),
+            prune_orphan_authors=_env_int("RETENTION_PRUNE_ORPHAN_AUTHORS", 1) > 0,
+            batch_size=max(1, _env_int("COMPACTION_BATCH_SIZE", 500)),
+            batch_pause_ms=max(0, _env_int("COMPACTION_BATCH_PAUSE_MS", 20)),
+            vacuum_pages_per_step=max(1, _env_int("COMPACTION_VACUUM_PAGES_PER_STEP", 256)),
+        )
+
+
+@dataclass
+class CompactionReport:
+    """一次清理任务的结果（时间单位为秒）。"""
+
+    deleted: dict[str, int] = field(default_factory=dict)
+    batches: int = 0
+    max_batch_ms: float = 0.0
+    freed_pages: int = 0
+    page_size: int = 0
+    file_bytes_before: int = 0
+    file_bytes_after: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.freed_pages * self.page_size
+
+    def record_batch(self, table: str, deleted: int, elapsed_ms: float) -> None:
+        self.deleted[table] = self.deleted.get(table, 0) + deleted
+        self.batches += 1
+        self.max_batch_ms = max(self.max_batch_ms, elapsed_ms)
+
+    def to_log_context(self) -> dict:
+        return {
+            "deleted": self.deleted,
+            "batches": self.batches,
+            "max_batch_ms": round(self.max_batch_ms, 3),
+            "freed_pages": self.freed_pages,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "file_bytes_before": self.file_bytes_before,
+            "file_bytes_after": self.file_bytes_after,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+        }
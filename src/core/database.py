@@ -1,18 +1,239 @@
 import aiosqlite
 import os
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 import asyncio
 import pathlib
 import logging
 import json
-from typing import Optional, Any
+import functools
+import inspect
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional, Any
+
+from src.core.backup import (
+    BackupReport,
+    check_integrity,
+    compress_file,
+    copy_database,
+    verify_compressed,
+)
+from src.core.compaction import (
+    CompactionReport,
+    RetentionPolicy,
+    database_file_size,
+)
+from src.core.db_metrics import DatabaseMetrics
+from src.core.group_commit import GroupCommitWriter, PendingWrite, apply_atomic
+from src.core.online_migrations import (
+    BackfillProgress,
+    OnlineMigration,
+    load_migration_module,
+    mark_backfill_failed,
+    online_migration_from_module,
+    run_backfill_batch,
+)
+from src.core.read_pool import ReadConnectionPool
+from src.core.row_models import (
+    ActiveThread,
+    Competition,
+    Favorite,
+    KeywordSubscription,
+    active_threads_from_rows,
+    competitions_from_rows,
+    favorites_from_rows,
+    subscriptions_from_rows,
+)
+from src.core.sqlite_worker import run_on_connection
+from src.core.snowflake import snowflake_after, snowflake_lower_bound
+from src.core.tag_slots import allocate_tag_slots
+from src.core.storage_profile import (
+    SelfCheckReport,
+    StorageProfile,
+    effective_settings,
+    run_self_check,
+)
+from src.core.timestamps import from_epoch_ms, now_ms, to_epoch_ms
 
 logger = logging.getLogger(__name__)
 
 
+def _pragma_value(sqlite_conn: sqlite3.Connection, pragma: str) -> Any:
+    return sqlite_conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+
+
+def _incremental_vacuum_step(sqlite_conn: sqlite3.Connection, pages: int) -> int:
+    """归还最多 pages 个空闲页，返回剩余的空闲页数。"""
+    # 通过 execute 执行时 sqlite3 模块只会单步执行一次（只释放一页），executescript 会执行到底
+    sqlite_conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return sqlite_conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _run_query(
+    sqlite_conn: sqlite3.Connection,
+    query: str,
+    args: Any,
+    fetch: str,
+    submitted_at: float,
+) -> tuple[Any, float]:
+    """
+    在 aiosqlite 工作线程中一次性完成 execute + fetch，只占用一次线程往返。
+    同时返回该调用在工作线程外排队等待的时间（秒）。
+    """
+    started_at = time.perf_counter()
+    cursor = sqlite_conn.execute(query, args)
+    try:
+        result = cursor.fetchone() if fetch == "one" else cursor.fetchall()
+    finally:
+        cursor.close()
+    return result, started_at - submitted_at
+
+
+def _run_in_transaction(
+    sqlite_conn: sqlite3.Connection,
+    statements: list[tuple[str, Any, bool]],
+    fetch: str | None,
+    submitted_at: float,
+) -> tuple[Any, float]:
+    """
+    工作单元内执行语句：事务在第一条语句时才开启（只读的工作单元不会产生提交）。
+    写入返回各条语句的 rowcount 列表，读取返回查询结果；同时返回排队等待时间。
+    """
+    if not sqlite_conn.in_transaction:
+        sqlite_conn.execute("BEGIN")
+    if fetch is not None:
+        sql, args, _ = statements[0]
+        return _run_query(sqlite_conn, sql, args, fetch, submitted_at)
+    started_at = time.perf_counter()
+    return apply_atomic(sqlite_conn, statements), started_at - submitted_at
+
+
+# 流水线中的一条语句: (sql, 参数, 方式)。方式为 "one" / "all" 时是查询，得到查询结果；
+# 为 None 时是写语句，得到 rowcount；为 "many" 时参数是行序列，用 executemany 写入，得到 rowcount。
+# 参数也可以是一个函数：在工作线程中以此前各条语句的结果列表调用，返回本条语句的参数，
+# 用于参数依赖前面查询结果的语句，整条流水线仍只占用一次线程往返。
+PipelineStatement = tuple[str, Any, Optional[str]]
+
+_PIPELINE_QUERY_MODES = ("one", "all")
+
+
+def _run_pipeline(
+    sqlite_conn: sqlite3.Connection,
+    statements: list[PipelineStatement],
+    submitted_at: float,
+    transaction: str,
+) -> tuple[list[Any], float]:
+    """
+    在 aiosqlite 工作线程中依次执行流水线的全部语句，返回 (各条语句的结果, 排队等待时间)。
+    transaction 决定事务边界：
+    - "snapshot"：只读流水线，用一个读事务包住全部查询，所有语句看到同一个数据库快照；
+    - "commit"：在独占的写连接上自己开启并提交事务，任何一条语句失败时全部回滚；
+    - "savepoint"：在调用方的工作单元事务中执行，包在 SAVEPOINT 中，失败时只撤销本流水线的写入。
+    """
+    started_at = time.perf_counter()
+    own_transaction = not sqlite_conn.in_transaction
+    if transaction == "savepoint":
+        own_transaction = False
+        if not sqlite_conn.in_transaction:
+            sqlite_conn.execute("BEGIN")
+        sqlite_conn.execute("SAVEPOINT pipeline")
+    elif own_transaction:
+        sqlite_conn.execute("BEGIN")
+    results: list[Any] = []
+    try:
+        for sql, args, mode in statements:
+            if callable(args):
+                args = args(results)
+            if mode == "many":
+                cursor = sqlite_conn.executemany(sql, args)
+            else:
+                cursor = sqlite_conn.execute(sql, args)
+            try:
+                if mode == "one":
+                    results.append(cursor.fetchone())
+                elif mode == "all":
+                    results.append(cursor.fetchall())
+                else:
+                    results.append(cursor.rowcount)
+            finally:
+                cursor.close()
+    except BaseException:
+        if transaction == "savepoint" and sqlite_conn.in_transaction:
+            sqlite_conn.execute("ROLLBACK TO pipeline")
+            sqlite_conn.execute("RELEASE pipeline")
+        elif own_transaction and sqlite_conn.in_transaction:
+            sqlite_conn.rollback()
+        raise
+    if transaction == "savepoint":
+        sqlite_conn.execute("RELEASE pipeline")
+    elif own_transaction and sqlite_conn.in_transaction:
+        # 只读流水线提交只是结束快照
+        sqlite_conn.commit()
+    return results, started_at - submitted_at
+
+
+def _finish_transaction(sqlite_conn: sqlite3.Connection, commit: bool) -> None:
+    if not sqlite_conn.in_transaction:
+        return
+    if commit:
+        sqlite_conn.commit()
+    else:
+        sqlite_conn.rollback()
+
+
+@dataclass
+class _UnitOfWork:
+    database: "Database"
+    # 上下文内创建的任务会继承上下文变量，只有开启工作单元的任务本身才在事务中执行
+    task: Optional[asyncio.Task]
+    active: bool = True
+
+
+_current_unit_of_work: ContextVar[Optional[_UnitOfWork]] = ContextVar(
+    "current_unit_of_work", default=None
+)
+
+# 正在执行的公开 Database 方法名，作为查询统计的标签；嵌套调用时以最内层的方法为准
+_query_label: ContextVar[str] = ContextVar("db_query_label", default="unknown")
+
+
+def _labelled(name: str, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _query_label.set(name)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _query_label.reset(token)
+
+    return wrapper
+
+
+def _keeps_caller_label(method):
+    """标记供其他公开方法调用的通用执行方法（如 pipeline）：不包装，查询记在调用它的方法名下。"""
+    method.keeps_caller_label = True
+    return method
+
+
+def _label_queries(cls):
+    """类装饰器：在定义类时包装每个公开的协程方法一次，调用期间把方法名设为查询统计标签。"""
+    for name, method in list(vars(cls).items()):
+        if (
+            not name.startswith("_")
+            and inspect.iscoroutinefunction(method)
+            and not getattr(method, "keeps_caller_label", False)
+        ):
+            setattr(cls, name, _labelled(name, method))
+    return cls
+
+
+@_label_queries
 class Database:
     def __init__(self):
-        # SQLite 不需要连接池，只需要一个连接对象
+        # 唯一的写连接；只读查询走下面的只读连接池
         self.conn: Optional[aiosqlite.Connection] = None
         self.db_name: str = os.getenv("DB_NAME", "odysseia.db")
         self.backup_folder: str = os.getenv("BACKUP_FOLDER", "backups")
@@ -21,6 +242,62 @@ class Database:
             self.backup_retention_days = int(os.getenv("BACKUP_RETENTION_DAYS", "7"))
         except (ValueError, TypeError):
             self.backup_retention_days = 7
+        # 分步备份：每步拷贝的页数、步间休眠（毫秒），以及 gzip 压缩级别（0 表示不压缩）
+        try:
+            self.backup_pages_per_step = int(
+                os.getenv("DB_BACKUP_PAGES_PER_STEP", "1024")
+            )
+            self.backup_step_sleep = (
+                float(os.getenv("DB_BACKUP_STEP_SLEEP_MS", "5")) / 1000
+            )
+            self.backup_compress_level = int(os.getenv("DB_BACKUP_COMPRESS_LEVEL", "6"))
+        except (ValueError, TypeError):
+            self.backup_pages_per_step = 1024
+            self.backup_step_sleep = 0.005
+            self.backup_compress_level = 6
+        # 组提交配置：写入最多攒多久（毫秒）/ 最多攒多少条再统一提交
+        try:
+            self.group_commit_interval = (
+                float(os.getenv("DB_GROUP_COMMIT_INTERVAL_MS", "5")) / 1000
+            )
+            self.group_commit_max_batch = int(
+                os.getenv("DB_GROUP_COMMIT_MAX_BATCH", "200")
+            )
+        except (ValueError, TypeError):
+            self.group_commit_interval = 0.005
+            self.group_commit_max_batch = 200
+        self.writer: Optional[GroupCommitWriter] = None
+        # 只读连接池大小，设为 0 则所有查询都走写连接
+        try:
+            self.read_pool_size = int(os.getenv("DB_READ_POOL_SIZE", "3"))
+        except (ValueError, TypeError):
+            self.read_pool_size = 3
+        self.read_pool: Optional[ReadConnectionPool] = None
+        # 存储参数预设（cache_size、mmap_size、synchronous 等），写连接和读连接都使用同一组
+        self.storage_profile = StorageProfile.from_env()
+        # 启动时是否执行存储配置自检（记录实际生效的参数并跑一次很短的微基准）
+        self.startup_self_check = os.getenv("DB_STARTUP_SELF_CHECK", "1") != "0"
+        self.self_check_report: Optional[SelfCheckReport] = None
+        # 查询统计：超过阈值（毫秒）的调用会连同查询计划写入慢查询日志
+        try:
+            slow_query_ms = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+            slow_log_size = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "100"))
+        except (ValueError, TypeError):
+            slow_query_ms, slow_log_size = 100.0, 100
+        self.metrics = DatabaseMetrics(slow_query_ms, slow_log_size)
+        self._background_tasks: set[asyncio.Task] = set()
+        # 在线迁移：Python 迁移中的数据回填在启动后分批执行，每批之间暂停（毫秒），把写连接让给正常写入
+        try:
+            self.online_migration_pause = (
+                float(os.getenv("DB_ONLINE_MIGRATION_PAUSE_MS", "50")) / 1000
+            )
+        except (ValueError, TypeError):
+            self.online_migration_pause = 0.05
+        self._online_migrations: list[OnlineMigration] = []
+        # 每个回填的完成标记；回填失败时也会被置位，由 _failed_migrations 区分
+        self._migration_events: dict[str, asyncio.Event] = {}
+        self._failed_migrations: set[str] = set()
+        self._online_migration_task: Optional[asyncio.Task] = None
 
     async def connect(self) -> None:
         """连接到SQLite数据库文件"""
@@ -31,10 +308,79 @@ class Database:
         conn.row_factory = aiosqlite.Row
         # 3. 启用外键约束，SQLite默认是关闭的
         await conn.execute("PRAGMA foreign_keys = ON")
+        # 新建的数据库在创建任何表之前开启增量 VACUUM（必须早于切换 WAL）；
+        # 对已有数据库这条语句不生效，需要停机执行 src.core.maintenance 中的转换命令
+        await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # 启用 WAL 日志模式，读操作不再被写操作阻塞
+        await conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in self.storage_profile.pragmas():
+            await conn.execute(pragma)
         await conn.commit()
         # 4. 在这里运行数据库迁移
         await self._run_migrations()
+        # 5. 迁移完成后再启动组提交写入器，之后所有写操作都经由它提交
+        self.writer = GroupCommitWriter(
+            conn,
+            self.group_commit_interval,
+            self.group_commit_max_batch,
+            observer=self._observe_write,
+        )
+        self.writer.start()
+        # 6. 打开只读连接池（内存数据库无法被多个连接共享，此时不启用）
+        if self.read_pool_size > 0 and self.db_name != ":memory:":
+            self.read_pool = ReadConnectionPool(
+                self.db_name, self.read_pool_size, self.storage_profile.pragmas()
+            )
+            await self.read_pool.open()
+        # 7. 在后台继续尚未完成的数据回填
+        await self._start_online_migrations()
         logger.info("数据库连接成功并完成初始化", extra={"db_name": self.db_name})
+        if self.startup_self_check and self.db_name != ":memory:":
+            await self._run_startup_self_check()
+
+    async def _run_startup_self_check(self) -> None:
+        """记录实际生效的存储参数，并在数据库旁的临时文件上跑一次微基准。自检失败不影响启动。"""
+        profile = self.storage_profile
+        try:
+            settings = await self._run_on_writer(effective_settings)
+            self.self_check_report = await asyncio.to_thread(
+                run_self_check, self.db_name, profile
+            )
+        except Exception:
+            logger.warning(
+                "数据库存储配置自检失败",
+                extra={"profile": profile.name},
+                exc_info=True,
+            )
+            return
+        logger.info(
+            "数据库存储配置自检完成",
+            extra={
+                "profile": profile.name,
+                "settings": settings,
+                **self.self_check_report.to_log_context(),
+            },
+        )
+
+    async def close(self) -> None:
+        """排空待提交的写入并关闭数据库连接。"""
+        if self._online_migration_task is not None:
+            # 已提交的批次连同进度都已落盘，下次启动时从最后的游标继续
+            self._online_migration_task.cancel()
+            try:
+                await self._online_migration_task
+            except asyncio.CancelledError:
+                pass
+            self._online_migration_task = None
+        if self.read_pool is not None:
+            await self.read_pool.close()
+            self.read_pool = None
+        if self.writer is not None:
+            await self.writer.close()
+            self.writer = None
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
 
     async def cleanup_old_backups(self):
         """清理超过指定保留天数的旧备份文件。"""
@@ -55,9 +401,10 @@ class Database:
         cutoff_date = datetime.now() - timedelta(days=self.backup_retention_days)
         cleaned_count = 0
 
-        for file_path in backup_dir.glob("*_backup_*.db"):
+        # 同时匹配未压缩的 .db 和压缩后的 .db.gz 备份
+        for file_path in backup_dir.glob("*_backup_*.db*"):
             try:
-                timestamp_str = file_path.stem.split("_backup_")[-1]
+                timestamp_str = file_path.name.split("_backup_")[-1].split(".")[0]
                 file_date = datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
 
                 if file_date < cutoff_date:
@@ -77,8 +424,12 @@ class Database:
         else:
             logger.info("没有需要清理的旧备份文件", extra=log_context)
 
-    async def backup_database(self):
-        """使用SQLite的在线备份API创建一个安全的数据库备份文件。"""
+    async def backup_database(self) -> Optional[BackupReport]:
+        """
+        创建一个经过完整性校验的数据库备份文件。
+        拷贝在独立的只读连接上分步进行，压缩和校验都在工作线程中完成，
+        不占用写连接，也不阻塞事件循环。
+        """
         # 0. 在备份前，先执行清理任务
         await self.cleanup_old_backups()
 
@@ -92,18 +443,62 @@ class Database:
         backup_filename = f"{db_stem}_backup_{timestamp}.db"
         backup_path = backup_dir / backup_filename
 
-        # 3. 使用 aiosqlite 的 backup 功能，这是最安全的方式
-        log_context = {"backup_path": str(backup_path)}
+        log_context: dict[str, Any] = {"backup_path": str(backup_path)}
         logger.info("正在开始备份数据库", extra=log_context)
-        if self.conn is None:
-            logger.error("数据库连接未初始化，无法备份", extra=log_context)
-            return
+        if self.conn is None or self.db_name == ":memory:":
+            logger.error("数据库未连接或为内存数据库，无法备份", extra=log_context)
+            return None
+        started_at = time.perf_counter()
+        report: Optional[BackupReport] = None
+        failed = True
         try:
-            async with aiosqlite.connect(backup_path) as backup_conn:
-                await self.conn.backup(backup_conn)
-            logger.info("数据库备份成功", extra=log_context)
+            # 3. 分步拷贝出一个一致的快照
+            report = await asyncio.to_thread(
+                copy_database,
+                self.db_name,
+                backup_path,
+                self.backup_pages_per_step,
+                self.backup_step_sleep,
+            )
+            # 4. 校验拷贝结果，损坏的备份直接删除，避免日后误用
+            report.integrity = await asyncio.to_thread(check_integrity, backup_path)
+            if report.integrity != "ok":
+                backup_path.unlink(missing_ok=True)
+                logger.error("数据库备份未通过完整性校验", extra=report.to_log_context())
+                return report
+            # 5. 压缩，并解压比对摘要确认压缩产物可用后再删除未压缩的拷贝
+            if self.backup_compress_level > 0:
+                compress_started = time.perf_counter()
+                compressed_path, sha256 = await asyncio.to_thread(
+                    compress_file, backup_path, self.backup_compress_level
+                )
+                if not await asyncio.to_thread(
+                    verify_compressed, compressed_path, sha256
+                ):
+                    compressed_path.unlink(missing_ok=True)
+                    logger.error(
+                        "压缩备份校验失败，保留未压缩的备份",
+                        extra=report.to_log_context(),
+                    )
+                    return report
+                backup_path.unlink()
+                report.path = str(compressed_path)
+                report.compressed_bytes = compressed_path.stat().st_size
+                report.compress_seconds = time.perf_counter() - compress_started
+            failed = False
+            logger.info("数据库备份成功", extra=report.to_log_context())
+            return report
         except Exception:
             logger.error("数据库备份失败", extra=log_context, exc_info=True)
+            return report
+        finally:
+            self.metrics.record(
+                "backup_database",
+                time.perf_counter() - started_at,
+                0.0,
+                report.pages if report else 0,
+                failed,
+            )
 
     async def start_backup_loop(self, interval_seconds: int):
         """启动一个循环，按指定间隔备份数据库。"""
@@ -114,24 +509,482 @@ class Database:
             # 执行备份
             await self.backup_database()
 
+    async def _delete_in_batches(
+        self,
+        report: CompactionReport,
+        policy: RetentionPolicy,
+        table: str,
+        sql: str,
+        params: tuple,
+    ) -> None:
+        """重复执行带 LIMIT 的删除语句，直到某一批不满为止。每批都是一个独立的短事务。"""
+        while True:
+            started_at = time.perf_counter()
+            deleted = await self._execute(sql, params + (policy.batch_size,))
+            report.record_batch(table, deleted, (time.perf_counter() - started_at) * 1000)
+            if deleted < policy.batch_size:
+                return
+            await asyncio.sleep(policy.batch_pause_ms / 1000)
+
+    async def _delete_orphans_in_batches(
+        self,
+        report: CompactionReport,
+        policy: RetentionPolicy,
+        table: str,
+        key: str,
+        condition: str,
+        params: tuple,
+    ) -> None:
+        """
+        按主键顺序分批遍历整张表，删除满足 condition 的行。
+        每批先读出一段主键，再在删除语句中重新判断条件，避免误删在此期间被重新引用的行。
+        """
+        last_key = -(2**63)
+        while True:
+            rows = await self._execute(
+                f"SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                (last_key, policy.batch_size),
+                fetch="all",
+            )
+            if not rows:
+                return
+            keys = [row[0] for row in rows]
+            last_key = keys[-1]
+            placeholders = ",".join("?" for _ in keys)
+            started_at = time.perf_counter()
+            deleted = await self._execute(
+                f"DELETE FROM {table} WHERE {key} IN ({placeholders}) AND {condition}",
+                tuple(keys) + params,
+            )
+            report.record_batch(table, deleted, (time.perf_counter() - started_at) * 1000)
+            if len(keys) < policy.batch_size:
+                return
+            await asyncio.sleep(policy.batch_pause_ms / 1000)
+
+    async def _incremental_vacuum(
+        self, report: CompactionReport, policy: RetentionPolicy
+    ) -> None:
+        """分步归还空闲页；每一步都是写连接工作线程上的一个独立任务，不会与组提交批次交错。"""
+        auto_vacuum = await self._run_on_writer(_pragma_value, "auto_vacuum")
+        report.page_size = await self._run_on_writer(_pragma_value, "page_size")
+        free_pages = await self._run_on_writer(_pragma_value, "freelist_count")
+        if auto_vacuum != 2:
+            logger.warning(
+                "数据库未开启增量 VACUUM，跳过空闲页回收；"
+                "可停机执行 python -m src.core.maintenance enable-incremental-vacuum",
+                extra={"auto_vacuum": auto_vacuum, "free_pages": free_pages},
+            )
+            return
+        while free_pages > 0:
+            remaining = await self._run_on_writer(
+                _incremental_vacuum_step, policy.vacuum_pages_per_step
+            )
+            report.freed_pages += free_pages - remaining
+            if remaining >= free_pages:
+                break
+            free_pages = remaining
+            await asyncio.sleep(policy.batch_pause_ms / 1000)
+        # 把截断后的页写回主文件并清空 WAL 文件，让占用的磁盘空间真正缩小
+        await self._run_on_writer(_pragma_value, "wal_checkpoint(TRUNCATE)")
+
+    async def compact(
+        self, policy: Optional[RetentionPolicy] = None
+    ) -> CompactionReport:
+        """
+        按保留策略分批清理无限增长的表，然后用增量 VACUUM 归还空闲页。
+        返回删除的行数、回收的字节数和耗时。
+        """
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        policy = policy or RetentionPolicy.from_env()
+        report = CompactionReport(file_bytes_before=database_file_size(self.db_name))
+        started_at = time.perf_counter()
+        day_ms = 24 * 60 * 60 * 1000
+        now = now_ms()
+        failed = True
+        try:
+            if policy.author_posts_days > 0:
+                await self._delete_in_batches(
+                    report,
+                    policy,
+                    "author_posts",
+                    """
+                    DELETE FROM author_posts WHERE post_id IN (
+                        SELECT post_id FROM author_posts WHERE post_id < ? LIMIT ?
+                    )
+                    """,
+                    (snowflake_lower_bound(now - policy.author_posts_days * day_ms),),
+                )
+            if policy.user_last_view_days > 0:
+                await self._delete_in_batches(
+                    report,
+                    policy,
+                    "user_last_view",
+                    """
+                    DELETE FROM user_last_view WHERE user_id IN (
+                        SELECT user_id FROM user_last_view WHERE last_viewed_at < ? LIMIT ?
+                    )
+                    """,
+                    (now - policy.user_last_view_days * day_ms,),
+                )
+            if policy.orphan_competition_days > 0:
+                await self._delete_orphans_in_batches(
+                    report,
+                    policy,
+                    "competitions",
+                    "message_id",
+                    """
+                    updated_at < ? AND NOT EXISTS (
+                        SELECT 1 FROM competition_subscriptions s
+                        WHERE s.competition_message_id = competitions.message_id
+                    )
+                    """,
+                    (now - policy.orphan_competition_days * day_ms,),
+                )
+            if policy.prune_orphan_authors:
+                # 在帖子清理之后执行，这样只剩过期帖子的作者也会被清理
+                await self._delete_orphans_in_batches(
+                    report,
+                    policy,
+                    "authors",
+                    "author_id",
+                    """
+                    NOT EXISTS (SELECT 1 FROM followers f WHERE f.author_id = authors.author_id)
+                    AND NOT EXISTS (SELECT 1 FROM author_posts p WHERE p.author_id = authors.author_id)
+                    """,
+                    (),
+                )
+            await self._incremental_vacuum(report, policy)
+            failed = False
+        finally:
+            report.elapsed_seconds = time.perf_counter() - started_at
+            report.file_bytes_after = database_file_size(self.db_name)
+            self.metrics.record(
+                "compact",
+                report.elapsed_seconds,
+                0.0,
+                sum(report.deleted.values()),
+                failed,
+            )
+        logger.info("数据库清理完成", extra=report.to_log_context())
+        return report
+
+    async def start_compaction_loop(self, interval_seconds: int):
+        """启动一个循环，按指定间隔清理过期数据。"""
+        logger.info("数据库数据保留清理循环已启动。")
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.compact()
+            except Exception:
+                logger.error("数据库清理失败", exc_info=True)
+
+    def get_query_stats(self, top: Optional[int] = None) -> dict:
+        """返回运行时查询统计（按总耗时排序）和最近的慢查询，供排查数据库耗时使用。"""
+        return self.metrics.snapshot(top)
+
+    async def start_metrics_log_loop(self, interval_seconds: int, top: int = 10):
+        """启动一个循环，定期把最耗时的数据库方法汇总写入日志。"""
+        logger.info("数据库查询统计日志循环已启动。")
+        while True:
+            await asyncio.sleep(interval_seconds)
+            snapshot = self.metrics.snapshot(top)
+            summary = {
+                name: {
+                    "calls": stats["calls"],
+                    "rows": stats["rows"],
+                    "total_ms": stats["latency"]["total_ms"],
+                    "p99_ms": stats["latency"]["p99_ms"],
+                    "queue_wait_p99_ms": stats["queue_wait"]["p99_ms"],
+                }
+                for name, stats in snapshot["methods"].items()
+            }
+            logger.info(
+                "数据库查询统计",
+                extra={
+                    "methods": summary,
+                    "slow_query_count": len(snapshot["slow_queries"]),
+                },
+            )
+
+    def _observe_query(
+        self,
+        label: str,
+        query: str,
+        args: Any,
+        elapsed: float,
+        queue_wait: float,
+        rows: int,
+        error: bool,
+    ):
+        """记录一次调用的统计；超过慢查询阈值时在后台补充查询计划并写入慢查询日志。"""
+        is_slow = self.metrics.record(label, elapsed, queue_wait, rows, error)
+        if is_slow and not error:
+            task = asyncio.create_task(
+                self._log_slow_query(label, query, args, elapsed, queue_wait, rows)
+            )
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    def _observe_write(
+        self,
+        write: PendingWrite,
+        elapsed: float,
+        queue_wait: float,
+        rows: int,
+        error: bool,
+    ):
+        # 以第一条语句代表这次写入；executemany 的参数是一个列表，用第一组参数生成查询计划即可
+        sql, args, many = write.statements[0]
+        if many:
+            args = args[0] if args else ()
+        self._observe_query(write.label, sql, args, elapsed, queue_wait, rows, error)
+
+    async def _log_slow_query(
+        self,
+        label: str,
+        query: str,
+        args: Any,
+        elapsed: float,
+        queue_wait: float,
+        rows: int,
+    ):
+        plan: Optional[list[str]] = None
+        try:
+            plan_rows, _ = await self._fetch(
+                f"EXPLAIN QUERY PLAN {query}", args, "all", time.perf_counter()
+            )
+            plan = [row[-1] for row in plan_rows]
+        except Exception:
+            logger.debug("获取慢查询的查询计划失败", exc_info=True)
+        entry = self.metrics.add_slow_query(
+            label, query, elapsed, queue_wait, rows, plan
+        )
+        logger.warning("检测到慢查询", extra=entry)
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[None]:
+        """
+        工作单元：上下文内通过本对象执行的所有读写都在写连接上的同一个事务中完成，
+        正常退出时只提交一次，抛出异常时全部回滚。
+        进入时先等待此前排队的写入提交，持有期间其他写入只排队，因此上下文内不要等待网络等慢操作，
+        也不要等待其他任务的写入完成（它们要等本工作单元退出后才会执行）。
+        嵌套使用时并入外层工作单元。
+        """
+        if self._in_unit_of_work():
+            yield
+            return
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        async with self.writer.exclusive():
+            unit = _UnitOfWork(self, asyncio.current_task())
+            token = _current_unit_of_work.set(unit)
+            try:
+                yield
+            except BaseException:
+                await self._run_on_writer(_finish_transaction, False)
+                raise
+            else:
+                await self._run_on_writer(_finish_transaction, True)
+            finally:
+                unit.active = False
+                _current_unit_of_work.reset(token)
+
+    async def _run_on_writer(self, fn, *args: Any) -> Any:
+        """在写连接的工作线程中以 fn(sqlite3 连接, *args) 执行，与组提交批次串行。"""
+        if self.conn is None:
+            raise RuntimeError("数据库连接未初始化")
+        return await run_on_connection(self.conn, fn, *args)
+
+    def _in_unit_of_work(self) -> bool:
+        current = _current_unit_of_work.get()
+        return (
+            current is not None
+            and current.active
+            and current.database is self
+            and current.task is asyncio.current_task()
+        )
+
+    async def _execute_in_unit_of_work(
+        self,
+        label: str,
+        statements: list[tuple[str, Any, bool]],
+        fetch: str | None = None,
+    ) -> Any:
+        """在当前工作单元的事务中直接执行（读取也走写连接，能看到本事务尚未提交的写入）。"""
+        assert self.conn is not None
+        submitted_at = time.perf_counter()
+        queue_wait, rows, failed = 0.0, 0, True
+        try:
+            result, queue_wait = await self._run_on_writer(
+                _run_in_transaction, statements, fetch, submitted_at
+            )
+            failed = False
+            if fetch is None:
+                rows = sum(max(r, 0) for r in result)
+            elif fetch == "one":
+                rows = 1 if result is not None else 0
+            else:
+                rows = len(result)
+            return result
+        finally:
+            sql, args, many = statements[0]
+            if many:
+                args = args[0] if args else ()
+            self._observe_query(
+                label,
+                sql,
+                args,
+                time.perf_counter() - submitted_at,
+                queue_wait,
+                rows,
+                failed,
+            )
+
     async def _execute(
         self, query: str, args: tuple[Any, ...] | None = None, fetch: str | None = None
     ) -> Any:
         """通用的执行函数"""
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        label = _query_label.get()
+        if self._in_unit_of_work():
+            result = await self._execute_in_unit_of_work(
+                label, [(query, args or (), False)], fetch
+            )
+            return result[0] if fetch is None else result
+        # 对于 INSERT, UPDATE, DELETE，交给组提交写入器，与并发的其他写入共用一次提交
+        if fetch is None:
+            return await self.writer.submit(query, args, label=label)
+
+        submitted_at = time.perf_counter()
+        queue_wait, rows, failed = 0.0, 0, True
+        try:
+            result, queue_wait = await self._fetch(query, args, fetch, submitted_at)
+            failed = False
+            if fetch == "one":
+                rows = 1 if result is not None else 0
+            else:
+                rows = len(result)
+            return result
+        finally:
+            self._observe_query(
+                label,
+                query,
+                args,
+                time.perf_counter() - submitted_at,
+                queue_wait,
+                rows,
+                failed,
+            )
+
+    async def _fetch(
+        self,
+        query: str,
+        args: tuple[Any, ...] | None,
+        fetch: str,
+        submitted_at: float,
+    ) -> tuple[Any, float]:
+        """执行只读查询，返回 (结果, 排队等待时间)。等待借出读连接的时间也计入排队。"""
         if self.conn is None:
             raise RuntimeError("数据库连接未初始化")
+        # 只读查询优先走只读连接池，不再排在写入和备份后面
+        if self.read_pool is not None:
+            async with self.read_pool.acquire() as conn:
+                return await run_on_connection(
+                    conn, _run_query, query, args or (), fetch, submitted_at
+                )
         # 5. SQLite的参数占位符是 '?' 而不是 '%s'
-        async with self.conn.cursor() as cursor:
-            await cursor.execute(query, args or ())
-            if fetch == "one":
-                result = await cursor.fetchone()
-                return result
-            if fetch == "all":
-                result = await cursor.fetchall()
-                return result
-            # 对于 INSERT, UPDATE, DELETE，我们需要手动提交
-            await self.conn.commit()
-            return cursor.rowcount
+        return await self._run_on_writer(
+            _run_query, query, args or (), fetch, submitted_at
+        )
+
+    async def _executemany(self, query: str, args_seq: list[tuple]) -> int:
+        """批量执行同一条写语句，同样经由组提交写入器。"""
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        label = _query_label.get()
+        if self._in_unit_of_work():
+            rowcounts = await self._execute_in_unit_of_work(
+                label, [(query, args_seq, True)]
+            )
+            return rowcounts[0]
+        return await self.writer.submit(query, args_seq, many=True, label=label)
+
+    async def _execute_atomic(
+        self, statements: list[tuple[str, Any, bool]]
+    ) -> list[int]:
+        """
+        原子地执行多条写语句 (sql, 参数, 是否 executemany)：全部成功或全部回滚。
+        返回每条语句的 rowcount。
+        """
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        label = _query_label.get()
+        if self._in_unit_of_work():
+            return await self._execute_in_unit_of_work(label, statements)
+        return await self.writer.submit_atomic(statements, label=label)
+
+    @_keeps_caller_label
+    async def pipeline(self, statements: list[PipelineStatement]) -> list[Any]:
+        """
+        把多条语句一次性交给工作线程执行，只占用一次线程往返，按顺序返回每条语句的结果。
+        全部是查询时走只读连接，并在同一个读事务中执行，结果来自同一个快照。
+        包含写语句时独占写连接（等此前排队的写入提交后进入），在一个事务中执行并立即提交，
+        全部语句原子生效，不等待组提交的收集窗口，适合用户交互触发、需要尽快完成的少量写入；
+        已在工作单元中时直接并入工作单元的事务。
+        """
+        if self.conn is None or self.writer is None:
+            raise RuntimeError("数据库连接未初始化")
+        if not statements:
+            return []
+        label = _query_label.get()
+        read_only = all(mode in _PIPELINE_QUERY_MODES for _, _, mode in statements)
+        if self._in_unit_of_work():
+            return await self._run_pipeline(label, statements, "savepoint")
+        if read_only:
+            return await self._run_pipeline(label, statements, "snapshot")
+        async with self.writer.exclusive():
+            return await self._run_pipeline(label, statements, "commit")
+
+    async def _run_pipeline(
+        self, label: str, statements: list[PipelineStatement], transaction: str
+    ) -> list[Any]:
+        assert self.conn is not None
+        submitted_at = time.perf_counter()
+        queue_wait, rows, failed = 0.0, 0, True
+        try:
+            if transaction == "snapshot" and self.read_pool is not None:
+                async with self.read_pool.acquire() as conn:
+                    results, queue_wait = await run_on_connection(
+                        conn, _run_pipeline, statements, submitted_at, transaction
+                    )
+            else:
+                # 工作单元中的查询走写连接，才能看到本事务尚未提交的写入
+                results, queue_wait = await self._run_on_writer(
+                    _run_pipeline, statements, submitted_at, transaction
+                )
+            failed = False
+            for (_, _, mode), result in zip(statements, results):
+                if mode == "one":
+                    rows += 1 if result is not None else 0
+                elif mode == "all":
+                    rows += len(result)
+                else:
+                    rows += max(result, 0)
+            return results
+        finally:
+            # 以第一条语句代表整条流水线；参数依赖前面结果时无法生成查询计划，用空参数代替
+            sql, args, mode = statements[0]
+            self._observe_query(
+                label,
+                sql,
+                () if callable(args) or mode == "many" else args,
+                time.perf_counter() - submitted_at,
+                queue_wait,
+                rows,
+                failed,
+            )
 
     async def ensure_author_exists(self, author_id: int, author_name: str):
         """确保作者存在于数据库中，如果不存在则创建，如果存在则更新其名称。"""
@@ -151,9 +1004,11 @@ class Database:
         添加一个关注关系。
         返回 True 表示成功关注，False 表示已经关注过。
         """
-        await self.ensure_author_exists(author_id, author_name)
+        # 作者和关注关系在同一个事务中写入，清理任务不会在两者之间删掉“孤立”的作者
         sql = "INSERT OR IGNORE INTO followers (user_id, author_id) VALUES (?, ?)"
-        rows_affected = await self._execute(sql, (user_id, author_id))
+        async with self.unit_of_work():
+            await self.ensure_author_exists(author_id, author_name)
+            rows_affected = await self._execute(sql, (user_id, author_id))
         return rows_affected > 0
 
     async def remove_follower(self, user_id: int, author_id: int) -> bool:
@@ -171,6 +1026,15 @@ class Database:
         results = await self._execute(sql, (author_id,), fetch="all")
         return [row["user_id"] for row in results] if results else []
 
+    async def get_all_follower_edges(self) -> list[tuple[int, int]]:
+        """
+        读取全部关注关系 (author_id, user_id)，按 author_id、user_id 排序，用于构建内存关注者索引。
+        直接按 (author_id, user_id) 索引顺序读取，不需要排序。
+        """
+        sql = "SELECT author_id, user_id FROM followers ORDER BY author_id, user_id"
+        results = await self._execute(sql, fetch="all")
+        return [(author_id, user_id) for author_id, user_id in results]
+
     async def get_followed_authors(self, user_id: int) -> list[int]:
         """获取一个用户关注的所有作者的ID列表"""
         sql = "SELECT author_id FROM followers WHERE user_id = ?"
@@ -217,17 +1081,16 @@ class Database:
         rows_affected = await self._execute(sql, (user_id, message_id))
         return rows_affected > 0
 
-    async def get_competition_by_id(self, message_id: int) -> Optional[dict]:
+    # 列顺序需与 competitions_from_rows 一致
+    _COMPETITION_COLUMNS = (
+        "message_id, channel_id, guild_id, last_submission_ids, created_at, updated_at"
+    )
+
+    async def get_competition_by_id(self, message_id: int) -> Optional[Competition]:
         """通过message_id获取比赛信息。"""
-        sql = "SELECT * FROM competitions WHERE message_id = ?"
+        sql = f"SELECT {self._COMPETITION_COLUMNS} FROM competitions WHERE message_id = ?"
         result = await self._execute(sql, (message_id,), fetch="one")
-        if result:
-            competition_dict = dict(result)
-            competition_dict["last_submission_ids"] = json.loads(
-                competition_dict["last_submission_ids"]
-            )
-            return competition_dict
-        return None
+        return competitions_from_rows((result,))[0] if result else None
 
     async def get_subscribers_for_competition(self, message_id: int) -> list[int]:
         """获取一个比赛的所有订阅者ID。"""
@@ -241,57 +1104,77 @@ class Database:
         sql = "UPDATE competitions SET last_submission_ids = ? WHERE message_id = ?"
         await self._execute(sql, (ids_json, message_id))
 
-    async def get_all_followed_competitions(self) -> list[dict]:
+    async def get_all_followed_competitions(self) -> list[Competition]:
         """获取所有被关注的比赛信息。"""
-        sql = "SELECT * FROM competitions"
+        sql = f"SELECT {self._COMPETITION_COLUMNS} FROM competitions"
         results = await self._execute(sql, fetch="all")
-        if not results:
-            return []
-
-        competitions = []
-        for row in results:
-            competition_dict = dict(row)
-            competition_dict["last_submission_ids"] = json.loads(
-                competition_dict["last_submission_ids"]
-            )
-            competitions.append(competition_dict)
-        return competitions
+        return competitions_from_rows(results) if results else []
 
     # 4. 为帖子追踪添加新的数据库方法
-    async def add_post(self, post_id: int, author_id: int, created_at: datetime):
-        """记录作者发布的新帖子"""
-        # 将时区感知的datetime转换为UTC天真时间以便存入SQLite
-        utc_created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
-        sql = "INSERT OR IGNORE INTO author_posts (post_id, author_id, created_at) VALUES (?, ?, ?)"
-        await self._execute(sql, (post_id, author_id, utc_created_at))
+    async def add_post(self, post_id: int, author_id: int):
+        """记录作者发布的新帖子（发帖时间由帖子的雪花 ID 推导，无需单独存储）"""
+        sql = "INSERT OR IGNORE INTO author_posts (post_id, author_id) VALUES (?, ?)"
+        await self._execute(sql, (post_id, author_id))
+
+    async def upsert_authors_in_batch(self, authors: list[tuple]):
+        """
+        批量写入或更新作者名称。
+        authors 是一个元组列表，每个元组包含 (author_id, author_name)
+        """
+        sql = """
+            INSERT INTO authors (author_id, author_name) VALUES (?, ?)
+            ON CONFLICT(author_id) DO UPDATE SET author_name = excluded.author_name;
+        """
+        await self._executemany(sql, authors)
+
+    async def add_posts_in_batch(self, posts: list[tuple]):
+        """
+        批量记录作者帖子（作者必须已存在）。
+        posts 是一个元组列表，每个元组包含 (post_id, author_id)
+        """
+        sql = "INSERT OR IGNORE INTO author_posts (post_id, author_id) VALUES (?, ?)"
+        await self._executemany(sql, posts)
+
+    async def get_last_view(self, user_id: int) -> datetime:
+        """获取用户上次查看时间，从未查看过则返回 Unix 纪元。"""
+        sql = "SELECT last_viewed_at FROM user_last_view WHERE user_id = ?"
+        result = await self._execute(sql, (user_id,), fetch="one")
+        return from_epoch_ms(result["last_viewed_at"] if result else 0)
+
+    async def update_last_views_in_batch(self, last_views: list[tuple]):
+        """
+        批量更新用户的上次查看时间，只会把时间往后推（延迟写入时，较早的时间戳不会覆盖较新的）。
+        last_views 是一个元组列表，每个元组包含 (user_id, viewed_at)
+        """
+        sql = """
+            INSERT INTO user_last_view (user_id, last_viewed_at) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET last_viewed_at = max(last_viewed_at, excluded.last_viewed_at)
+        """
+        await self._executemany(
+            sql,
+            [(user_id, to_epoch_ms(viewed_at)) for user_id, viewed_at in last_views],
+        )
 
     async def get_and_update_last_view(self, user_id: int) -> datetime:
         """获取用户上次查看时间，并更新为当前时间。返回上次查看的时间。"""
         sql_get = "SELECT last_viewed_at FROM user_last_view WHERE user_id = ?"
         result = await self._execute(sql_get, (user_id,), fetch="one")
+        # 如果是第一次查看，返回一个很早的时间
+        last_view_time = from_epoch_ms(result["last_viewed_at"] if result else 0)
 
-        last_view_time = datetime(1970, 1, 1)  # 如果是第一次查看，返回一个很早的时间
-        if result and result["last_viewed_at"]:
-            try:
-                # aiosqlite可能返回字符串，需要转换回datetime对象
-                last_view_time = datetime.fromisoformat(result["last_viewed_at"])
-            except (TypeError, ValueError):
-                # 兼容旧格式
-                last_view_time = datetime.strptime(
-                    result["last_viewed_at"], "%Y-%m-%d %H:%M:%S"
-                )
-
-        # 将当前时间（UTC）更新到数据库
-        now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+        # 将当前时间更新到数据库
         sql_update = "INSERT OR REPLACE INTO user_last_view (user_id, last_viewed_at) VALUES (?, ?)"
-        await self._execute(sql_update, (user_id, now_utc))
+        await self._execute(sql_update, (user_id, now_ms()))
 
         return last_view_time
 
     async def get_new_post_counts(
         self, author_ids: list[int], since_timestamp: datetime
     ) -> list[dict]:
-        """获取指定作者们在某个时间点之后的新帖子数量"""
+        """
+        获取指定作者们在某个时间点之后的新帖子数量。
+        时间点先换算为雪花 ID 下界，查询变成索引上的整数范围扫描。
+        """
         if not author_ids:
             return []
 
@@ -299,35 +1182,103 @@ class Database:
         sql = f"""
             SELECT author_id, COUNT(post_id) as new_posts_count
             FROM author_posts
-            WHERE author_id IN ({placeholders}) AND created_at > ?
+            WHERE author_id IN ({placeholders}) AND post_id >= ?
             GROUP BY author_id
         """
 
-        params = tuple(author_ids) + (since_timestamp,)
+        params = tuple(author_ids) + (snowflake_after(since_timestamp),)
         results = await self._execute(sql, params, fetch="all")
         return [dict(row) for row in results] if results else []
 
+    async def get_followed_authors_with_new_posts(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        mark_viewed_at: Optional[datetime] = None,
+    ) -> list[dict]:
+        """
+        获取用户关注的作者（ID、名字）以及每位作者在 since 之后的新帖子数 (new_posts)。
+        since 为 None 时使用数据库中记录的上次查看时间。
+        给出 mark_viewed_at 时，同时把上次查看时间更新为该时间（只会往后推）。
+        全部语句通过流水线在一次线程往返中完成，查询看到的是更新之前的数据。
+        """
+        followed_sql = """
+            SELECT f.author_id, a.author_name
+            FROM followers f
+            JOIN authors a ON f.author_id = a.author_id
+            WHERE f.user_id = ?
+        """
+        counts_sql = """
+            SELECT author_id, COUNT(post_id) AS new_posts_count
+            FROM author_posts
+            WHERE author_id IN (SELECT author_id FROM followers WHERE user_id = ?)
+              AND post_id >= ?
+            GROUP BY author_id
+        """
+        statements: list[PipelineStatement] = []
+        if since is None:
+            statements.append(
+                (
+                    "SELECT last_viewed_at FROM user_last_view WHERE user_id = ?",
+                    (user_id,),
+                    "one",
+                )
+            )
+
+            def counts_args(results: list[Any]) -> tuple[int, int]:
+                last_viewed_at = results[0]["last_viewed_at"] if results[0] else 0
+                return user_id, snowflake_lower_bound(last_viewed_at + 1)
+
+            statements.append((counts_sql, counts_args, "all"))
+        else:
+            statements.append((counts_sql, (user_id, snowflake_after(since)), "all"))
+        statements.append((followed_sql, (user_id,), "all"))
+        if mark_viewed_at is not None:
+            statements.append(
+                (
+                    """
+                    INSERT INTO user_last_view (user_id, last_viewed_at) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        last_viewed_at = max(last_viewed_at, excluded.last_viewed_at)
+                    """,
+                    (user_id, to_epoch_ms(mark_viewed_at)),
+                    None,
+                )
+            )
+
+        results = await self.pipeline(statements)
+        # 没有给出 since 时，第一条是读取上次查看时间的查询
+        counts_index = 1 if since is None else 0
+        counts_rows, followed_rows = results[counts_index], results[counts_index + 1]
+        new_posts = {row["author_id"]: row["new_posts_count"] for row in counts_rows}
+        return [
+            {
+                "author_id": row["author_id"],
+                "author_name": row["author_name"],
+                "new_posts": new_posts.get(row["author_id"], 0),
+            }
+            for row in followed_rows
+        ]
+
     # --- 关键词关注方法 ---
 
     async def get_keyword_subscription(
         self, user_id: int, channel_id: int
-    ) -> Optional[dict]:
+    ) -> Optional[KeywordSubscription]:
         """获取用户在特定频道下的关键词订阅设置。"""
-        sql = "SELECT * FROM keyword_subscriptions WHERE user_id = ? AND channel_id = ?"
-        result = await self._execute(sql, (user_id, channel_id), fetch="one")
-        if not result:
+        sql = """
+            SELECT ks.user_id, ks.channel_id, ks.is_subscribed, ks.rule,
+                   ks.include_tags, ks.exclude_tags, k.kind, k.keyword
+            FROM keyword_subscriptions ks
+            LEFT JOIN subscription_keywords k
+                ON k.user_id = ks.user_id AND k.channel_id = ks.channel_id
+            WHERE ks.user_id = ? AND ks.channel_id = ?
+            ORDER BY k.kind, k.keyword
+        """
+        results = await self._execute(sql, (user_id, channel_id), fetch="all")
+        if not results:
             return None
-
-        subscription = dict(result)
-        # 将数据库中的 0/1 转换为布尔值
-        subscription["is_subscribed"] = bool(subscription.get("is_subscribed", 0))
-        subscription["followed_keywords"] = json.loads(
-            subscription.get("followed_keywords") or "[]"
-        )
-        subscription["blocked_keywords"] = json.loads(
-            subscription.get("blocked_keywords") or "[]"
-        )
-        return subscription
+        return subscriptions_from_rows(results)[0]
 
     async def upsert_keyword_subscription(
         self,
@@ -337,60 +1288,321 @@ class Database:
         followed_keywords: list[str],
         blocked_keywords: list[str],
     ):
-        """创建或更新用户的关键词订阅设置，包括订阅状态。"""
-        followed_json = json.dumps(followed_keywords)
-        blocked_json = json.dumps(blocked_keywords)
-        sql = """
-            INSERT INTO keyword_subscriptions (user_id, channel_id, is_subscribed, followed_keywords, blocked_keywords)
-            VALUES (?, ?, ?, ?, ?)
+        """创建或更新用户的关键词订阅设置，包括订阅状态。订阅行和关键词在同一事务中原子更新。"""
+        upsert_sql = """
+            INSERT INTO keyword_subscriptions (user_id, channel_id, is_subscribed)
+            VALUES (?, ?, ?)
             ON CONFLICT(user_id, channel_id) DO UPDATE SET
-                is_subscribed = excluded.is_subscribed,
-                followed_keywords = excluded.followed_keywords,
-                blocked_keywords = excluded.blocked_keywords;
+                is_subscribed = excluded.is_subscribed;
         """
-        await self._execute(
-            sql, (user_id, channel_id, is_subscribed, followed_json, blocked_json)
+        await self._execute_atomic(
+            [(upsert_sql, (user_id, channel_id, is_subscribed), False)]
+            + self._keyword_statements(
+                user_id, channel_id, followed_keywords, blocked_keywords
+            )
         )
 
-    async def get_all_subscriptions_for_channel(self, channel_id: int) -> list[dict]:
-        """获取特定频道下的所有有效订阅 (is_subscribed = 1)。"""
-        sql = "SELECT * FROM keyword_subscriptions WHERE channel_id = ? AND is_subscribed = 1"
-        results = await self._execute(sql, (channel_id,), fetch="all")
-        if not results:
-            return []
+    @staticmethod
+    def _keyword_statements(
+        user_id: int,
+        channel_id: int,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ) -> list[tuple[str, Any, bool]]:
+        """替换订阅关键词的写语句：先删除旧关键词，再批量插入新关键词。"""
+        delete_sql = (
+            "DELETE FROM subscription_keywords WHERE user_id = ? AND channel_id = ?"
+        )
+        insert_sql = """
+            INSERT OR IGNORE INTO subscription_keywords (channel_id, kind, keyword, user_id)
+            VALUES (?, ?, ?, ?)
+        """
+        keyword_rows = [
+            (channel_id, "followed", kw, user_id) for kw in followed_keywords
+        ] + [(channel_id, "blocked", kw, user_id) for kw in blocked_keywords]
+        statements: list[tuple[str, Any, bool]] = [
+            (delete_sql, (user_id, channel_id), False)
+        ]
+        if keyword_rows:
+            statements.append((insert_sql, keyword_rows, True))
+        return statements
 
-        subscriptions = []
-        for row in results:
-            subscription = dict(row)
-            subscription["is_subscribed"] = True  # We already filtered for this
-            subscription["followed_keywords"] = json.loads(
-                subscription.get("followed_keywords") or "[]"
+    async def set_subscription_keywords(
+        self,
+        user_id: int,
+        channel_id: int,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ):
+        """
+        只替换用户在频道下的关键词，保留原有的订阅状态（没有订阅记录时创建一条未关注的记录）。
+        不需要先读出订阅状态；由面板交互触发，全部语句通过流水线在一次线程往返中原子提交。
+        """
+        insert_sql = """
+            INSERT OR IGNORE INTO keyword_subscriptions (user_id, channel_id, is_subscribed)
+            VALUES (?, ?, 0)
+        """
+        statements: list[PipelineStatement] = [(insert_sql, (user_id, channel_id), None)]
+        statements.extend(
+            (sql, args, "many" if many else None)
+            for sql, args, many in self._keyword_statements(
+                user_id, channel_id, followed_keywords, blocked_keywords
             )
-            subscription["blocked_keywords"] = json.loads(
-                subscription.get("blocked_keywords") or "[]"
+        )
+        await self.pipeline(statements)
+
+    async def set_subscription_rule(
+        self, user_id: int, channel_id: int, rule: Optional[str]
+    ):
+        """
+        只替换用户在频道下的组合规则（None 表示清除），保留订阅状态和关键词；
+        没有订阅记录时创建一条未关注的记录。通过流水线在一次线程往返中原子提交。
+        """
+        insert_sql = """
+            INSERT OR IGNORE INTO keyword_subscriptions (user_id, channel_id, is_subscribed)
+            VALUES (?, ?, 0)
+        """
+        update_sql = """
+            UPDATE keyword_subscriptions SET rule = ?
+            WHERE user_id = ? AND channel_id = ?
+        """
+        await self.pipeline(
+            [
+                (insert_sql, (user_id, channel_id), None),
+                (update_sql, (rule, user_id, channel_id), None),
+            ]
+        )
+
+    async def set_subscription_tag_filters(
+        self, user_id: int, channel_id: int, include_tags: int, exclude_tags: int
+    ):
+        """
+        只替换用户在频道下的标签筛选位掩码，保留订阅状态、关键词和规则；
+        没有订阅记录时创建一条未关注的记录。通过流水线在一次线程往返中原子提交。
+        """
+        insert_sql = """
+            INSERT OR IGNORE INTO keyword_subscriptions (user_id, channel_id, is_subscribed)
+            VALUES (?, ?, 0)
+        """
+        update_sql = """
+            UPDATE keyword_subscriptions SET include_tags = ?, exclude_tags = ?
+            WHERE user_id = ? AND channel_id = ?
+        """
+        await self.pipeline(
+            [
+                (insert_sql, (user_id, channel_id), None),
+                (update_sql, (include_tags, exclude_tags, user_id, channel_id), None),
+            ]
+        )
+
+    async def get_channel_tag_slots(self, channel_id: int) -> dict[int, int]:
+        """频道中已分配位槽的标签，返回 {tag_id: slot}。"""
+        sql = "SELECT tag_id, slot FROM channel_tag_slots WHERE channel_id = ?"
+        results = await self._execute(sql, (channel_id,), fetch="all")
+        return {row["tag_id"]: row["slot"] for row in results} if results else {}
+
+    async def assign_channel_tag_slots(
+        self,
+        channel_id: int,
+        tag_ids: Iterable[int],
+        available_tag_ids: Iterable[int],
+    ) -> dict[int, int]:
+        """
+        确保 tag_ids 都分配了位槽，返回频道的全部 {tag_id: slot}。
+        位槽用完时回收论坛中已删除的标签（available_tag_ids 之外），并在同一事务中从所有订阅的掩码里清除这些位。
+        位槽不足时抛出 TagSlotsExhausted。
+        """
+        async with self.unit_of_work():
+            slots = await self.get_channel_tag_slots(channel_id)
+            added, reclaimed = allocate_tag_slots(slots, tag_ids, available_tag_ids)
+            if not added:
+                return slots
+            statements: list[PipelineStatement] = []
+            if reclaimed:
+                freed_mask = sum(1 << slot for slot in reclaimed.values())
+                statements.append(
+                    (
+                        """
+                        UPDATE keyword_subscriptions
+                        SET include_tags = include_tags & ~?1, exclude_tags = exclude_tags & ~?1
+                        WHERE channel_id = ?2 AND ((include_tags | exclude_tags) & ?1) <> 0
+                        """,
+                        (freed_mask, channel_id),
+                        None,
+                    )
+                )
+                statements.append(
+                    (
+                        "DELETE FROM channel_tag_slots WHERE channel_id = ? AND tag_id = ?",
+                        [(channel_id, tag_id) for tag_id in reclaimed],
+                        "many",
+                    )
+                )
+            statements.append(
+                (
+                    "INSERT INTO channel_tag_slots (channel_id, tag_id, slot) VALUES (?, ?, ?)",
+                    [(channel_id, tag_id, slot) for tag_id, slot in added.items()],
+                    "many",
+                )
             )
-            subscriptions.append(subscription)
-        return subscriptions
+            await self.pipeline(statements)
+        for tag_id in reclaimed:
+            del slots[tag_id]
+        slots.update(added)
+        return slots
+
+    async def set_channel_subscribed(
+        self, user_id: int, channel_id: int, is_subscribed: bool
+    ) -> bool:
+        """
+        只修改订阅状态，关键词保持不变。关注时不存在订阅记录则创建；
+        取消关注只更新已有的记录。返回是否写入了订阅记录。
+        由面板交互触发，通过流水线立即提交。
+        """
+        if is_subscribed:
+            sql = """
+                INSERT INTO keyword_subscriptions (user_id, channel_id, is_subscribed)
+                VALUES (?, ?, 1)
+                ON CONFLICT(user_id, channel_id) DO UPDATE SET is_subscribed = 1
+            """
+        else:
+            sql = """
+                UPDATE keyword_subscriptions SET is_subscribed = 0
+                WHERE user_id = ? AND channel_id = ?
+            """
+        (rows_affected,) = await self.pipeline([(sql, (user_id, channel_id), None)])
+        return rows_affected > 0
+
+    async def get_all_subscriptions_for_channel(
+        self, channel_id: int
+    ) -> list[KeywordSubscription]:
+        """获取特定频道下的所有有效订阅 (is_subscribed = 1)。"""
+        sql = """
+            SELECT ks.user_id, ks.channel_id, ks.is_subscribed, ks.rule,
+                   ks.include_tags, ks.exclude_tags, k.kind, k.keyword
+            FROM keyword_subscriptions ks
+            LEFT JOIN subscription_keywords k
+                ON k.user_id = ks.user_id AND k.channel_id = ks.channel_id
+            WHERE ks.channel_id = ? AND ks.is_subscribed = 1
+        """
+        results = await self._execute(sql, (channel_id,), fetch="all")
+        return subscriptions_from_rows(results) if results else []
 
-    async def get_subscribed_channels_for_user(self, user_id: int) -> list[dict]:
+    async def get_subscribed_channels_for_user(
+        self, user_id: int
+    ) -> list[KeywordSubscription]:
         """获取用户已订阅的所有频道信息。"""
-        sql = "SELECT * FROM keyword_subscriptions WHERE user_id = ? AND is_subscribed = 1"
+        sql = """
+            SELECT ks.user_id, ks.channel_id, ks.is_subscribed, ks.rule,
+                   ks.include_tags, ks.exclude_tags, k.kind, k.keyword
+            FROM keyword_subscriptions ks
+            LEFT JOIN subscription_keywords k
+                ON k.user_id = ks.user_id AND k.channel_id = ks.channel_id
+            WHERE ks.user_id = ? AND ks.is_subscribed = 1
+        """
         results = await self._execute(sql, (user_id,), fetch="all")
-        if not results:
-            return []
+        return subscriptions_from_rows(results) if results else []
 
-        subscriptions = []
-        for row in results:
-            subscription = dict(row)
-            subscription["is_subscribed"] = True
-            subscription["followed_keywords"] = json.loads(
-                subscription.get("followed_keywords") or "[]"
-            )
-            subscription["blocked_keywords"] = json.loads(
-                subscription.get("blocked_keywords") or "[]"
+    @staticmethod
+    def _post_tag_filter_sql(
+        channel_id: int, tag_ids: Iterable[int]
+    ) -> tuple[str, tuple]:
+        """
+        新帖标签通过订阅 ks 的标签筛选的条件：没有设置筛选的订阅直接通过；
+        其余订阅与新帖的标签掩码比较，掩码由标签 ID 按频道的位槽换算
+        （不相关的标量子查询，每次查询只计算一次，按主键查找）。返回 (SQL 片段, 参数)。
+        """
+        tag_ids = list(tag_ids)
+        placeholders = ", ".join("?" * len(tag_ids))
+        mask_sql = f"""(
+            SELECT COALESCE(SUM(1 << slot), 0) FROM channel_tag_slots
+            WHERE channel_id = ? AND tag_id IN ({placeholders})
+        )"""
+        sql = f"""
+              AND (
+                  ks.include_tags = 0 AND ks.exclude_tags = 0
+                  OR (
+                      (ks.include_tags = 0 OR (ks.include_tags & {mask_sql}) <> 0)
+                      AND (ks.exclude_tags & {mask_sql}) = 0
+                  )
+              )
+        """
+        return sql, (channel_id, *tag_ids) * 2
+
+    async def get_channel_keyword_recipients(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[int]:
+        """
+        直接在数据库中计算某频道的新帖子需要通知的用户。
+        先在索引上遍历该频道的关键词，找出出现在 search_content 中的词 (hits)，再按规则筛选订阅者：
+        屏蔽词优先 > 命中关注词 > 既没有关注词也没有组合规则的全量订阅。
+        组合规则无法在 SQL 中判断，由 get_channel_rule_subscriptions 取出后在服务层计算。
+        此外新帖的标签 (tag_ids) 必须通过订阅的标签筛选。search_content 应当已经转为小写。
+        """
+        tag_filter_sql, tag_filter_args = self._post_tag_filter_sql(channel_id, tag_ids)
+        sql = f"""
+            WITH hits AS MATERIALIZED (
+                SELECT user_id, kind FROM subscription_keywords
+                WHERE channel_id = ? AND instr(?, keyword) > 0
             )
-            subscriptions.append(subscription)
-        return subscriptions
+            SELECT ks.user_id
+            FROM keyword_subscriptions ks
+            WHERE ks.channel_id = ? AND ks.is_subscribed = 1 AND ks.user_id <> ?
+              AND ks.user_id NOT IN (SELECT user_id FROM hits WHERE kind = 'blocked')
+              AND (
+                  ks.user_id IN (SELECT user_id FROM hits WHERE kind = 'followed')
+                  OR (
+                      ks.rule IS NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM subscription_keywords k
+                          WHERE k.user_id = ks.user_id
+                            AND k.channel_id = ks.channel_id
+                            AND k.kind = 'followed'
+                      )
+                  )
+              )
+              {tag_filter_sql}
+        """
+        results = await self._execute(
+            sql,
+            (channel_id, search_content, channel_id, exclude_user_id, *tag_filter_args),
+            fetch="all",
+        )
+        return [row["user_id"] for row in results] if results else []
+
+    async def get_channel_rule_subscriptions(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[tuple[int, str]]:
+        """
+        某频道中设置了组合规则、没有被屏蔽词排除、且新帖标签通过标签筛选的有效订阅，返回 (user_id, rule)。
+        规则本身由调用方判断。search_content 应当已经转为小写。
+        """
+        tag_filter_sql, tag_filter_args = self._post_tag_filter_sql(channel_id, tag_ids)
+        sql = f"""
+            SELECT ks.user_id, ks.rule
+            FROM keyword_subscriptions ks
+            WHERE ks.channel_id = ? AND ks.rule IS NOT NULL
+              AND ks.is_subscribed = 1 AND ks.user_id <> ?
+              {tag_filter_sql}
+              AND ks.user_id NOT IN (
+                  SELECT user_id FROM subscription_keywords
+                  WHERE channel_id = ? AND kind = 'blocked' AND instr(?, keyword) > 0
+              )
+        """
+        results = await self._execute(
+            sql,
+            (channel_id, exclude_user_id, *tag_filter_args, channel_id, search_content),
+            fetch="all",
+        )
+        return [(row["user_id"], row["rule"]) for row in results] if results else []
 
     # --- Thread Favorites Methods ---
 
@@ -408,7 +1620,7 @@ class Database:
             VALUES (?, ?, ?, ?, ?)
         """
         rows_affected = await self._execute(
-            sql, (user_id, thread_id, thread_name, guild_id, added_at)
+            sql, (user_id, thread_id, thread_name, guild_id, to_epoch_ms(added_at))
         )
         return rows_affected > 0
 
@@ -418,42 +1630,75 @@ class Database:
         rows_affected = await self._execute(sql, (user_id, thread_id))
         return rows_affected > 0
 
-    async def get_user_favorites_paginated(
-        self, user_id: int, limit: int, offset: int
-    ) -> list[dict]:
-        """分页获取用户的收藏帖子列表。"""
+    async def get_user_favorites_after(
+        self, user_id: int, limit: int, cursor: Optional[tuple[Any, int]] = None
+    ) -> list[Favorite]:
+        """
+        基于游标 (added_at, id) 向后（更早的收藏）获取一页收藏。
+        cursor 为 None 时从最新的收藏开始。直接在索引上定位，开销与页码无关。
+        """
+        if cursor is None:
+            sql = """
+                SELECT id, thread_id, thread_name, guild_id, added_at
+                FROM thread_favorites
+                WHERE user_id = ?
+                ORDER BY added_at DESC, id DESC
+                LIMIT ?
+            """
+            params: tuple[Any, ...] = (user_id, limit)
+        else:
+            sql = """
+                SELECT id, thread_id, thread_name, guild_id, added_at
+                FROM thread_favorites
+                WHERE user_id = ? AND (added_at, id) < (?, ?)
+                ORDER BY added_at DESC, id DESC
+                LIMIT ?
+            """
+            params = (user_id, cursor[0], cursor[1], limit)
+        results = await self._execute(sql, params, fetch="all")
+        return favorites_from_rows(results) if results else []
+
+    async def get_user_favorites_before(
+        self, user_id: int, limit: int, cursor: tuple[Any, int]
+    ) -> list[Favorite]:
+        """基于游标 (added_at, id) 向前（更新的收藏）获取一页收藏，结果仍按时间倒序排列。"""
         sql = """
-            SELECT thread_id, thread_name, guild_id, added_at
+            SELECT id, thread_id, thread_name, guild_id, added_at
             FROM thread_favorites
-            WHERE user_id = ?
-            ORDER BY added_at DESC
-            LIMIT ? OFFSET ?
+            WHERE user_id = ? AND (added_at, id) > (?, ?)
+            ORDER BY added_at ASC, id ASC
+            LIMIT ?
         """
-        results = await self._execute(sql, (user_id, limit, offset), fetch="all")
+        results = await self._execute(
+            sql, (user_id, cursor[0], cursor[1], limit), fetch="all"
+        )
         if not results:
             return []
+        return favorites_from_rows(reversed(results))
 
-        # 将 added_at 字符串转换为 datetime 对象
-        processed_results = []
-        for row in results:
-            row_dict = dict(row)
-            if row_dict.get("added_at"):
-                try:
-                    row_dict["added_at"] = datetime.fromisoformat(row_dict["added_at"])
-                except (TypeError, ValueError):
-                    # 添加一个备用解析，以防万一数据库中存在旧格式
-                    try:
-                        row_dict["added_at"] = datetime.strptime(
-                            row_dict["added_at"], "%Y-%m-%d %H:%M:%S.%f"
-                        )
-                    except ValueError:
-                        row_dict["added_at"] = datetime.strptime(
-                            row_dict["added_at"], "%Y-%m-%d %H:%M:%S"
-                        )
-
-            processed_results.append(row_dict)
-
-        return processed_results
+    async def get_user_favorites_page_boundaries(
+        self, user_id: int, page_size: int
+    ) -> list[Optional[tuple[Any, int]]]:
+        """
+        构建用户收藏的稀疏页边界索引：第 N 个元素是第 N+1 页的起始游标
+        （即上一页最后一条的 (added_at, id)），第一页的游标为 None。
+        只在覆盖索引上走一遍，结果可以缓存，用于任意页跳转。
+        """
+        sql = """
+            SELECT added_at, id, rn
+            FROM (
+                SELECT added_at, id,
+                       ROW_NUMBER() OVER (ORDER BY added_at DESC, id DESC) AS rn
+                FROM thread_favorites
+                WHERE user_id = ?
+            )
+            WHERE rn % ? = 0
+        """
+        results = await self._execute(sql, (user_id, page_size), fetch="all")
+        boundaries: list[Optional[tuple[Any, int]]] = [None]
+        for row in sorted(results or [], key=lambda r: r["rn"]):
+            boundaries.append((row["added_at"], row["id"]))
+        return boundaries
 
     async def get_user_favorites_count(self, user_id: int) -> int:
         """获取用户收藏的帖子总数。"""
@@ -476,12 +1721,20 @@ class Database:
             INSERT OR IGNORE INTO thread_favorites (user_id, thread_id, thread_name, guild_id, added_at)
             VALUES (?, ?, ?, ?, ?)
         """
-        if self.conn is None:
-            raise RuntimeError("数据库连接未初始化")
+        # 同一批收藏的 added_at 通常相同，分页时按 id 区分先后；
+        # 按 (added_at, 帖子雪花 ID) 的顺序插入，使同一时刻收藏的帖子按帖子创建时间排列
+        rows = sorted(
+            (to_epoch_ms(added_at), thread_id, user_id, thread_name, guild_id)
+            for user_id, thread_id, thread_name, guild_id, added_at in favorites_data
+        )
         # executemany 是批量操作的最佳方式
-        async with self.conn.cursor() as cursor:
-            await cursor.executemany(sql, favorites_data)
-            await self.conn.commit()
+        await self._executemany(
+            sql,
+            [
+                (user_id, thread_id, thread_name, guild_id, added_at_ms)
+                for added_at_ms, thread_id, user_id, thread_name, guild_id in rows
+            ],
+        )
 
     async def remove_favorites_in_batch(
         self, user_id: int, thread_ids: list[int]
@@ -514,7 +1767,7 @@ class Database:
         使用 UPSERT 语法批量更新或插入一个帖子的成员列表，包括帖子名称。
         这可以确保数据是最新的，并且避免了重复记录。
         """
-        now = datetime.now(timezone.utc)
+        now = now_ms()
         data = [
             (thread_id, user_id, guild_id, now, thread_name) for user_id in member_ids
         ]
@@ -526,15 +1779,13 @@ class Database:
                 last_seen = excluded.last_seen,
                 thread_name = excluded.thread_name;
         """
-        if self.conn is None:
-            raise RuntimeError("数据库连接未初始化")
-        async with self.conn.cursor() as cursor:
-            await cursor.executemany(sql, data)
-            await self.conn.commit()
+        await self._executemany(sql, data)
 
-    async def get_user_active_threads(self, user_id: int, guild_id: int) -> list[dict]:
+    async def get_user_active_threads(
+        self, user_id: int, guild_id: int
+    ) -> list[ActiveThread]:
         """
-        获取用户所在的所有活跃帖子的ID和名称。
+        获取用户所在的所有活跃帖子的ID和名称，按帖子创建时间（雪花 ID）从新到旧排列。
         现在直接从 active_thread_members 表中获取名称。
         """
         sql = """
@@ -543,15 +1794,16 @@ class Database:
                 thread_name
             FROM active_thread_members
             WHERE user_id = ? AND guild_id = ?
+            ORDER BY thread_id DESC
         """
         results = await self._execute(sql, (user_id, guild_id), fetch="all")
-        return [dict(row) for row in results] if results else []
+        return active_threads_from_rows(results) if results else []
 
     async def get_unfavorited_active_threads(
         self, user_id: int, guild_id: int
-    ) -> list[dict]:
+    ) -> list[ActiveThread]:
         """
-        获取用户已加入但尚未收藏的活跃帖子列表（ID和名称）。
+        获取用户已加入但尚未收藏的活跃帖子列表（ID和名称），按帖子创建时间从新到旧排列。
         这通过查找在 active_thread_members 中但不在 thread_favorites 中的记录来实现。
         现在可以直接从 active_thread_members 表获取名称。
         """
@@ -567,9 +1819,10 @@ class Database:
                   FROM thread_favorites tf
                   WHERE tf.user_id = atm.user_id AND tf.thread_id = atm.thread_id
               )
+            ORDER BY atm.thread_id DESC
         """
         results = await self._execute(sql, (user_id, guild_id), fetch="all")
-        return [dict(row) for row in results] if results else []
+        return active_threads_from_rows(results) if results else []
 
     async def remove_active_thread_member(self, user_id: int, thread_id: int):
         """从活跃帖子成员缓存中移除一个特定的用户-帖子关系。"""
@@ -579,8 +1832,9 @@ class Database:
     async def _run_migrations(self):
         """
         执行基于版本的数据库迁移。
-        此方法会检查 `src/migrations/versions` 目录下的 .sql 文件，
+        此方法会检查 `src/migrations/versions` 目录下的 .sql 和 .py 文件，
         并与数据库中存储的 `user_version` 进行比较，然后按顺序应用所有新的迁移。
+        .py 迁移在这里只执行其中的 SCHEMA；定义了 backfill 的，数据回填在连接完成后于后台分批执行。
         """
         logger.info("正在检查并运行数据库迁移...")
 
@@ -605,12 +1859,25 @@ class Database:
         # 3. 获取所有迁移脚本并排序
         try:
             migration_files = sorted(
-                migrations_path.glob("*.sql"), key=lambda p: int(p.stem.split("_")[0])
+                [*migrations_path.glob("*.sql"), *migrations_path.glob("*.py")],
+                key=lambda p: int(p.stem.split("_")[0]),
             )
         except (ValueError, IndexError):
-            logger.error("迁移文件名格式不正确，应为 'XXX_description.sql'。")
+            logger.error("迁移文件名格式不正确，应为 'XXX_description.sql' 或 'XXX_description.py'。")
             raise
 
+        # Python 迁移无论是否已应用都要加载：上次运行中断的回填需要在本次启动后继续
+        migration_modules = {}
+        self._online_migrations = []
+        for migration_file in migration_files:
+            if migration_file.suffix != ".py":
+                continue
+            module = load_migration_module(migration_file)
+            migration_modules[migration_file] = module
+            online_migration = online_migration_from_module(migration_file, module)
+            if online_migration is not None:
+                self._online_migrations.append(online_migration)
+
         latest_version = current_version
         for migration_file in migration_files:
             try:
@@ -620,8 +1887,13 @@ class Database:
                     logger.info(
                         f"准备应用迁移脚本: v{file_version} - {migration_file.name}"
                     )
-                    with open(migration_file, "r", encoding="utf-8") as f:
-                        sql_script = f.read()
+                    if migration_file.suffix == ".py":
+                        sql_script = getattr(
+                            migration_modules[migration_file], "SCHEMA", ""
+                        )
+                    else:
+                        with open(migration_file, "r", encoding="utf-8") as f:
+                            sql_script = f.read()
 
                     # aiosqlite 的 executescript 是同步的，但对于 DDL 来说通常没问题
                     if self.conn is None:
@@ -645,6 +1917,119 @@ class Database:
         else:
             logger.info(f"数据库迁移完成，当前版本为: {latest_version}")
 
+    async def _start_online_migrations(self) -> None:
+        """登记所有数据回填的完成标记，已完成的直接置位，其余的在后台任务中按版本顺序执行。"""
+        if not self._online_migrations:
+            return
+        await self._executemany(
+            "INSERT OR IGNORE INTO online_migrations (name, version) VALUES (?, ?)",
+            [(m.name, m.version) for m in self._online_migrations],
+        )
+        rows = await self._execute(
+            "SELECT name, status FROM online_migrations", fetch="all"
+        )
+        statuses = {row["name"]: row["status"] for row in rows}
+        pending = []
+        for migration in self._online_migrations:
+            event = self._migration_events[migration.name] = asyncio.Event()
+            if statuses.get(migration.name) == "done":
+                event.set()
+            else:
+                pending.append(migration)
+        if pending:
+            logger.info(
+                "开始在后台执行数据回填",
+                extra={"migrations": [m.name for m in pending]},
+            )
+            self._online_migration_task = asyncio.create_task(
+                self._run_online_migrations(pending)
+            )
+
+    async def _run_online_migrations(self, migrations: list[OnlineMigration]) -> None:
+        """
+        依次执行数据回填。每一批在独占的写连接上作为一个短事务提交（连同进度），
+        批与批之间暂停 online_migration_pause，期间正常的写入照常提交。
+        某个回填失败后不再执行后面的回填（它们可能依赖前面的数据），下次启动时重试。
+        """
+        assert self.conn is not None and self.writer is not None
+        for index, migration in enumerate(migrations):
+            row = await self._execute(
+                "SELECT cursor FROM online_migrations WHERE name = ?",
+                (migration.name,),
+                fetch="one",
+            )
+            cursor_json = row["cursor"] if row else None
+            progress = BackfillProgress(migration.name, started_at=time.perf_counter())
+            try:
+                while True:
+                    started_at = time.perf_counter()
+                    async with self.writer.exclusive():
+                        cursor_json, rows, done = await self._run_on_writer(
+                            run_backfill_batch,
+                            migration,
+                            cursor_json,
+                            migration.batch_size,
+                        )
+                    elapsed = time.perf_counter() - started_at
+                    progress.record_batch(rows, elapsed * 1000)
+                    self.metrics.record("online_migration", elapsed, 0.0, rows, False)
+                    if done:
+                        break
+                    await asyncio.sleep(self.online_migration_pause)
+            except asyncio.CancelledError:
+                logger.info("数据回填已暂停，下次启动时继续", extra=progress.to_log_context())
+                raise
+            except Exception as e:
+                logger.error(
+                    "数据回填失败，后续回填将在下次启动时重试",
+                    extra={
+                        **progress.to_log_context(),
+                        "skipped": [m.name for m in migrations[index + 1 :]],
+                    },
+                    exc_info=True,
+                )
+                self.metrics.record("online_migration", 0.0, 0.0, 0, True)
+                try:
+                    async with self.writer.exclusive():
+                        await self._run_on_writer(
+                            mark_backfill_failed, migration.name, repr(e)
+                        )
+                except Exception:
+                    logger.warning(
+                        "记录数据回填失败状态时出错",
+                        extra={"migration": migration.name},
+                        exc_info=True,
+                    )
+                for failed in migrations[index:]:
+                    self._failed_migrations.add(failed.name)
+                    self._migration_events[failed.name].set()
+                return
+            logger.info("数据回填完成", extra=progress.to_log_context())
+            self._migration_events[migration.name].set()
+
+    def is_migration_complete(self, name: str) -> bool:
+        """数据回填是否已完成。name 是定义了 backfill 的 Python 迁移的文件名（不含扩展名，形如 NNN_描述）。"""
+        event = self._migration_events.get(name)
+        if event is None:
+            raise KeyError(f"未知的在线迁移: {name}")
+        return event.is_set() and name not in self._failed_migrations
+
+    async def wait_for_migration(
+        self, name: str, timeout: Optional[float] = None
+    ) -> bool:
+        """
+        等待数据回填完成，供依赖回填数据的功能在使用前调用。
+        返回是否已完成：回填失败（本次运行不会再完成）或等待超时时返回 False。
+        """
+        event = self._migration_events.get(name)
+        if event is None:
+            raise KeyError(f"未知的在线迁移: {name}")
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return name not in self._failed_migrations
+
     # --- Thread Join Queue Methods ---
 
     async def add_thread_to_join_queue(self, thread_id: int, guild_id: int):
@@ -660,6 +2045,5 @@ class Database:
 
     async def update_join_queue_status(self, thread_id: int, status: str):
         """更新队列中一个帖子的状态和最后尝试时间。"""
-        now_utc = datetime.now(timezone.utc)
         sql = "UPDATE thread_join_queue SET status = ?, last_attempted_at = ? WHERE thread_id = ?"
-        await self._execute(sql, (status, now_utc, thread_id))
+        await self._execute(sql, (status, now_ms(), thread_id))
@@ -0,0 +1,149 @@
+import bisect
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收集所有更慢的调用
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+@dataclass
+class LatencyHistogram:
+    """固定分桶的延迟直方图，记录次数、总耗时和最大值。"""
+
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, pct: float) -> float:
+        """按桶上界估算分位数（毫秒）。"""
+        total = self.count
+        if total == 0:
+            return 0.0
+        threshold = total * pct / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {label: c for label, c in zip(labels, self.counts) if c},
+        }
+
+
+@dataclass
+class MethodStats:
+    """单个 Database 方法的累计统计。"""
+
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    queue_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "latency": self.latency.to_dict(),
+            "queue_wait": self.queue_wait.to_dict(),
+        }
+
+
+class DatabaseMetrics:
+    """
+    Database 的运行时查询统计。
+    按方法名汇总延迟直方图、行数和排队等待时间（等待 aiosqlite 工作线程或组提交批次的时间），
+    并保留最近的慢查询记录（含 EXPLAIN QUERY PLAN），可随时通过 snapshot() 查询。
+    """
+
+    def __init__(self, slow_query_threshold_ms: float, slow_log_size: int = 100):
+        self.slow_query_threshold_ms = slow_query_threshold_ms
+        self.methods: dict[str, MethodStats] = {}
+        self.slow_queries: deque[dict] = deque(maxlen=slow_log_size)
+        self.started_at = time.time()
+
+    def record(
+        self,
+        method: str,
+        elapsed: float,
+        queue_wait: float,
+        rows: int,
+        error: bool = False,
+    ) -> bool:
+        """
+        记录一次调用（参数单位为秒）。
+        返回 True 表示这次调用超过了慢查询阈值，调用方应补充记录其查询计划。
+        """
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        elapsed_ms = elapsed * 1000
+        stats.calls += 1
+        stats.rows += max(rows, 0)
+        if error:
+            stats.errors += 1
+        stats.latency.record(elapsed_ms)
+        stats.queue_wait.record(queue_wait * 1000)
+        return elapsed_ms >= self.slow_query_threshold_ms
+
+    def add_slow_query(
+        self,
+        method: str,
+        sql: str,
+        elapsed: float,
+        queue_wait: float,
+        rows: int,
+        plan: Optional[list[str]],
+    ) -> dict:
+        entry: dict[str, Any] = {
+            "at": time.time(),
+            "method": method,
+            "sql": " ".join(sql.split()),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "queue_wait_ms": round(queue_wait * 1000, 3),
+            "rows": rows,
+            "plan": plan,
+        }
+        self.slow_queries.append(entry)
+        return entry
+
+    def snapshot(self, top: Optional[int] = None) -> dict:
+        """按总耗时从高到低返回各方法的统计，以及最近的慢查询。"""
+        ordered = sorted(
+            self.methods.items(), key=lambda kv: kv[1].latency.total_ms, reverse=True
+        )
+        if top is not None:
+            ordered = ordered[:top]
+        return {
+            "since": self.started_at,
+            "slow_query_threshold_ms": self.slow_query_threshold_ms,
+            "methods": {name: stats.to_dict() for name, stats in ordered},
+            "slow_queries": list(self.slow_queries),
+        }
+
+    def reset(self) -> None:
+        self.methods.clear()
+        self.slow_queries.clear()
+        self.started_at = time.time()
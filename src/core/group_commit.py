@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional, Union
+
+import aiosqlite
+
+from src.core.sqlite_worker import run_on_connection
+
+logger = logging.getLogger(__name__)
+
+
+# 一条写语句: (sql, 参数, 是否 executemany)
+Statement = tuple[str, Any, bool]
+
+
+@dataclass
+class PendingWrite:
+    """一次排队等待组提交的写入，可以包含多条需要原子执行的语句。"""
+
+    statements: list[Statement]
+    future: asyncio.Future
+    # 统计标签（发起写入的 Database 方法名）
+    label: str = "unknown"
+    submitted_at: float = field(default_factory=time.perf_counter)
+
+
+# 每次写入完成后的回调: (写入, 总耗时秒, 排队等待秒, 行数, 是否出错)
+WriteObserver = Callable[[PendingWrite, float, float, int, bool], None]
+
+
+def apply_atomic(
+    sqlite_conn: sqlite3.Connection, statements: list[Statement]
+) -> list[int]:
+    """
+    在当前事务中把一次写入的全部语句包在一个 SAVEPOINT 中执行，返回各条语句的 rowcount。
+    任何一条语句失败时只回滚这些语句并重新抛出异常，不影响事务中的其他写入。
+    调用方负责开启事务（否则最外层 SAVEPOINT 的 RELEASE 会直接提交）。
+    """
+    sqlite_conn.execute("SAVEPOINT group_commit_write")
+    try:
+        rowcounts = []
+        for sql, args, many in statements:
+            if many:
+                cursor = sqlite_conn.executemany(sql, args)
+            else:
+                cursor = sqlite_conn.execute(sql, args)
+            rowcounts.append(cursor.rowcount)
+    except sqlite3.Error:
+        # 少数错误（如磁盘已满）会让 SQLite 回滚整个事务，此时已没有 SAVEPOINT 可回滚
+        if sqlite_conn.in_transaction:
+            sqlite_conn.execute("ROLLBACK TO group_commit_write")
+            sqlite_conn.execute("RELEASE group_commit_write")
+        raise
+    sqlite_conn.execute("RELEASE group_commit_write")
+    return rowcounts
+
+
+def _apply_batch(
+    sqlite_conn: sqlite3.Connection, batch: list[list[Statement]]
+) -> tuple[float, list[Any]]:
+    """
+    在 aiosqlite 的工作线程中执行一整批写入，并只提交一次。
+    每次写入包在自己的 SAVEPOINT 中：其中任何一条语句失败，只回滚这一次写入的全部语句，
+    不影响同批次的其他写入。每次写入的结果是其各条语句的 rowcount 列表。
+    同时返回工作线程开始处理这一批的时间，用于统计排队等待时间。
+    """
+    started_at = time.perf_counter()
+    results: list[Any] = []
+    if not sqlite_conn.in_transaction:
+        # 显式开启事务，否则最外层 SAVEPOINT 的 RELEASE 会直接提交
+        sqlite_conn.execute("BEGIN")
+    for statements in batch:
+        try:
+            results.append(apply_atomic(sqlite_conn, statements))
+        except sqlite3.Error as e:
+            # 整个事务已被 SQLite 回滚时，同批次之前的写入其实也已丢失，必须让整批失败。
+            if not sqlite_conn.in_transaction:
+                raise
+            results.append(e)
+    try:
+        sqlite_conn.commit()
+    except sqlite3.Error:
+        sqlite_conn.rollback()
+        raise
+    return started_at, results
+
+
+@dataclass
+class _ExclusiveRequest:
+    """一次独占写连接的申请：写入器处理到它时先提交之前的批次，再把写连接交给申请方直到其释放。"""
+
+    granted: asyncio.Future
+    released: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class GroupCommitWriter:
+    """
+    组提交写入器。
+    所有 INSERT/UPDATE/DELETE 先进入队列，由后台任务在一个短暂的时间窗口内
+    或攒够一定数量后，放在同一个事务中执行并只提交一次（一次 fsync）。
+    每个调用者拿到的仍然是它自己那条语句的 rowcount。
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        flush_interval: float,
+        max_batch_size: int,
+        observer: Optional[WriteObserver] = None,
+    ):
+        self.conn = conn
+        self.observer = observer
+        self.flush_interval = flush_interval
+        self.max_batch_size = max(1, max_batch_size)
+        # 队列中的 None 是停止信号
+        self._queue: asyncio.Queue[
+            Optional[Union[PendingWrite, _ExclusiveRequest]]
+        ] = asyncio.Queue()
+        # 收集批次时遇到的独占申请，在当前批次提交之后处理
+        self._exclusive: Optional[_ExclusiveRequest] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "数据库组提交写入器已启动",
+            extra={
+                "flush_interval_ms": self.flush_interval * 1000,
+                "max_batch_size": self.max_batch_size,
+            },
+        )
+
+    async def submit(
+        self, sql: str, args: Any = None, many: bool = False, label: str = "unknown"
+    ) -> int:
+        """提交一条写语句，等待其所在批次提交后返回该语句的 rowcount。"""
+        rowcounts = await self.submit_atomic([(sql, args or (), many)], label)
+        return rowcounts[0]
+
+    async def submit_atomic(
+        self, statements: list[Statement], label: str = "unknown"
+    ) -> list[int]:
+        """
+        提交多条需要原子执行的写语句（全部成功或全部回滚），
+        等待其所在批次提交后返回每条语句的 rowcount。
+        """
+        if self._task is None or self._task.done() or self._closing:
+            raise RuntimeError("组提交写入器未运行")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(PendingWrite(list(statements), future, label))
+        return await future
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[None]:
+        """
+        独占写连接：排在此前提交的所有写入之后，等它们提交完毕再进入，
+        退出前其他写入只会排队，不会与持有方的语句混入同一个事务。
+        持有期间应只执行数据库语句，不要等待网络等慢操作。
+        """
+        if self._task is None or self._task.done() or self._closing:
+            raise RuntimeError("组提交写入器未运行")
+        request = _ExclusiveRequest(asyncio.get_running_loop().create_future())
+        self._queue.put_nowait(request)
+        try:
+            await request.granted
+            yield
+        finally:
+            # 即使在等待期间被取消，也要释放，否则写入器会一直等下去
+            request.released.set()
+
+    async def _collect_batch(self) -> tuple[list[PendingWrite], bool]:
+        """
+        等待第一条写入，然后在时间窗口内尽量多收集一些，直到达到批次上限。
+        返回 (批次, 是否收到了停止信号)。
+        """
+        batch: list[PendingWrite] = []
+        first = await self._queue.get()
+        if first is None:
+            return batch, True
+        if isinstance(first, _ExclusiveRequest):
+            self._exclusive = first
+            return batch, False
+        batch.append(first)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            if item is None:
+                return batch, True
+            if isinstance(item, _ExclusiveRequest):
+                # 独占申请之后的写入必须等它释放，当前批次到此为止
+                self._exclusive = item
+                break
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, batch: list[PendingWrite]) -> None:
+        if not batch:
+            return
+        items = [w.statements for w in batch]
+        try:
+            # 整批语句和提交在工作线程中一次完成，只占用一次线程往返
+            started_at, results = await run_on_connection(
+                self.conn, _apply_batch, items
+            )
+        except Exception as e:
+            logger.error(
+                "组提交批次执行失败", extra={"batch_size": len(batch)}, exc_info=True
+            )
+            finished_at = time.perf_counter()
+            for write in batch:
+                self._observe(write, finished_at, finished_at, -1, True)
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return
+
+        finished_at = time.perf_counter()
+        for write, result in zip(batch, results):
+            failed = isinstance(result, Exception)
+            rows = -1 if failed else sum(max(r, 0) for r in result)
+            self._observe(write, finished_at, started_at, rows, failed)
+            if write.future.done():
+                continue
+            if failed:
+                write.future.set_exception(result)
+            else:
+                write.future.set_result(result)
+        logger.debug("组提交批次已完成", extra={"batch_size": len(batch)})
+
+    def _observe(
+        self,
+        write: PendingWrite,
+        finished_at: float,
+        started_at: float,
+        rows: int,
+        error: bool,
+    ) -> None:
+        if self.observer is None:
+            return
+        try:
+            self.observer(
+                write,
+                finished_at - write.submitted_at,
+                max(0.0, started_at - write.submitted_at),
+                rows,
+                error,
+            )
+        except Exception:
+            logger.warning("记录写入统计失败", exc_info=True)
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect_batch()
+            await self._flush(batch)
+            if self._exclusive is not None:
+                await self._grant_exclusive(self._exclusive)
+                self._exclusive = None
+
+    @staticmethod
+    async def _grant_exclusive(request: _ExclusiveRequest) -> None:
+        if not request.granted.done():
+            request.granted.set_result(None)
+        await request.released.wait()
+
+    async def close(self) -> None:
+        """停止接收新写入，把队列中剩余的写入全部落盘后再退出后台任务。"""
+        if self._task is None:
+            return
+        self._closing = True
+        if not self._task.done():
+            # 停止信号排在所有已提交的写入之后，因此它们都会先被提交
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        logger.info("数据库组提交写入器已停止")
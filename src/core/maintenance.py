@@ -0,0 +1,77 @@
+"""
+需要停机执行的数据库维护命令。
+
+用法 (在项目根目录执行，执行前先停止机器人):
+    python -m src.core.maintenance enable-incremental-vacuum [--db odysseia.db]
+
+enable-incremental-vacuum：把旧数据库切换为 auto_vacuum=INCREMENTAL，之后数据保留清理任务
+才能分批归还空闲页。切换需要一次全量 VACUUM：它会重写整个数据库文件并全程持有写锁，
+耗时与文件大小成正比（SSD 上大约每 GB 一分钟），期间还需要约等于数据库大小的额外磁盘空间。
+已经是 INCREMENTAL 的数据库直接跳过；新建的数据库在创建时就已开启，无需执行。
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+from dotenv import find_dotenv, load_dotenv
+
+from src.core.compaction import database_file_size
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum 的取值：0 = NONE，1 = FULL，2 = INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def enable_incremental_vacuum(db_name: str) -> bool:
+    """切换为增量 VACUUM 并执行一次全量 VACUUM。已经开启时返回 False，不做任何修改。"""
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    try:
+        current = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if current == AUTO_VACUUM_INCREMENTAL:
+            logger.info("数据库已开启增量 VACUUM，跳过", extra={"db_name": db_name})
+            return False
+        bytes_before = database_file_size(db_name)
+        logger.info(
+            "开始全量 VACUUM 以开启增量 VACUUM，期间数据库不可写",
+            extra={"db_name": db_name, "auto_vacuum": current, "file_bytes": bytes_before},
+        )
+        started_at = time.perf_counter()
+        conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info(
+            "已开启增量 VACUUM",
+            extra={
+                "db_name": db_name,
+                "file_bytes_before": bytes_before,
+                "file_bytes_after": database_file_size(db_name),
+                "elapsed_seconds": round(time.perf_counter() - started_at, 3),
+            },
+        )
+        return True
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    load_dotenv(find_dotenv())
+    parser = argparse.ArgumentParser(description="数据库维护命令（需要先停止机器人）")
+    parser.add_argument("command", choices=["enable-incremental-vacuum"])
+    parser.add_argument(
+        "--db",
+        default=os.getenv("DB_NAME", "odysseia.db"),
+        help="数据库文件路径，默认读取 DB_NAME",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if not os.path.exists(args.db):
+        parser.error(f"数据库文件不存在: {args.db}")
+    enable_incremental_vacuum(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+import bisect
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+
+from src.core.repository import FavoritesCursor
+from src.core.row_models import ActiveThread, Competition, Favorite, KeywordSubscription
+from src.core.snowflake import snowflake_after
+from src.core.tag_slots import allocate_tag_slots, tags_to_mask
+from src.core.timestamps import from_epoch_ms, now_ms, to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+
+def _foreign_key_failed() -> sqlite3.IntegrityError:
+    return sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+
+
+class InMemoryDatabase:
+    """
+    Repository 接口的纯内存实现，所有数据保存在 dict / set 中，不产生任何磁盘 I/O。
+    语义与 SQLite 后端保持一致（INSERT OR IGNORE 的返回值、外键约束、游标分页等），
+    用于大规模基准测试、通知扇出模拟，以及作为 SQLite 性能的对照基线。
+    """
+
+    def __init__(self):
+        # 作者关注：authors 为 {author_id: author_name}，关注关系按两个方向各建一份索引
+        self._authors: dict[int, str] = {}
+        self._followers_by_author: dict[int, set[int]] = {}
+        self._authors_by_user: dict[int, set[int]] = {}
+        # 作者帖子：{post_id: author_id}，每个作者的帖子雪花 ID 保持有序（即按发帖时间），便于按时间计数
+        self._post_authors: dict[int, int] = {}
+        self._post_ids_by_author: dict[int, list[int]] = {}
+        self._last_views: dict[int, int] = {}
+        # 比赛关注
+        self._competitions: dict[int, dict] = {}
+        self._competition_subscribers: dict[int, set[int]] = {}
+        # 关键词订阅：{(user_id, channel_id): 订阅}，并按频道/用户各建一份索引
+        self._subscriptions: dict[tuple[int, int], dict] = {}
+        self._subscribers_by_channel: dict[int, set[int]] = {}
+        self._channels_by_user: dict[int, set[int]] = {}
+        # 频道标签位槽：{channel_id: {tag_id: slot}}
+        self._tag_slots: dict[int, dict[int, int]] = {}
+        # 收藏：{user_id: {thread_id: 收藏记录}}，以及每个用户按 (added_at 毫秒时间戳, id) 升序排列的游标列表
+        self._favorites: dict[int, dict[int, dict]] = {}
+        self._favorite_keys: dict[int, list[FavoritesCursor]] = {}
+        self._favorites_by_id: dict[int, dict] = {}
+        self._next_favorite_id = 1
+        # 活跃帖子成员：{(thread_id, user_id): 记录}，并按用户建索引
+        self._active_members: dict[tuple[int, int], dict] = {}
+        self._active_threads_by_user: dict[int, set[int]] = {}
+
+    async def connect(self) -> None:
+        logger.info("内存存储后端已就绪")
+
+    async def close(self) -> None:
+        logger.info("内存存储后端已关闭")
+
+    def is_migration_complete(self, name: str) -> bool:
+        """内存后端每次启动都是空库，没有需要回填的旧数据。"""
+        return True
+
+    async def wait_for_migration(
+        self, name: str, timeout: Optional[float] = None
+    ) -> bool:
+        return True
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncIterator[None]:
+        """
+        与 SQLite 后端的接口保持一致。内存后端的每个方法内部不会让出事件循环，本身就是原子的；
+        这里不记录撤销日志，上下文中抛出异常时不会回滚已执行的调用。
+        """
+        yield
+
+    # --- 作者关注方法 ---
+
+    async def ensure_author_exists(self, author_id: int, author_name: str):
+        """确保作者存在，如果已存在则更新其名称。"""
+        self._authors[author_id] = author_name
+
+    async def add_follower(
+        self, user_id: int, author_id: int, author_name: str
+    ) -> bool:
+        """添加一个关注关系。返回 True 表示成功关注，False 表示已经关注过。"""
+        await self.ensure_author_exists(author_id, author_name)
+        followers = self._followers_by_author.setdefault(author_id, set())
+        if user_id in followers:
+            return False
+        followers.add(user_id)
+        self._authors_by_user.setdefault(user_id, set()).add(author_id)
+        return True
+
+    async def remove_follower(self, user_id: int, author_id: int) -> bool:
+        """移除一个关注关系。返回 True 表示成功取关，False 表示之前未关注。"""
+        followers = self._followers_by_author.get(author_id)
+        if not followers or user_id not in followers:
+            return False
+        followers.discard(user_id)
+        self._authors_by_user[user_id].discard(author_id)
+        return True
+
+    async def get_followers_for_author(self, author_id: int) -> list[int]:
+        return list(self._followers_by_author.get(author_id, ()))
+
+    async def get_all_follower_edges(self) -> list[tuple[int, int]]:
+        return [
+            (author_id, user_id)
+            for author_id in sorted(self._followers_by_author)
+            for user_id in sorted(self._followers_by_author[author_id])
+        ]
+
+    async def get_followed_authors(self, user_id: int) -> list[int]:
+        return list(self._authors_by_user.get(user_id, ()))
+
+    async def get_followed_authors_with_names(self, user_id: int) -> list[dict]:
+        return [
+            {"author_id": author_id, "author_name": self._authors[author_id]}
+            for author_id in self._authors_by_user.get(user_id, ())
+        ]
+
+    async def add_post(self, post_id: int, author_id: int):
+        """记录作者发布的新帖子，已存在的帖子会被忽略。"""
+        if author_id not in self._authors:
+            raise _foreign_key_failed()
+        if post_id in self._post_authors:
+            return
+        self._post_authors[post_id] = author_id
+        bisect.insort(self._post_ids_by_author.setdefault(author_id, []), post_id)
+
+    async def upsert_authors_in_batch(self, authors: list[tuple]):
+        """批量写入或更新作者名称，每个元组为 (author_id, author_name)。"""
+        for author_id, author_name in authors:
+            self._authors[author_id] = author_name
+
+    async def add_posts_in_batch(self, posts: list[tuple]):
+        """批量记录作者帖子，每个元组为 (post_id, author_id)。"""
+        # 与 SQLite 后端一致：整批在一个 SAVEPOINT 中执行，有一行外键失败则整批都不写入
+        if any(author_id not in self._authors for _, author_id in posts):
+            raise _foreign_key_failed()
+        for post_id, author_id in posts:
+            await self.add_post(post_id, author_id)
+
+    async def get_last_view(self, user_id: int) -> datetime:
+        """获取用户上次查看时间，从未查看过则返回 Unix 纪元。"""
+        return from_epoch_ms(self._last_views.get(user_id, 0))
+
+    async def update_last_views_in_batch(self, last_views: list[tuple]):
+        """批量更新上次查看时间（只往后推），每个元组为 (user_id, viewed_at)。"""
+        for user_id, viewed_at in last_views:
+            viewed_ms = to_epoch_ms(viewed_at)
+            if viewed_ms > self._last_views.get(user_id, viewed_ms - 1):
+                self._last_views[user_id] = viewed_ms
+
+    async def get_and_update_last_view(self, user_id: int) -> datetime:
+        """获取用户上次查看时间，并更新为当前时间。"""
+        last_view_time = from_epoch_ms(self._last_views.get(user_id, 0))
+        self._last_views[user_id] = now_ms()
+        return last_view_time
+
+    async def get_new_post_counts(
+        self, author_ids: list[int], since_timestamp: datetime
+    ) -> list[dict]:
+        lower_bound = snowflake_after(since_timestamp)
+        counts = []
+        for author_id in dict.fromkeys(author_ids):
+            post_ids = self._post_ids_by_author.get(author_id)
+            if not post_ids:
+                continue
+            new_posts = len(post_ids) - bisect.bisect_left(post_ids, lower_bound)
+            if new_posts:
+                counts.append({"author_id": author_id, "new_posts_count": new_posts})
+        return counts
+
+    async def get_followed_authors_with_new_posts(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        mark_viewed_at: Optional[datetime] = None,
+    ) -> list[dict]:
+        if since is None:
+            since = await self.get_last_view(user_id)
+        if mark_viewed_at is not None:
+            await self.update_last_views_in_batch([(user_id, mark_viewed_at)])
+        lower_bound = snowflake_after(since)
+        authors = []
+        for author_id in self._authors_by_user.get(user_id, ()):
+            post_ids = self._post_ids_by_author.get(author_id, [])
+            authors.append(
+                {
+                    "author_id": author_id,
+                    "author_name": self._authors[author_id],
+                    "new_posts": len(post_ids)
+                    - bisect.bisect_left(post_ids, lower_bound),
+                }
+            )
+        return authors
+
+    # --- 比赛关注方法 ---
+
+    async def ensure_competition_exists(
+        self, message_id: int, channel_id: int, guild_id: int, initial_ids: list[str]
+    ):
+        if message_id in self._competitions:
+            return
+        now = from_epoch_ms(now_ms())
+        self._competitions[message_id] = {
+            "message_id": message_id,
+            "channel_id": channel_id,
+            "guild_id": guild_id,
+            "last_submission_ids": list(initial_ids),
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def add_competition_subscriber(self, user_id: int, message_id: int) -> bool:
+        if message_id not in self._competitions:
+            raise _foreign_key_failed()
+        subscribers = self._competition_subscribers.setdefault(message_id, set())
+        if user_id in subscribers:
+            return False
+        subscribers.add(user_id)
+        return True
+
+    async def remove_competition_subscriber(
+        self, user_id: int, message_id: int
+    ) -> bool:
+        subscribers = self._competition_subscribers.get(message_id)
+        if not subscribers or user_id not in subscribers:
+            return False
+        subscribers.discard(user_id)
+        return True
+
+    @staticmethod
+    def _copy_competition(competition: dict) -> Competition:
+        return Competition(
+            **{
+                **competition,
+                "last_submission_ids": list(competition["last_submission_ids"]),
+            }
+        )
+
+    async def get_competition_by_id(self, message_id: int) -> Optional[Competition]:
+        competition = self._competitions.get(message_id)
+        return self._copy_competition(competition) if competition else None
+
+    async def get_subscribers_for_competition(self, message_id: int) -> list[int]:
+        return list(self._competition_subscribers.get(message_id, ()))
+
+    async def update_competition_submissions(self, message_id: int, new_ids: list[str]):
+        competition = self._competitions.get(message_id)
+        if competition is not None:
+            competition["last_submission_ids"] = list(new_ids)
+            competition["updated_at"] = from_epoch_ms(now_ms())
+
+    async def get_all_followed_competitions(self) -> list[Competition]:
+        return [self._copy_competition(c) for c in self._competitions.values()]
+
+    # --- 关键词关注方法 ---
+
+    @staticmethod
+    def _copy_subscription(
+        user_id: int, channel_id: int, subscription: dict
+    ) -> KeywordSubscription:
+        return KeywordSubscription(
+            user_id,
+            channel_id,
+            subscription["is_subscribed"],
+            list(subscription["followed_keywords"]),
+            list(subscription["blocked_keywords"]),
+            subscription["rule"],
+            subscription["include_tags"],
+            subscription["exclude_tags"],
+        )
+
+    async def get_keyword_subscription(
+        self, user_id: int, channel_id: int
+    ) -> Optional[KeywordSubscription]:
+        subscription = self._subscriptions.get((user_id, channel_id))
+        if subscription is None:
+            return None
+        return self._copy_subscription(user_id, channel_id, subscription)
+
+    async def upsert_keyword_subscription(
+        self,
+        user_id: int,
+        channel_id: int,
+        is_subscribed: bool,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ):
+        previous = self._subscriptions.get((user_id, channel_id))
+        self._subscriptions[(user_id, channel_id)] = {
+            "is_subscribed": bool(is_subscribed),
+            # 与 SQLite 后端一致：关键词去重并按字典序返回
+            "followed_keywords": sorted(set(followed_keywords)),
+            "blocked_keywords": sorted(set(blocked_keywords)),
+            # upsert 不修改组合规则和标签筛选
+            "rule": previous["rule"] if previous else None,
+            "include_tags": previous["include_tags"] if previous else 0,
+            "exclude_tags": previous["exclude_tags"] if previous else 0,
+        }
+        self._subscribers_by_channel.setdefault(channel_id, set()).add(user_id)
+        self._channels_by_user.setdefault(user_id, set()).add(channel_id)
+
+    async def set_subscription_keywords(
+        self,
+        user_id: int,
+        channel_id: int,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ):
+        subscription = self._subscriptions.get((user_id, channel_id))
+        await self.upsert_keyword_subscription(
+            user_id,
+            channel_id,
+            subscription["is_subscribed"] if subscription else False,
+            followed_keywords,
+            blocked_keywords,
+        )
+
+    async def set_subscription_rule(
+        self, user_id: int, channel_id: int, rule: Optional[str]
+    ):
+        if (user_id, channel_id) not in self._subscriptions:
+            await self.upsert_keyword_subscription(user_id, channel_id, False, [], [])
+        self._subscriptions[(user_id, channel_id)]["rule"] = rule
+
+    async def set_subscription_tag_filters(
+        self, user_id: int, channel_id: int, include_tags: int, exclude_tags: int
+    ):
+        if (user_id, channel_id) not in self._subscriptions:
+            await self.upsert_keyword_subscription(user_id, channel_id, False, [], [])
+        subscription = self._subscriptions[(user_id, channel_id)]
+        subscription["include_tags"] = include_tags
+        subscription["exclude_tags"] = exclude_tags
+
+    async def get_channel_tag_slots(self, channel_id: int) -> dict[int, int]:
+        return dict(self._tag_slots.get(channel_id, {}))
+
+    async def assign_channel_tag_slots(
+        self,
+        channel_id: int,
+        tag_ids: Iterable[int],
+        available_tag_ids: Iterable[int],
+    ) -> dict[int, int]:
+        slots = self._tag_slots.setdefault(channel_id, {})
+        added, reclaimed = allocate_tag_slots(slots, tag_ids, available_tag_ids)
+        if reclaimed:
+            keep = ~sum(1 << slot for slot in reclaimed.values())
+            for user_id in self._subscribers_by_channel.get(channel_id, ()):
+                subscription = self._subscriptions[(user_id, channel_id)]
+                subscription["include_tags"] &= keep
+                subscription["exclude_tags"] &= keep
+            for tag_id in reclaimed:
+                del slots[tag_id]
+        slots.update(added)
+        return dict(slots)
+
+    @staticmethod
+    def _passes_tag_filters(subscription: dict, post_mask: int) -> bool:
+        include = subscription["include_tags"]
+        if include and not include & post_mask:
+            return False
+        return not subscription["exclude_tags"] & post_mask
+
+    async def set_channel_subscribed(
+        self, user_id: int, channel_id: int, is_subscribed: bool
+    ) -> bool:
+        subscription = self._subscriptions.get((user_id, channel_id))
+        if subscription is None:
+            if not is_subscribed:
+                return False
+            await self.upsert_keyword_subscription(user_id, channel_id, True, [], [])
+            return True
+        subscription["is_subscribed"] = bool(is_subscribed)
+        return True
+
+    async def get_all_subscriptions_for_channel(
+        self, channel_id: int
+    ) -> list[KeywordSubscription]:
+        subscriptions = []
+        for user_id in self._subscribers_by_channel.get(channel_id, ()):
+            subscription = self._subscriptions[(user_id, channel_id)]
+            if subscription["is_subscribed"]:
+                subscriptions.append(
+                    self._copy_subscription(user_id, channel_id, subscription)
+                )
+        return subscriptions
+
+    async def get_subscribed_channels_for_user(
+        self, user_id: int
+    ) -> list[KeywordSubscription]:
+        subscriptions = []
+        for channel_id in self._channels_by_user.get(user_id, ()):
+            subscription = self._subscriptions[(user_id, channel_id)]
+            if subscription["is_subscribed"]:
+                subscriptions.append(
+                    self._copy_subscription(user_id, channel_id, subscription)
+                )
+        return subscriptions
+
+    async def get_channel_keyword_recipients(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[int]:
+        """通知规则与 SQLite 后端相同：屏蔽词优先 > 命中关注词 > 既没有关注词也没有组合规则的全量订阅。"""
+        post_mask = tags_to_mask(self._tag_slots.get(channel_id, {}), tag_ids)
+        recipients = []
+        for user_id in self._subscribers_by_channel.get(channel_id, ()):
+            if user_id == exclude_user_id:
+                continue
+            subscription = self._subscriptions[(user_id, channel_id)]
+            if not subscription["is_subscribed"]:
+                continue
+            if any(kw in search_content for kw in subscription["blocked_keywords"]):
+                continue
+            if not self._passes_tag_filters(subscription, post_mask):
+                continue
+            followed = subscription["followed_keywords"]
+            if any(kw in search_content for kw in followed) or (
+                not followed and subscription["rule"] is None
+            ):
+                recipients.append(user_id)
+        return recipients
+
+    async def get_channel_rule_subscriptions(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[tuple[int, str]]:
+        post_mask = tags_to_mask(self._tag_slots.get(channel_id, {}), tag_ids)
+        subscriptions = []
+        for user_id in self._subscribers_by_channel.get(channel_id, ()):
+            if user_id == exclude_user_id:
+                continue
+            subscription = self._subscriptions[(user_id, channel_id)]
+            if not subscription["is_subscribed"] or subscription["rule"] is None:
+                continue
+            if any(kw in search_content for kw in subscription["blocked_keywords"]):
+                continue
+            if not self._passes_tag_filters(subscription, post_mask):
+                continue
+            subscriptions.append((user_id, subscription["rule"]))
+        return subscriptions
+
+    # --- Thread Favorites Methods ---
+
+    def _insert_favorite(
+        self,
+        user_id: int,
+        thread_id: int,
+        thread_name: str,
+        guild_id: int,
+        added_at: datetime,
+    ) -> bool:
+        favorites = self._favorites.setdefault(user_id, {})
+        if thread_id in favorites:
+            return False
+        favorite_id = self._next_favorite_id
+        self._next_favorite_id += 1
+        favorites[thread_id] = self._favorites_by_id[favorite_id] = {
+            "id": favorite_id,
+            "thread_id": thread_id,
+            "thread_name": thread_name,
+            "guild_id": guild_id,
+            "added_at": to_epoch_ms(added_at),
+        }
+        bisect.insort(
+            self._favorite_keys.setdefault(user_id, []),
+            (favorites[thread_id]["added_at"], favorite_id),
+        )
+        return True
+
+    def _delete_favorite(self, user_id: int, thread_id: int) -> bool:
+        favorite = self._favorites.get(user_id, {}).pop(thread_id, None)
+        if favorite is None:
+            return False
+        del self._favorites_by_id[favorite["id"]]
+        keys = self._favorite_keys[user_id]
+        del keys[bisect.bisect_left(keys, (favorite["added_at"], favorite["id"]))]
+        return True
+
+    def _favorite_rows(self, keys: list[FavoritesCursor]) -> list[Favorite]:
+        """按给定游标顺序取出收藏。"""
+        rows = []
+        for added_at, favorite_id in keys:
+            favorite = self._favorites_by_id[favorite_id]
+            rows.append(
+                Favorite(
+                    favorite["thread_id"],
+                    favorite["thread_name"],
+                    favorite["guild_id"],
+                    from_epoch_ms(added_at),
+                    (added_at, favorite_id),
+                )
+            )
+        return rows
+
+    async def add_favorite(
+        self,
+        user_id: int,
+        thread_id: int,
+        thread_name: str,
+        guild_id: int,
+        added_at: datetime,
+    ) -> bool:
+        return self._insert_favorite(user_id, thread_id, thread_name, guild_id, added_at)
+
+    async def remove_favorite(self, user_id: int, thread_id: int) -> bool:
+        return self._delete_favorite(user_id, thread_id)
+
+    async def get_user_favorites_after(
+        self, user_id: int, limit: int, cursor: Optional[FavoritesCursor] = None
+    ) -> list[Favorite]:
+        keys = self._favorite_keys.get(user_id, [])
+        end = len(keys) if cursor is None else bisect.bisect_left(keys, tuple(cursor))
+        page = keys[max(0, end - limit) : end]
+        return self._favorite_rows(page[::-1])
+
+    async def get_user_favorites_before(
+        self, user_id: int, limit: int, cursor: FavoritesCursor
+    ) -> list[Favorite]:
+        keys = self._favorite_keys.get(user_id, [])
+        start = bisect.bisect_right(keys, tuple(cursor))
+        page = keys[start : start + limit]
+        return self._favorite_rows(page[::-1])
+
+    async def get_user_favorites_page_boundaries(
+        self, user_id: int, page_size: int
+    ) -> list[Optional[FavoritesCursor]]:
+        newest_first = self._favorite_keys.get(user_id, [])[::-1]
+        boundaries: list[Optional[FavoritesCursor]] = [None]
+        boundaries.extend(newest_first[page_size - 1 :: page_size])
+        return boundaries
+
+    async def get_user_favorites_count(self, user_id: int) -> int:
+        return len(self._favorites.get(user_id, {}))
+
+    async def get_all_user_favorite_thread_ids(self, user_id: int) -> list[int]:
+        return list(self._favorites.get(user_id, {}))
+
+    async def add_favorites_in_batch(self, favorites_data: list[tuple]):
+        # 与 SQLite 后端一致：按 (added_at, 帖子雪花 ID) 的顺序分配 id
+        ordered = sorted(
+            favorites_data, key=lambda row: (to_epoch_ms(row[4]), row[1])
+        )
+        for user_id, thread_id, thread_name, guild_id, added_at in ordered:
+            self._insert_favorite(user_id, thread_id, thread_name, guild_id, added_at)
+
+    async def remove_favorites_in_batch(
+        self, user_id: int, thread_ids: list[int]
+    ) -> int:
+        return sum(
+            self._delete_favorite(user_id, thread_id)
+            for thread_id in dict.fromkeys(thread_ids)
+        )
+
+    # --- Active Thread Scanner Methods ---
+
+    def _delete_active_member(self, thread_id: int, user_id: int) -> None:
+        if self._active_members.pop((thread_id, user_id), None) is not None:
+            self._active_threads_by_user[user_id].discard(thread_id)
+
+    async def clear_active_thread_members(self, guild_id: int):
+        for thread_id, user_id in [
+            key
+            for key, member in self._active_members.items()
+            if member["guild_id"] == guild_id
+        ]:
+            self._delete_active_member(thread_id, user_id)
+
+    async def update_active_thread_members(
+        self, thread_id: int, thread_name: str, member_ids: list[int], guild_id: int
+    ):
+        now = now_ms()
+        for user_id in member_ids:
+            member = self._active_members.get((thread_id, user_id))
+            if member is None:
+                # 与 SQLite 的 UPSERT 一致：已存在的记录只更新时间和名称，保留原 guild_id
+                self._active_members[(thread_id, user_id)] = {
+                    "guild_id": guild_id,
+                    "last_seen": now,
+                    "thread_name": thread_name,
+                }
+                self._active_threads_by_user.setdefault(user_id, set()).add(thread_id)
+            else:
+                member["last_seen"] = now
+                member["thread_name"] = thread_name
+
+    async def get_user_active_threads(
+        self, user_id: int, guild_id: int
+    ) -> list[ActiveThread]:
+        threads = []
+        for thread_id in self._active_threads_by_user.get(user_id, ()):
+            member = self._active_members[(thread_id, user_id)]
+            if member["guild_id"] == guild_id:
+                threads.append(ActiveThread(thread_id, member["thread_name"]))
+        threads.sort(reverse=True)
+        return threads
+
+    async def get_unfavorited_active_threads(
+        self, user_id: int, guild_id: int
+    ) -> list[ActiveThread]:
+        favorites = self._favorites.get(user_id, {})
+        return [
+            thread
+            for thread in await self.get_user_active_threads(user_id, guild_id)
+            if thread.thread_id not in favorites
+        ]
+
+    async def remove_active_thread_member(self, user_id: int, thread_id: int):
+        self._delete_active_member(thread_id, user_id)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Iterable
+
+import discord
+
+from src.core.utils import retry_on_discord_error
+
+logger = logging.getLogger(__name__)
+
+# 记住最近多少个帖子已经提及过的用户，用于过滤窗口结束后才提交的收件人
+_RECENT_THREADS = 512
+
+
+class _PendingThread:
+    """一个帖子在收集窗口内汇总的收件人，按来源分别保存（保持提交顺序）。"""
+
+    __slots__ = ("thread", "sources")
+
+    def __init__(self, thread: discord.Thread):
+        self.thread = thread
+        self.sources: dict[str, dict[int, None]] = {}
+
+
+class NotificationDispatcher:
+    """
+    新帖幽灵提及的统一出口。作者关注、频道订阅等各个来源只提交收件人，
+    同一个帖子的第一次提交开启一个收集窗口（即原来的初始延迟），窗口结束后
+    合并所有来源并去重，只发送一组分批的提及消息，日志中记录每个来源的人数和重叠人数。
+    窗口结束后才到达的收件人会另起一轮，已经提及过的用户不会再次收到。
+    关闭时提前结束所有收集窗口，把已收集的提及发送完（与延迟写入缓冲区关闭时落盘相同）。
+    """
+
+    def __init__(self):
+        try:
+            self.initial_delay = float(
+                os.getenv("GHOST_PING_INITIAL_DELAY_SECONDS", "5")
+            )
+            self.chunk_size = int(os.getenv("GHOST_PING_CHUNK_SIZE", "50"))
+            self.chunk_delay = float(os.getenv("GHOST_PING_CHUNK_DELAY_SECONDS", "1.5"))
+        except (ValueError, TypeError):
+            self.initial_delay, self.chunk_size, self.chunk_delay = 5.0, 50, 1.5
+        self._pending: dict[int, _PendingThread] = {}
+        self._notified: OrderedDict[int, set[int]] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+        # 置位后所有收集窗口立即结束
+        self._closing = asyncio.Event()
+        self.dispatched_threads = 0
+        self.sent_mentions = 0
+        self.deduplicated_mentions = 0
+        self.sent_messages = 0
+
+    def submit(
+        self, thread: discord.Thread, source: str, user_ids: Iterable[int]
+    ) -> None:
+        """登记某个来源要提及的用户，立即返回；实际发送在收集窗口结束后进行。"""
+        entry = self._pending.get(thread.id)
+        if entry is None:
+            entry = _PendingThread(thread)
+            self._pending[thread.id] = entry
+            task = asyncio.create_task(self._dispatch_after_delay(thread.id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        recipients = entry.sources.setdefault(source, {})
+        recipients.update(dict.fromkeys(user_ids))
+
+    async def _dispatch_after_delay(self, thread_id: int) -> None:
+        try:
+            await asyncio.wait_for(self._closing.wait(), self.initial_delay)
+        except asyncio.TimeoutError:
+            pass
+        entry = self._pending.pop(thread_id, None)
+        if entry is None:
+            return
+        try:
+            await self._dispatch(entry)
+        except Exception:
+            logger.error(
+                "发送幽灵提及失败", extra={"thread_id": thread_id}, exc_info=True
+            )
+
+    def _merge(self, entry: _PendingThread) -> tuple[list[int], int]:
+        """合并各来源的收件人并去重，排除本帖已经提及过的用户。返回 (收件人, 被去掉的重复人数)。"""
+        already = self._notified.get(entry.thread.id, set())
+        merged: dict[int, None] = {}
+        submitted = 0
+        for recipients in entry.sources.values():
+            submitted += len(recipients)
+            merged.update(recipients)
+        user_ids = [user_id for user_id in merged if user_id not in already]
+        return user_ids, submitted - len(user_ids)
+
+    def _remember(self, thread_id: int, user_ids: list[int]) -> None:
+        self._notified.setdefault(thread_id, set()).update(user_ids)
+        self._notified.move_to_end(thread_id)
+        while len(self._notified) > _RECENT_THREADS:
+            self._notified.popitem(last=False)
+
+    async def _dispatch(self, entry: _PendingThread) -> None:
+        thread = entry.thread
+        user_ids, duplicates = self._merge(entry)
+        log_context: dict = {
+            "thread_id": thread.id,
+            "guild_id": thread.guild.id,
+            "sources": {
+                source: len(recipients) for source, recipients in entry.sources.items()
+            },
+            "total_users": len(user_ids),
+            "duplicate_users": duplicates,
+            "chunk_size": self.chunk_size,
+        }
+        self.deduplicated_mentions += duplicates
+        if not user_ids:
+            logger.info("去重后没有需要提及的用户", extra=log_context)
+            return
+        # 先登记再发送：发送期间到达的提交不会重复提及这些用户
+        self._remember(thread.id, user_ids)
+        self.dispatched_threads += 1
+        logger.info("准备发送幽灵提及", extra=log_context)
+
+        for i in range(0, len(user_ids), self.chunk_size):
+            chunk = user_ids[i : i + self.chunk_size]
+            ping_message = " ".join([f"<@{user_id}>" for user_id in chunk])
+            chunk_number = i // self.chunk_size + 1
+            log_context["chunk_user_ids"] = chunk
+            try:
+                message = await retry_on_discord_error(
+                    lambda: thread.send(ping_message),
+                    operation_name=f"发送幽灵提及到频道 {thread.id} (Chunk {chunk_number})",
+                )
+                await retry_on_discord_error(
+                    lambda: message.delete(),
+                    operation_name=f"删除幽灵提及在频道 {thread.id} (Chunk {chunk_number})",
+                )
+                self.sent_messages += 1
+                self.sent_mentions += len(chunk)
+                logger.info("成功发送幽灵提及", extra=log_context)
+            except discord.errors.DiscordServerError:
+                # 重试最终失败时只记录错误，继续发送下一批
+                logger.error(
+                    f"为频道 {thread.id} 发送或删除幽灵提及最终失败",
+                    extra=log_context,
+                    exc_info=True,
+                )
+            except discord.Forbidden:
+                logger.error(
+                    "因权限不足，发送幽灵提及失败", extra=log_context, exc_info=True
+                )
+                break
+            except Exception:
+                logger.error("发送幽灵提及失败", extra=log_context, exc_info=True)
+
+            if len(user_ids) > self.chunk_size:
+                await asyncio.sleep(self.chunk_delay)
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "dispatched_threads": self.dispatched_threads,
+            "sent_messages": self.sent_messages,
+            "sent_mentions": self.sent_mentions,
+            "deduplicated_mentions": self.deduplicated_mentions,
+            "pending_threads": len(self._pending),
+        }
+
+    async def close(self) -> None:
+        """
+        结束所有收集窗口并等待发送完成。必须在断开 Discord 连接之前调用；
+        之后提交的收件人不再等待窗口，立即发送。
+        """
+        self._closing.set()
+        tasks = list(self._tasks)
+        if tasks:
+            logger.info(
+                "关闭前发送收集窗口中的幽灵提及", extra={"pending_threads": len(tasks)}
+            )
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,139 @@
+import importlib.util
+import json
+import logging
+import pathlib
+import sqlite3
+import time
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Callable, Optional
+
+from src.core.timestamps import now_ms
+
+logger = logging.getLogger(__name__)
+
+# 回填函数：在 aiosqlite 工作线程中以 (连接, 上一批返回的游标, 批大小) 调用，
+# 返回 (下一批的游标, 本批处理的行数)。第一次调用时游标为 None，返回的游标为 None 表示回填完成。
+# 游标会以 JSON 保存在 online_migrations 表中，必须是可以 JSON 序列化的值（通常是上一批最后一行的主键）。
+BackfillFunction = Callable[[sqlite3.Connection, Any, int], tuple[Any, int]]
+
+
+@dataclass(frozen=True)
+class OnlineMigration:
+    """
+    一个 Python 迁移中需要在后台分批执行的数据回填。
+    迁移文件 src/migrations/versions/NNN_描述.py 可以定义：
+    - SCHEMA：启动时与 .sql 迁移一样按版本顺序执行的结构变更，应只包含很快的 DDL；
+    - backfill(conn, cursor, batch_size)：数据回填，见 BackfillFunction；
+    - BATCH_SIZE：每批处理的行数，默认 1000。
+    """
+
+    name: str
+    version: int
+    backfill: BackfillFunction
+    batch_size: int = 1000
+
+
+def load_migration_module(path: pathlib.Path) -> ModuleType:
+    """按文件路径加载一个 Python 迁移模块（文件名以数字开头，无法用 import 语句导入）。"""
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"无法加载迁移模块: {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def online_migration_from_module(
+    path: pathlib.Path, module: ModuleType
+) -> Optional[OnlineMigration]:
+    """从迁移模块中取出后台回填；模块没有定义 backfill 时返回 None。"""
+    backfill = getattr(module, "backfill", None)
+    if backfill is None:
+        return None
+    return OnlineMigration(
+        name=path.stem,
+        version=int(path.stem.split("_")[0]),
+        backfill=backfill,
+        batch_size=int(getattr(module, "BATCH_SIZE", 1000)),
+    )
+
+
+def run_backfill_batch(
+    sqlite_conn: sqlite3.Connection,
+    migration: OnlineMigration,
+    cursor_json: Optional[str],
+    batch_size: int,
+) -> tuple[Optional[str], int, bool]:
+    """
+    在工作线程中执行一批回填，并在同一个事务中记录进度，返回 (新的游标 JSON, 本批行数, 是否已完成)。
+    回填和进度一起提交或一起回滚，进程在任意时刻退出后都能从最后一次提交的游标继续。
+    """
+    cursor = json.loads(cursor_json) if cursor_json is not None else None
+    sqlite_conn.execute("BEGIN")
+    try:
+        next_cursor, rows = migration.backfill(sqlite_conn, cursor, batch_size)
+        done = next_cursor is None
+        next_cursor_json = json.dumps(next_cursor) if not done else cursor_json
+        now = now_ms()
+        sqlite_conn.execute(
+            """
+            UPDATE online_migrations
+            SET status = ?, cursor = ?, rows_done = rows_done + ?, batches = batches + 1,
+                started_at = COALESCE(started_at, ?), updated_at = ?,
+                completed_at = CASE WHEN ? THEN ? END, last_error = NULL
+            WHERE name = ?
+            """,
+            (
+                "done" if done else "running",
+                next_cursor_json,
+                rows,
+                now,
+                now,
+                done,
+                now,
+                migration.name,
+            ),
+        )
+        sqlite_conn.commit()
+    except BaseException:
+        if sqlite_conn.in_transaction:
+            sqlite_conn.rollback()
+        raise
+    return next_cursor_json, rows, done
+
+
+def mark_backfill_failed(
+    sqlite_conn: sqlite3.Connection, name: str, error: str
+) -> None:
+    """记录回填失败（在工作线程中调用）。已提交的批次保留，下次启动时从最后的游标重试。"""
+    sqlite_conn.execute(
+        "UPDATE online_migrations SET status = 'failed', last_error = ?, updated_at = ? WHERE name = ?",
+        (error, now_ms(), name),
+    )
+    sqlite_conn.commit()
+
+
+@dataclass
+class BackfillProgress:
+    """一次启动期间某个回填的执行情况（时间单位为毫秒）。"""
+
+    name: str
+    rows: int = 0
+    batches: int = 0
+    max_batch_ms: float = 0.0
+    started_at: float = 0.0
+
+    def record_batch(self, rows: int, elapsed_ms: float) -> None:
+        self.rows += rows
+        self.batches += 1
+        self.max_batch_ms = max(self.max_batch_ms, elapsed_ms)
+
+    def to_log_context(self) -> dict:
+        return {
+            "migration": self.name,
+            "rows": self.rows,
+            "batches": self.batches,
+            "max_batch_ms": round(self.max_batch_ms, 3),
+            "elapsed_seconds": round(time.perf_counter() - self.started_at, 3),
+        }
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import pathlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Sequence
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+class ReadConnectionPool:
+    """
+    只读连接池。
+    在 WAL 模式下，读连接可以与唯一的写连接并发工作，互不阻塞。
+    每个连接都有自己的 aiosqlite 工作线程，所以多个读查询可以真正并行执行。
+    """
+
+    def __init__(self, db_name: str, size: int, pragmas: Sequence[str] = ()):
+        self.db_name = db_name
+        self.size = size
+        # 每个读连接打开后执行的 PRAGMA（与写连接使用同一组存储参数）
+        self.pragmas = list(pragmas)
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._connections: list[aiosqlite.Connection] = []
+
+    async def open(self) -> None:
+        # 以只读 URI 方式打开，从根本上避免误用读连接写入
+        uri = f"{pathlib.Path(self.db_name).resolve().as_uri()}?mode=ro"
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(uri, uri=True)
+            conn.row_factory = aiosqlite.Row
+            await conn.execute("PRAGMA query_only = ON")
+            for pragma in self.pragmas:
+                await conn.execute(pragma)
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+        logger.info("数据库只读连接池已打开", extra={"pool_size": self.size})
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """借出一个空闲的读连接，用完后自动归还。"""
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def close(self) -> None:
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        self._idle = asyncio.Queue()
+        logger.info("数据库只读连接池已关闭")
@@ -0,0 +1,248 @@
+import logging
+import os
+from datetime import datetime
+from contextlib import AbstractAsyncContextManager
+from typing import Any, Iterable, Optional, Protocol
+
+from src.core.row_models import ActiveThread, Competition, Favorite, KeywordSubscription
+
+logger = logging.getLogger(__name__)
+
+# 收藏分页游标：(added_at 原始值, 收藏记录 id)，其具体类型由存储后端决定，调用方只需原样传回
+FavoritesCursor = tuple[Any, int]
+
+
+class UnitOfWorkRepository(Protocol):
+    """支持把多次调用合并为一个事务的存储后端。"""
+
+    def unit_of_work(self) -> AbstractAsyncContextManager[None]: ...
+
+
+class AuthorFollowRepository(UnitOfWorkRepository, Protocol):
+    """作者关注与作者帖子记录。"""
+
+    async def ensure_author_exists(self, author_id: int, author_name: str): ...
+
+    async def add_follower(
+        self, user_id: int, author_id: int, author_name: str
+    ) -> bool: ...
+
+    async def remove_follower(self, user_id: int, author_id: int) -> bool: ...
+
+    async def get_followers_for_author(self, author_id: int) -> list[int]: ...
+
+    async def get_all_follower_edges(self) -> list[tuple[int, int]]: ...
+
+    async def get_followed_authors(self, user_id: int) -> list[int]: ...
+
+    async def get_followed_authors_with_names(self, user_id: int) -> list[dict]: ...
+
+    async def add_post(self, post_id: int, author_id: int): ...
+
+    async def upsert_authors_in_batch(self, authors: list[tuple]): ...
+
+    async def add_posts_in_batch(self, posts: list[tuple]): ...
+
+    async def get_last_view(self, user_id: int) -> datetime: ...
+
+    async def update_last_views_in_batch(self, last_views: list[tuple]): ...
+
+    async def get_and_update_last_view(self, user_id: int) -> datetime: ...
+
+    async def get_new_post_counts(
+        self, author_ids: list[int], since_timestamp: datetime
+    ) -> list[dict]: ...
+
+    async def get_followed_authors_with_new_posts(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        mark_viewed_at: Optional[datetime] = None,
+    ) -> list[dict]: ...
+
+
+class CompetitionRepository(Protocol):
+    """比赛关注。"""
+
+    async def ensure_competition_exists(
+        self, message_id: int, channel_id: int, guild_id: int, initial_ids: list[str]
+    ): ...
+
+    async def add_competition_subscriber(self, user_id: int, message_id: int) -> bool: ...
+
+    async def remove_competition_subscriber(
+        self, user_id: int, message_id: int
+    ) -> bool: ...
+
+    async def get_competition_by_id(
+        self, message_id: int
+    ) -> Optional[Competition]: ...
+
+    async def get_subscribers_for_competition(self, message_id: int) -> list[int]: ...
+
+    async def update_competition_submissions(
+        self, message_id: int, new_ids: list[str]
+    ): ...
+
+    async def get_all_followed_competitions(self) -> list[Competition]: ...
+
+
+class SubscriptionRepository(UnitOfWorkRepository, Protocol):
+    """频道关键词订阅。"""
+
+    async def get_keyword_subscription(
+        self, user_id: int, channel_id: int
+    ) -> Optional[KeywordSubscription]: ...
+
+    async def upsert_keyword_subscription(
+        self,
+        user_id: int,
+        channel_id: int,
+        is_subscribed: bool,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ): ...
+
+    async def set_subscription_keywords(
+        self,
+        user_id: int,
+        channel_id: int,
+        followed_keywords: list[str],
+        blocked_keywords: list[str],
+    ): ...
+
+    async def set_subscription_rule(
+        self, user_id: int, channel_id: int, rule: Optional[str]
+    ): ...
+
+    async def set_subscription_tag_filters(
+        self, user_id: int, channel_id: int, include_tags: int, exclude_tags: int
+    ): ...
+
+    async def get_channel_tag_slots(self, channel_id: int) -> dict[int, int]: ...
+
+    async def assign_channel_tag_slots(
+        self,
+        channel_id: int,
+        tag_ids: Iterable[int],
+        available_tag_ids: Iterable[int],
+    ) -> dict[int, int]: ...
+
+    async def set_channel_subscribed(
+        self, user_id: int, channel_id: int, is_subscribed: bool
+    ) -> bool: ...
+
+    async def get_all_subscriptions_for_channel(
+        self, channel_id: int
+    ) -> list[KeywordSubscription]: ...
+
+    async def get_subscribed_channels_for_user(
+        self, user_id: int
+    ) -> list[KeywordSubscription]: ...
+
+    async def get_channel_keyword_recipients(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[int]: ...
+
+    async def get_channel_rule_subscriptions(
+        self,
+        channel_id: int,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_ids: Iterable[int] = (),
+    ) -> list[tuple[int, str]]: ...
+
+
+class FavoritesRepository(Protocol):
+    """帖子收藏与活跃帖子成员缓存。"""
+
+    async def add_favorite(
+        self,
+        user_id: int,
+        thread_id: int,
+        thread_name: str,
+        guild_id: int,
+        added_at: datetime,
+    ) -> bool: ...
+
+    async def remove_favorite(self, user_id: int, thread_id: int) -> bool: ...
+
+    async def get_user_favorites_after(
+        self, user_id: int, limit: int, cursor: Optional[FavoritesCursor] = None
+    ) -> list[Favorite]: ...
+
+    async def get_user_favorites_before(
+        self, user_id: int, limit: int, cursor: FavoritesCursor
+    ) -> list[Favorite]: ...
+
+    async def get_user_favorites_page_boundaries(
+        self, user_id: int, page_size: int
+    ) -> list[Optional[FavoritesCursor]]: ...
+
+    async def get_user_favorites_count(self, user_id: int) -> int: ...
+
+    async def get_all_user_favorite_thread_ids(self, user_id: int) -> list[int]: ...
+
+    async def add_favorites_in_batch(self, favorites_data: list[tuple]): ...
+
+    async def remove_favorites_in_batch(
+        self, user_id: int, thread_ids: list[int]
+    ) -> int: ...
+
+    async def clear_active_thread_members(self, guild_id: int): ...
+
+    async def update_active_thread_members(
+        self, thread_id: int, thread_name: str, member_ids: list[int], guild_id: int
+    ): ...
+
+    async def get_user_active_threads(
+        self, user_id: int, guild_id: int
+    ) -> list[ActiveThread]: ...
+
+    async def get_unfavorited_active_threads(
+        self, user_id: int, guild_id: int
+    ) -> list[ActiveThread]: ...
+
+    async def remove_active_thread_member(self, user_id: int, thread_id: int): ...
+
+
+class Repository(
+    AuthorFollowRepository,
+    CompetitionRepository,
+    SubscriptionRepository,
+    FavoritesRepository,
+    Protocol,
+):
+    """
+    所有服务依赖的存储接口。
+    SQLite 实现见 src.core.database.Database，纯内存实现见 src.core.memory_database.InMemoryDatabase。
+    """
+
+    async def connect(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    def is_migration_complete(self, name: str) -> bool: ...
+
+    async def wait_for_migration(
+        self, name: str, timeout: Optional[float] = None
+    ) -> bool: ...
+
+
+def create_repository() -> Repository:
+    """根据环境变量 DB_BACKEND 创建存储后端：sqlite（默认）或 memory（数据不落盘，重启即丢失）。"""
+    backend = os.getenv("DB_BACKEND", "sqlite").strip().lower()
+    if backend == "memory":
+        from src.core.memory_database import InMemoryDatabase
+
+        logger.warning("使用纯内存存储后端，数据不会被持久化")
+        return InMemoryDatabase()
+    if backend != "sqlite":
+        logger.warning(f"未知的 DB_BACKEND '{backend}'，将使用 sqlite")
+    from src.core.database import Database
+
+    return Database()
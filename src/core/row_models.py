@@ -0,0 +1,125 @@
+import json
+from datetime import datetime
+from typing import Any, Iterable, NamedTuple, Optional
+
+from src.core.timestamps import from_epoch_ms
+
+
+class KeywordSubscription(NamedTuple):
+    """
+    用户在一个频道下的关键词订阅。关键词按 kind 分为关注词和屏蔽词；rule 是可选的组合规则文本；
+    include_tags / exclude_tags 是按频道标签位槽（channel_tag_slots）存储的标签筛选位掩码。
+    """
+
+    user_id: int
+    channel_id: int
+    is_subscribed: bool
+    followed_keywords: list[str]
+    blocked_keywords: list[str]
+    rule: Optional[str] = None
+    include_tags: int = 0
+    exclude_tags: int = 0
+
+
+class Favorite(NamedTuple):
+    """一条帖子收藏。cursor 是 (added_at 原始值, 收藏记录 id)，用于游标分页。"""
+
+    thread_id: int
+    thread_name: str
+    guild_id: int
+    added_at: datetime
+    cursor: tuple[Any, int]
+
+
+class Competition(NamedTuple):
+    """一个被关注的比赛，对应 competitions 表。"""
+
+    message_id: int
+    channel_id: int
+    guild_id: int
+    last_submission_ids: list[str]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ActiveThread(NamedTuple):
+    """用户所在的一个活跃帖子。"""
+
+    thread_id: int
+    thread_name: Optional[str]
+
+
+# 以下批量映射函数按列位置解包，查询的 SELECT 列顺序必须与注释中一致
+
+
+def subscriptions_from_rows(rows: Iterable) -> list[KeywordSubscription]:
+    """
+    将 keyword_subscriptions LEFT JOIN subscription_keywords 的结果按 (user_id, channel_id) 合并。
+    行的列顺序：user_id, channel_id, is_subscribed, rule, include_tags, exclude_tags, kind, keyword。
+    """
+    subscriptions: dict[tuple[int, int], KeywordSubscription] = {}
+    for (
+        user_id,
+        channel_id,
+        is_subscribed,
+        rule,
+        include_tags,
+        exclude_tags,
+        kind,
+        keyword,
+    ) in rows:
+        subscription = subscriptions.get((user_id, channel_id))
+        if subscription is None:
+            subscription = subscriptions[user_id, channel_id] = KeywordSubscription(
+                # 将数据库中的 0/1 转换为布尔值
+                user_id,
+                channel_id,
+                bool(is_subscribed),
+                [],
+                [],
+                rule,
+                include_tags,
+                exclude_tags,
+            )
+        if keyword is not None:
+            if kind == "followed":
+                subscription.followed_keywords.append(keyword)
+            else:
+                subscription.blocked_keywords.append(keyword)
+    return list(subscriptions.values())
+
+
+def favorites_from_rows(rows: Iterable) -> list[Favorite]:
+    """行的列顺序：id, thread_id, thread_name, guild_id, added_at（毫秒时间戳）。"""
+    return [
+        Favorite(
+            thread_id,
+            thread_name,
+            guild_id,
+            from_epoch_ms(added_at),
+            (added_at, favorite_id),
+        )
+        for favorite_id, thread_id, thread_name, guild_id, added_at in rows
+    ]
+
+
+def competitions_from_rows(rows: Iterable) -> list[Competition]:
+    """
+    行的列顺序：message_id, channel_id, guild_id, last_submission_ids (JSON), created_at, updated_at。
+    """
+    return [
+        Competition(
+            message_id,
+            channel_id,
+            guild_id,
+            json.loads(ids_json) if ids_json else [],
+            from_epoch_ms(created_at) if created_at is not None else None,
+            from_epoch_ms(updated_at) if updated_at is not None else None,
+        )
+        for message_id, channel_id, guild_id, ids_json, created_at, updated_at in rows
+    ]
+
+
+def active_threads_from_rows(rows: Iterable) -> list[ActiveThread]:
+    """行的列顺序：thread_id, thread_name。"""
+    return [ActiveThread(thread_id, thread_name) for thread_id, thread_name in rows]
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from src.core.timestamps import from_epoch_ms, to_epoch_ms
+
+# Discord 雪花 ID 的高 42 位是自 Discord 纪元 (2015-01-01 UTC) 起的毫秒数，
+# 帖子、消息等对象的 ID 本身就是按创建时间递增的整数，可以直接当作时间轴使用。
+
+DISCORD_EPOCH_MS = 1_420_070_400_000
+_TIMESTAMP_SHIFT = 22
+
+
+def snowflake_to_ms(snowflake: int) -> int:
+    """雪花 ID 对应的创建时间（毫秒时间戳）。"""
+    return (snowflake >> _TIMESTAMP_SHIFT) + DISCORD_EPOCH_MS
+
+
+def snowflake_to_datetime(snowflake: int) -> datetime:
+    """雪花 ID 对应的创建时间（带 UTC 时区的 datetime）。"""
+    return from_epoch_ms(snowflake_to_ms(snowflake))
+
+
+def snowflake_lower_bound(epoch_ms: int) -> int:
+    """在该毫秒及之后创建的对象，其雪花 ID 都不小于返回值（早于 Discord 纪元时为 0）。"""
+    return max(0, epoch_ms - DISCORD_EPOCH_MS) << _TIMESTAMP_SHIFT
+
+
+def snowflake_after(value: datetime) -> int:
+    """严格晚于 value 创建的对象的最小雪花 ID，用于 `id >= ?` 形式的范围查询。"""
+    return snowflake_lower_bound(to_epoch_ms(value) + 1)
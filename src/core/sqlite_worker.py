@@ -0,0 +1,45 @@
+"""
+在 aiosqlite 连接的工作线程上执行同步函数。
+
+组提交批次、流水线、工作单元和在线迁移都需要把一段同步代码（多条语句加提交）放到连接所在的
+线程中一次执行；sqlite3 连接只能在创建它的线程上使用，而 aiosqlite 没有为此提供公开接口，
+只能使用 Connection._execute 与 Connection._conn。项目中所有对这两个内部接口的访问都集中在这里：
+导入时检查 aiosqlite 的版本是否在验证过的范围内、两个接口是否存在，不满足时启动即失败，
+而不是在第一次读写时才出错。升级 aiosqlite 前需要确认这两个接口未变，再调整下面的版本范围
+（同时修改 requirements.txt 中的版本约束）。
+"""
+
+from typing import Any, Callable, TypeVar
+
+import aiosqlite
+
+T = TypeVar("T")
+
+# 验证过的 aiosqlite 版本范围：[最低版本, 最高版本)
+SUPPORTED_AIOSQLITE_VERSIONS = ((0, 17), (0, 23))
+
+
+def _check_aiosqlite() -> None:
+    version = tuple(int(part) for part in aiosqlite.__version__.split(".")[:2])
+    low, high = SUPPORTED_AIOSQLITE_VERSIONS
+    if not low <= version < high:
+        raise ImportError(
+            f"不支持的 aiosqlite 版本 {aiosqlite.__version__}，"
+            f"需要 >={low[0]}.{low[1]},<{high[0]}.{high[1]}（见 src/core/sqlite_worker.py）"
+        )
+    if not callable(getattr(aiosqlite.Connection, "_execute", None)) or not hasattr(
+        aiosqlite.Connection, "_conn"
+    ):
+        raise ImportError(
+            f"aiosqlite {aiosqlite.__version__} 缺少 Connection._execute / Connection._conn"
+        )
+
+
+_check_aiosqlite()
+
+
+async def run_on_connection(
+    conn: aiosqlite.Connection, fn: Callable[..., T], *args: Any
+) -> T:
+    """在 conn 的工作线程中以 fn(sqlite3 连接, *args) 调用，与该连接上的其他操作串行执行。"""
+    return await conn._execute(fn, conn._conn, *args)
@@ -0,0 +1,215 @@
+import logging
+import os
+import pathlib
+import random
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, fields, replace
+
+logger = logging.getLogger(__name__)
+
+_SYNCHRONOUS_VALUES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE_VALUES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    一组同时生效的 SQLite 连接参数。
+    WAL 模式下 synchronous=NORMAL 只在断电时可能丢失最后几次提交，不会损坏数据库，三个预设都使用它。
+    """
+
+    name: str
+    # 页缓存大小 (KiB)，每个连接各自一份
+    cache_size_kib: int
+    # 内存映射读取的上限 (字节)，0 表示不使用 mmap
+    mmap_size: int
+    synchronous: str
+    # 临时表和排序使用的临时 B 树放在文件还是内存中
+    temp_store: str
+    # 检查点之后 WAL 文件保留的最大字节数
+    journal_size_limit: int
+    busy_timeout_ms: int
+
+    def pragmas(self) -> list[str]:
+        """连接打开后依次执行的 PRAGMA 语句，读连接和写连接都适用。"""
+        return [
+            f"PRAGMA cache_size = {-int(self.cache_size_kib)}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA temp_store = {self.temp_store}",
+            f"PRAGMA journal_size_limit = {int(self.journal_size_limit)}",
+            f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}",
+        ]
+
+    @classmethod
+    def from_env(cls) -> "StorageProfile":
+        """
+        按 DB_STORAGE_PROFILE 选择预设，再用 DB_PRAGMA_<字段名> 覆盖单个参数，
+        例如 DB_PRAGMA_CACHE_SIZE_KIB=32768。无效的取值会被忽略并记录警告。
+        """
+        name = os.getenv("DB_STORAGE_PROFILE", "balanced").strip().lower()
+        profile = STORAGE_PROFILES.get(name)
+        if profile is None:
+            logger.warning(
+                "未知的数据库存储配置，使用 balanced",
+                extra={"profile": name, "available": sorted(STORAGE_PROFILES)},
+            )
+            profile = STORAGE_PROFILES["balanced"]
+
+        overrides: dict = {}
+        for f in fields(cls):
+            if f.name == "name":
+                continue
+            raw = os.getenv(f"DB_PRAGMA_{f.name.upper()}")
+            if raw is None or not raw.strip():
+                continue
+            value = raw.strip().upper()
+            if f.name == "synchronous":
+                valid = value in _SYNCHRONOUS_VALUES
+            elif f.name == "temp_store":
+                valid = value in _TEMP_STORE_VALUES
+            else:
+                valid = value.lstrip("-").isdigit()
+            if valid:
+                overrides[f.name] = int(value) if f.type is int else value
+            else:
+                logger.warning(
+                    "忽略无效的数据库参数覆盖",
+                    extra={"setting": f.name, "value": raw},
+                )
+        if overrides:
+            profile = replace(profile, name=f"{profile.name}+custom", **overrides)
+        return profile
+
+
+STORAGE_PROFILES: dict[str, StorageProfile] = {
+    # 小内存 VPS：缓存和 WAL 都压小，临时 B 树落盘，不使用 mmap
+    "low-memory": StorageProfile(
+        name="low-memory",
+        cache_size_kib=2 * 1024,
+        mmap_size=0,
+        synchronous="NORMAL",
+        temp_store="FILE",
+        journal_size_limit=4 * 1024 * 1024,
+        busy_timeout_ms=5000,
+    ),
+    "balanced": StorageProfile(
+        name="balanced",
+        cache_size_kib=16 * 1024,
+        mmap_size=64 * 1024 * 1024,
+        synchronous="NORMAL",
+        temp_store="MEMORY",
+        journal_size_limit=32 * 1024 * 1024,
+        busy_timeout_ms=5000,
+    ),
+    # 内存充足时：大缓存 + 大 mmap，热数据基本不经过 read() 系统调用
+    "throughput": StorageProfile(
+        name="throughput",
+        cache_size_kib=64 * 1024,
+        mmap_size=512 * 1024 * 1024,
+        synchronous="NORMAL",
+        temp_store="MEMORY",
+        journal_size_limit=128 * 1024 * 1024,
+        busy_timeout_ms=10000,
+    ),
+}
+
+# 自检时读取的实际生效参数
+_EFFECTIVE_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "journal_size_limit",
+    "busy_timeout",
+    "page_size",
+    "foreign_keys",
+    "auto_vacuum",
+)
+
+
+def effective_settings(sqlite_conn: sqlite3.Connection) -> dict[str, object]:
+    """读取连接上实际生效的参数（在 aiosqlite 工作线程中调用）。"""
+    return {
+        pragma: sqlite_conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        for pragma in _EFFECTIVE_PRAGMAS
+    }
+
+
+@dataclass
+class SelfCheckReport:
+    """启动自检的微基准结果（时间单位为毫秒）。"""
+
+    commit_p50_ms: float = 0.0
+    commit_max_ms: float = 0.0
+    bulk_insert_rows_per_s: float = 0.0
+    point_lookups_per_s: float = 0.0
+    sort_ms: float = 0.0
+    elapsed_ms: float = 0.0
+
+    def to_log_context(self) -> dict:
+        return {key: round(value, 3) for key, value in asdict(self).items()}
+
+
+def run_self_check(
+    db_name: str,
+    profile: StorageProfile,
+    commits: int = 30,
+    rows: int = 20_000,
+) -> SelfCheckReport:
+    """
+    在数据库旁边的临时文件上跑一组很短的微基准（在工作线程中调用），结束后删除临时文件：
+    单行提交的延迟（反映 fsync 开销）、批量插入、主键点查，以及一次需要临时 B 树的排序。
+    临时文件与数据库在同一个目录，使用同样的参数，测到的就是这台机器上这块盘的表现。
+    """
+    path = pathlib.Path(db_name).with_name(pathlib.Path(db_name).name + ".selfcheck")
+    report = SelfCheckReport()
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        for pragma in profile.pragmas():
+            conn.execute(pragma)
+        conn.execute(
+            "CREATE TABLE bench (id INTEGER PRIMARY KEY, owner INTEGER NOT NULL, payload TEXT)"
+        )
+
+        commit_ms: list[float] = []
+        for i in range(commits):
+            t = time.perf_counter()
+            conn.execute("BEGIN")
+            conn.execute("INSERT INTO bench (owner, payload) VALUES (?, ?)", (i, "x"))
+            conn.execute("COMMIT")
+            commit_ms.append((time.perf_counter() - t) * 1000)
+        commit_ms.sort()
+        report.commit_p50_ms = commit_ms[len(commit_ms) // 2]
+        report.commit_max_ms = commit_ms[-1]
+
+        rng = random.Random(0)
+        t = time.perf_counter()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO bench (owner, payload) VALUES (?, ?)",
+            ((rng.randrange(1_000_000), "payload") for _ in range(rows)),
+        )
+        conn.execute("COMMIT")
+        report.bulk_insert_rows_per_s = rows / max(time.perf_counter() - t, 1e-9)
+
+        t = time.perf_counter()
+        for _ in range(rows):
+            conn.execute(
+                "SELECT payload FROM bench WHERE id = ?", (rng.randint(1, rows),)
+            ).fetchone()
+        report.point_lookups_per_s = rows / max(time.perf_counter() - t, 1e-9)
+
+        t = time.perf_counter()
+        conn.execute("SELECT id FROM bench ORDER BY owner, payload").fetchall()
+        report.sort_ms = (time.perf_counter() - t) * 1000
+    finally:
+        conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            pathlib.Path(f"{path}{suffix}").unlink(missing_ok=True)
+    report.elapsed_ms = (time.perf_counter() - started) * 1000
+    return report
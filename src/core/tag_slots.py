@@ -0,0 +1,59 @@
+"""
+论坛频道标签的位槽（slot）分配。
+
+订阅的标签筛选存为整数位掩码：频道中的每个标签 ID 对应一个固定的位，新帖的标签先换算成掩码，
+判断时只需一次整数与运算。位槽一经分配就保持不变（已保存的掩码依赖它），
+只有全部用完时才回收论坛里已经删除的标签所占的位，回收时必须同时清除所有订阅中的这些位。
+"""
+
+from typing import Iterable
+
+# SQLite 的 INTEGER 是 64 位有符号整数，不使用符号位
+TAG_SLOT_COUNT = 63
+
+
+class TagSlotsExhausted(ValueError):
+    """频道中仍在使用的标签过多，没有可分配的位槽。"""
+
+
+def allocate_tag_slots(
+    slots: dict[int, int],
+    tag_ids: Iterable[int],
+    available_tag_ids: Iterable[int],
+) -> tuple[dict[int, int], dict[int, int]]:
+    """
+    为尚未分配位槽的 tag_ids 分配最小的空闲位。返回 (新增的 {tag_id: slot}, 回收的 {tag_id: slot})。
+    没有空闲位时回收不在 available_tag_ids（论坛当前的标签）中的标签；调用方负责持久化两部分结果，
+    并从所有订阅的掩码中清除回收的位。
+    """
+    missing = [tag_id for tag_id in dict.fromkeys(tag_ids) if tag_id not in slots]
+    if not missing:
+        return {}, {}
+    used = set(slots.values())
+    free = [slot for slot in range(TAG_SLOT_COUNT) if slot not in used]
+    reclaimed: dict[int, int] = {}
+    if len(free) < len(missing):
+        available = set(available_tag_ids) | set(missing)
+        reclaimed = {
+            tag_id: slot for tag_id, slot in slots.items() if tag_id not in available
+        }
+        free = sorted(free + list(reclaimed.values()))
+        if len(free) < len(missing):
+            raise TagSlotsExhausted("该频道可用于筛选的标签已达上限")
+    return dict(zip(missing, free)), reclaimed
+
+
+def tags_to_mask(slots: dict[int, int], tag_ids: Iterable[int]) -> int:
+    """标签 ID 换算为位掩码；没有分配位槽的标签没有任何订阅引用，直接忽略。"""
+    mask = 0
+    for tag_id in tag_ids:
+        slot = slots.get(tag_id)
+        if slot is not None:
+            mask |= 1 << slot
+    return mask
+
+
+def mask_to_tags(slots: dict[int, int], mask: int) -> list[int]:
+    """位掩码还原为标签 ID，按位槽顺序排列。"""
+    ordered = sorted(slots.items(), key=lambda item: item[1])
+    return [tag_id for tag_id, slot in ordered if mask >> slot & 1]
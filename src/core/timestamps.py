@@ -0,0 +1,25 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+# 时间戳转换层：数据库中所有时间列都存储为整数 Unix 毫秒时间戳 (UTC)，
+# 进出数据库时统一经过这里转换，业务代码只接触带时区的 datetime。
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MS = timedelta(milliseconds=1)
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """datetime 转换为毫秒时间戳。不带时区的 datetime 按 UTC 处理（与旧数据的存储约定一致）。"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // _ONE_MS
+
+
+def from_epoch_ms(value: int) -> datetime:
+    """毫秒时间戳转换为带 UTC 时区的 datetime。"""
+    return EPOCH + timedelta(milliseconds=value)
+
+
+def now_ms() -> int:
+    """当前时间的毫秒时间戳。"""
+    return time.time_ns() // 1_000_000
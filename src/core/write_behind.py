@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from src.core.repository import AuthorFollowRepository
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    延迟写入缓冲区，只用于允许最终一致的记账类写入：作者帖子记录（连同作者名称）、用户上次查看时间。
+    调用方只把数据放进内存并立即返回，后台任务定期（或积压达到上限时）把它们合并成
+    几条 executemany 在同一个事务中写入。同一个键在两次落盘之间只保留一份：
+    作者名称取最新值，帖子保留第一次记录（与 INSERT OR IGNORE 一致），查看时间取最大值。
+    关闭时会把剩余数据全部落盘。
+    """
+
+    def __init__(self, db: AuthorFollowRepository):
+        self.db = db
+        # 两次落盘之间的最长间隔（毫秒），以及触发提前落盘的积压条数
+        try:
+            self.flush_interval = (
+                float(os.getenv("DB_WRITE_BEHIND_INTERVAL_MS", "1000")) / 1000
+            )
+            self.max_pending = int(os.getenv("DB_WRITE_BEHIND_MAX_PENDING", "500"))
+        except (ValueError, TypeError):
+            self.flush_interval = 1.0
+            self.max_pending = 500
+        self._authors: dict[int, str] = {}
+        self._posts: dict[int, int] = {}
+        self._last_views: dict[int, datetime] = {}
+        # 正在落盘的上次查看时间：落盘完成前，读取时仍以它为准
+        self._flushing_last_views: dict[int, datetime] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._authors) + len(self._posts) + len(self._last_views)
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "延迟写入缓冲区已启动",
+            extra={
+                "flush_interval_ms": self.flush_interval * 1000,
+                "max_pending": self.max_pending,
+            },
+        )
+
+    def record_post(self, post_id: int, author_id: int, author_name: str) -> None:
+        """记录作者的新帖子，并顺带刷新作者名称。"""
+        self._authors[author_id] = author_name
+        self._posts.setdefault(post_id, author_id)
+        self._after_put()
+
+    def stamp_last_view(self, user_id: int, viewed_at: datetime) -> None:
+        current = self._last_views.get(user_id)
+        if current is None or viewed_at > current:
+            self._last_views[user_id] = viewed_at
+        self._after_put()
+
+    def pending_last_view(self, user_id: int) -> Optional[datetime]:
+        """尚未落盘（或正在落盘）的上次查看时间，没有时返回 None，此时以数据库中的值为准。"""
+        return self._last_views.get(user_id) or self._flushing_last_views.get(user_id)
+
+    def _after_put(self) -> None:
+        if self._closing:
+            # 关闭过程中仍可能有事件处理在收尾，数据留在缓冲区里，由关闭前的最后一次落盘写入
+            return
+        if self.pending_count >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """把缓冲区中的数据全部落盘，返回写入的行数。失败时数据放回缓冲区，等待下次重试。"""
+        async with self._flush_lock:
+            if not self.pending_count:
+                return 0
+            authors, self._authors = self._authors, {}
+            posts, self._posts = self._posts, {}
+            last_views, self._last_views = self._last_views, {}
+            self._flushing_last_views = last_views
+            rows = len(authors) + len(posts) + len(last_views)
+            started_at = time.perf_counter()
+            try:
+                async with self.db.unit_of_work():
+                    if authors:
+                        await self.db.upsert_authors_in_batch(list(authors.items()))
+                    if posts:
+                        await self.db.add_posts_in_batch(list(posts.items()))
+                    if last_views:
+                        await self.db.update_last_views_in_batch(
+                            list(last_views.items())
+                        )
+            except Exception:
+                self.failed_flushes += 1
+                self._restore(authors, posts, last_views)
+                logger.error(
+                    "延迟写入落盘失败，数据已放回缓冲区",
+                    extra={"rows": rows},
+                    exc_info=True,
+                )
+                raise
+            finally:
+                self._flushing_last_views = {}
+            self.flushed_rows += rows
+            logger.debug(
+                "延迟写入已落盘",
+                extra={
+                    "authors": len(authors),
+                    "posts": len(posts),
+                    "last_views": len(last_views),
+                    "elapsed_ms": round((time.perf_counter() - started_at) * 1000, 3),
+                },
+            )
+            return rows
+
+    def _restore(
+        self,
+        authors: dict[int, str],
+        posts: dict[int, int],
+        last_views: dict[int, datetime],
+    ) -> None:
+        # 落盘期间新放入的数据比放回的更新，不能被覆盖
+        for author_id, author_name in authors.items():
+            self._authors.setdefault(author_id, author_name)
+        for post_id, author_id in posts.items():
+            self._posts.setdefault(post_id, author_id)
+        for user_id, viewed_at in last_views.items():
+            current = self._last_views.get(user_id)
+            if current is None or viewed_at > current:
+                self._last_views[user_id] = viewed_at
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # 已在 flush 中记录，下一轮重试
+                pass
+
+    async def close(self) -> None:
+        """停止后台任务，并把缓冲区中剩余的数据全部落盘。"""
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.error(
+                "关闭时延迟写入落盘失败，缓冲区中的数据将丢失",
+                extra={"pending": self.pending_count},
+            )
+        logger.info(
+            "延迟写入缓冲区已停止",
+            extra={
+                "flushed_rows": self.flushed_rows,
+                "failed_flushes": self.failed_flushes,
+            },
+        )
@@ -0,0 +1,26 @@
+-- 迁移脚本：为所有热点查询添加（覆盖）索引
+-- version: 006
+
+-- followers: get_followers_for_author 在每个新帖子时按作者查找关注者，
+-- 原先只有 UNIQUE(user_id, author_id)，只能全表扫描
+CREATE INDEX IF NOT EXISTS idx_followers_author_user ON followers (author_id, user_id);
+
+-- author_posts: get_new_post_counts 按作者统计某个时间点之后的帖子数
+CREATE INDEX IF NOT EXISTS idx_author_posts_author_created ON author_posts (author_id, created_at);
+
+-- keyword_subscriptions: get_all_subscriptions_for_channel 按频道查找有效订阅
+CREATE INDEX IF NOT EXISTS idx_keyword_subscriptions_channel ON keyword_subscriptions (channel_id, is_subscribed);
+
+-- thread_favorites: 按用户 ORDER BY added_at 分页，rowid(id) 会隐式附加在索引末尾
+CREATE INDEX IF NOT EXISTS idx_thread_favorites_user_added ON thread_favorites (user_id, added_at);
+
+-- active_thread_members: 按 (user_id, guild_id) 查询用户所在帖子，覆盖 thread_id 和 thread_name；
+-- 它取代了只有 user_id 的旧索引
+CREATE INDEX IF NOT EXISTS idx_active_thread_members_user_guild ON active_thread_members (user_id, guild_id, thread_id, thread_name);
+DROP INDEX IF EXISTS idx_user_id;
+
+-- active_thread_members: 扫描器按服务器清空记录
+CREATE INDEX IF NOT EXISTS idx_active_thread_members_guild ON active_thread_members (guild_id);
+
+-- competition_subscriptions: 按比赛查找订阅者，原先只有 UNIQUE(user_id, competition_message_id)
+CREATE INDEX IF NOT EXISTS idx_competition_subscriptions_competition ON competition_subscriptions (competition_message_id, user_id);
@@ -0,0 +1,30 @@
+-- 迁移脚本：将关键词从 keyword_subscriptions 的 JSON 文本列拆分到规范化的 subscription_keywords 表
+-- version: 007
+
+-- 每一行是一个用户在某频道下的一个关注词或屏蔽词。
+-- 主键以 (channel_id, kind, keyword) 开头，新帖子匹配时可以按频道直接在索引上遍历该频道的所有关键词。
+CREATE TABLE IF NOT EXISTS subscription_keywords (
+    channel_id INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('followed', 'blocked')),
+    keyword TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, kind, keyword, user_id),
+    FOREIGN KEY (user_id, channel_id) REFERENCES keyword_subscriptions (user_id, channel_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- 按用户读取其在某频道下的关键词
+CREATE INDEX IF NOT EXISTS idx_subscription_keywords_user ON subscription_keywords (user_id, channel_id, kind);
+
+-- 按原样转换已有数据（服务层写入前已统一转为小写并去重）
+INSERT OR IGNORE INTO subscription_keywords (channel_id, kind, keyword, user_id)
+SELECT ks.channel_id, 'followed', j.value, ks.user_id
+FROM keyword_subscriptions ks, json_each(COALESCE(NULLIF(ks.followed_keywords, ''), '[]')) j
+WHERE j.type = 'text' AND j.value <> '';
+
+INSERT OR IGNORE INTO subscription_keywords (channel_id, kind, keyword, user_id)
+SELECT ks.channel_id, 'blocked', j.value, ks.user_id
+FROM keyword_subscriptions ks, json_each(COALESCE(NULLIF(ks.blocked_keywords, ''), '[]')) j
+WHERE j.type = 'text' AND j.value <> '';
+
+ALTER TABLE keyword_subscriptions DROP COLUMN followed_keywords;
+ALTER TABLE keyword_subscriptions DROP COLUMN blocked_keywords;
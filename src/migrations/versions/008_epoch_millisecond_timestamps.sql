@@ -0,0 +1,149 @@
+-- 迁移脚本：所有时间列改为整数 Unix 毫秒时间戳 (UTC)
+-- version: 008
+--
+-- 原先的时间以 Python 默认适配器生成的字符串存储（有的带 +00:00，有的不带，还有 CURRENT_TIMESTAMP 的格式），
+-- 读出时需要逐行解析；范围查询也是字符串比较。改为整数后比较和排序都是整数运算。
+-- 旧值统一用 julianday() 转换，它能识别以上所有格式；已经是整数的值保持不变，便于重复执行。
+-- 带 DEFAULT CURRENT_TIMESTAMP 的表需要重建才能修改默认值，重建期间临时关闭外键，避免 DROP TABLE 触发级联删除。
+
+PRAGMA foreign_keys = OFF;
+
+BEGIN;
+
+-- 保存自增序列，重建后恢复，保证已删除记录的 id 不会被重新使用
+CREATE TEMP TABLE saved_sequence AS SELECT name, seq FROM sqlite_sequence;
+
+-- 1. 无默认值的表：直接原地转换
+UPDATE author_posts
+SET created_at = COALESCE(CAST(round((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER), 0)
+WHERE typeof(created_at) <> 'integer';
+
+UPDATE user_last_view
+SET last_viewed_at = COALESCE(CAST(round((julianday(last_viewed_at) - 2440587.5) * 86400000) AS INTEGER), 0)
+WHERE typeof(last_viewed_at) <> 'integer';
+
+-- 2. authors
+CREATE TABLE authors_new (
+    author_id INTEGER PRIMARY KEY,
+    author_name TEXT,
+    created_at INTEGER DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER))
+);
+INSERT INTO authors_new (author_id, author_name, created_at)
+SELECT author_id, author_name,
+       CASE WHEN typeof(created_at) = 'integer' THEN created_at
+            ELSE CAST(round((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER) END
+FROM authors;
+DROP TABLE authors;
+ALTER TABLE authors_new RENAME TO authors;
+
+-- 3. followers
+CREATE TABLE followers_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    followed_at INTEGER DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+    UNIQUE(user_id, author_id),
+    FOREIGN KEY(author_id) REFERENCES authors(author_id) ON DELETE CASCADE
+);
+INSERT INTO followers_new (id, user_id, author_id, followed_at)
+SELECT id, user_id, author_id,
+       CASE WHEN typeof(followed_at) = 'integer' THEN followed_at
+            ELSE CAST(round((julianday(followed_at) - 2440587.5) * 86400000) AS INTEGER) END
+FROM followers;
+DROP TABLE followers;
+ALTER TABLE followers_new RENAME TO followers;
+CREATE INDEX IF NOT EXISTS idx_followers_author_user ON followers (author_id, user_id);
+
+-- 4. competitions（连同更新 updated_at 的触发器）
+CREATE TABLE competitions_new (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    last_submission_ids TEXT,
+    created_at INTEGER DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+    updated_at INTEGER DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER))
+);
+INSERT INTO competitions_new (message_id, channel_id, guild_id, last_submission_ids, created_at, updated_at)
+SELECT message_id, channel_id, guild_id, last_submission_ids,
+       CASE WHEN typeof(created_at) = 'integer' THEN created_at
+            ELSE CAST(round((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER) END,
+       CASE WHEN typeof(updated_at) = 'integer' THEN updated_at
+            ELSE CAST(round((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER) END
+FROM competitions;
+DROP TABLE competitions;
+ALTER TABLE competitions_new RENAME TO competitions;
+
+CREATE TRIGGER IF NOT EXISTS update_competitions_updated_at
+AFTER UPDATE ON competitions
+FOR EACH ROW
+BEGIN
+    UPDATE competitions
+    SET updated_at = CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)
+    WHERE message_id = OLD.message_id;
+END;
+
+-- 5. competition_subscriptions
+CREATE TABLE competition_subscriptions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    competition_message_id INTEGER NOT NULL,
+    subscribed_at INTEGER DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+    UNIQUE(user_id, competition_message_id),
+    FOREIGN KEY(competition_message_id) REFERENCES competitions(message_id) ON DELETE CASCADE
+);
+INSERT INTO competition_subscriptions_new (id, user_id, competition_message_id, subscribed_at)
+SELECT id, user_id, competition_message_id,
+       CASE WHEN typeof(subscribed_at) = 'integer' THEN subscribed_at
+            ELSE CAST(round((julianday(subscribed_at) - 2440587.5) * 86400000) AS INTEGER) END
+FROM competition_subscriptions;
+DROP TABLE competition_subscriptions;
+ALTER TABLE competition_subscriptions_new RENAME TO competition_subscriptions;
+CREATE INDEX IF NOT EXISTS idx_competition_subscriptions_competition ON competition_subscriptions (competition_message_id, user_id);
+
+-- 6. thread_favorites
+CREATE TABLE thread_favorites_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    thread_id INTEGER NOT NULL,
+    thread_name TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    added_at INTEGER NOT NULL DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+    UNIQUE(user_id, thread_id)
+);
+INSERT INTO thread_favorites_new (id, user_id, thread_id, thread_name, guild_id, added_at)
+SELECT id, user_id, thread_id, thread_name, guild_id,
+       CASE WHEN typeof(added_at) = 'integer' THEN added_at
+            ELSE COALESCE(CAST(round((julianday(added_at) - 2440587.5) * 86400000) AS INTEGER), 0) END
+FROM thread_favorites;
+DROP TABLE thread_favorites;
+ALTER TABLE thread_favorites_new RENAME TO thread_favorites;
+CREATE INDEX IF NOT EXISTS idx_thread_favorites_user_added ON thread_favorites (user_id, added_at);
+
+-- 7. active_thread_members
+CREATE TABLE active_thread_members_new (
+    thread_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL DEFAULT (CAST(round((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+    thread_name TEXT,
+    PRIMARY KEY (thread_id, user_id)
+);
+INSERT INTO active_thread_members_new (thread_id, user_id, guild_id, last_seen, thread_name)
+SELECT thread_id, user_id, guild_id,
+       CASE WHEN typeof(last_seen) = 'integer' THEN last_seen
+            ELSE COALESCE(CAST(round((julianday(last_seen) - 2440587.5) * 86400000) AS INTEGER), 0) END,
+       thread_name
+FROM active_thread_members;
+DROP TABLE active_thread_members;
+ALTER TABLE active_thread_members_new RENAME TO active_thread_members;
+CREATE INDEX IF NOT EXISTS idx_active_thread_members_user_guild ON active_thread_members (user_id, guild_id, thread_id, thread_name);
+CREATE INDEX IF NOT EXISTS idx_active_thread_members_guild ON active_thread_members (guild_id);
+
+-- 恢复自增序列
+DELETE FROM sqlite_sequence WHERE name IN (SELECT name FROM temp.saved_sequence);
+INSERT INTO sqlite_sequence (name, seq) SELECT name, seq FROM temp.saved_sequence;
+DROP TABLE temp.saved_sequence;
+
+COMMIT;
+
+PRAGMA foreign_keys = ON;
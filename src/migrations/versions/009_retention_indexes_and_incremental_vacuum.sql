@@ -0,0 +1,10 @@
+-- 迁移脚本：为数据保留清理任务添加时间索引
+-- version: 009
+
+-- 按时间批量删除过期数据时，直接在索引上定位最旧的一批记录
+CREATE INDEX IF NOT EXISTS idx_author_posts_created ON author_posts (created_at);
+CREATE INDEX IF NOT EXISTS idx_user_last_view_viewed ON user_last_view (last_viewed_at);
+
+-- 增量 VACUUM 不在这里开启：旧数据库切换 auto_vacuum 需要一次重写整个文件的全量 VACUUM，
+-- 不能放在启动流程中。新数据库在创建时开启（见 Database.connect），
+-- 旧数据库停机后执行 python -m src.core.maintenance enable-incremental-vacuum。
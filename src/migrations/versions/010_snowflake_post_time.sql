@@ -0,0 +1,11 @@
+-- 迁移脚本：帖子时间改由雪花 ID 推导，删除 author_posts.created_at
+-- version: 010
+
+-- post_id 是 Discord 帖子的雪花 ID，本身就按创建时间递增，
+-- “某时间之后的新帖子”可以直接写成主键范围查询，不再需要单独的时间列和时间索引。
+DROP INDEX IF EXISTS idx_author_posts_author_created;
+DROP INDEX IF EXISTS idx_author_posts_created;
+ALTER TABLE author_posts DROP COLUMN created_at;
+
+-- 索引条目末尾隐式带有 rowid（即 post_id），按作者定位后直接在索引上做 post_id 的范围扫描
+CREATE INDEX IF NOT EXISTS idx_author_posts_author ON author_posts (author_id);
@@ -0,0 +1,20 @@
+-- 迁移脚本：记录在线（后台分批）数据回填的进度
+-- version: 011
+--
+-- Python 迁移 (NNN_描述.py) 的结构变更在启动时执行，数据回填在机器人运行期间分批进行。
+-- 每一批的回填和这里的进度在同一个事务中提交，重启后从 cursor 继续；status 为 done 即完成标记。
+
+CREATE TABLE IF NOT EXISTS online_migrations (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    -- pending / running / done / failed
+    status TEXT NOT NULL DEFAULT 'pending',
+    -- 上一批返回的游标 (JSON)，NULL 表示尚未开始
+    cursor TEXT,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    batches INTEGER NOT NULL DEFAULT 0,
+    started_at INTEGER,
+    updated_at INTEGER,
+    completed_at INTEGER,
+    last_error TEXT
+);
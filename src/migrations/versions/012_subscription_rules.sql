@@ -0,0 +1,10 @@
+-- 迁移脚本：为频道订阅增加组合规则
+-- version: 012
+
+-- 规则的文本（已转为小写），例如 原创 AND (同人 OR 插画) NOT tag:r18；NULL 表示没有设置规则。
+-- 规则在服务层解析和判断，数据库只负责存取。设置了规则的订阅不再视为「接收全部帖子」。
+ALTER TABLE keyword_subscriptions ADD COLUMN rule TEXT;
+
+-- 没有启用内存索引时，新帖子按频道取出设置了规则的订阅逐条判断
+CREATE INDEX IF NOT EXISTS idx_keyword_subscriptions_rule
+    ON keyword_subscriptions (channel_id, user_id) WHERE rule IS NOT NULL;
@@ -0,0 +1,16 @@
+-- 迁移脚本：频道订阅按论坛标签 ID 筛选
+-- version: 013
+
+-- 每个频道中被筛选引用的标签 ID 与其位槽 (0-62) 的对应关系。位槽分配后保持不变，
+-- 订阅中的 include_tags / exclude_tags 按这里的位槽存为位掩码。
+CREATE TABLE IF NOT EXISTS channel_tag_slots (
+    channel_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    slot INTEGER NOT NULL CHECK (slot BETWEEN 0 AND 62),
+    PRIMARY KEY (channel_id, tag_id),
+    UNIQUE (channel_id, slot)
+) WITHOUT ROWID;
+
+-- include_tags 非 0 时，新帖至少要带有其中一个标签；带有 exclude_tags 中任一标签的新帖不通知
+ALTER TABLE keyword_subscriptions ADD COLUMN include_tags INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE keyword_subscriptions ADD COLUMN exclude_tags INTEGER NOT NULL DEFAULT 0;
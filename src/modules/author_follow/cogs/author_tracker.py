@@ -1,9 +1,7 @@
 from __future__ import annotations
 
-import asyncio
 import logging
 import os
-from datetime import datetime
 from typing import TYPE_CHECKING
 
 import discord
@@ -171,10 +169,9 @@ class AuthorTracker(commands.Cog):
                 logger.warning("无法找到作者用户对象", extra={"author_id": author_id})
                 return
 
-            # thread.created_at 可能为 None，使用当前时间作为后备
-            created_at = thread.created_at or datetime.now()
+            # 发帖时间由帖子的雪花 ID 推导，不再单独传递
             await self.author_follow_service.process_new_thread(
-                thread.id, author.id, author.name, created_at
+                thread.id, author.id, author.name
             )
             logger.info("服务层已处理新帖子", extra=log_context)
 
@@ -184,7 +181,9 @@ class AuthorTracker(commands.Cog):
             if not follower_ids:
                 return
 
-            await self.ghost_ping_users(thread, follower_ids)
+            self.bot.notification_dispatcher.submit(
+                thread, "author_follow", follower_ids
+            )
         except Exception:
             log_context = {"thread_id": thread.id, "guild_id": thread.guild.id}
             logger.error(
@@ -193,52 +192,6 @@ class AuthorTracker(commands.Cog):
                 exc_info=True,
             )
 
-    async def ghost_ping_users(self, thread: discord.Thread, user_ids: list[int]):
-        try:
-            initial_delay = int(os.getenv("GHOST_PING_INITIAL_DELAY_SECONDS", "5"))
-            chunk_size = int(os.getenv("GHOST_PING_CHUNK_SIZE", "50"))
-            chunk_delay = float(os.getenv("GHOST_PING_CHUNK_DELAY_SECONDS", "1.5"))
-        except (ValueError, TypeError):
-            initial_delay, chunk_size, chunk_delay = 5, 50, 1.5
-
-        log_context: dict[str, int | str | list[int]] = {
-            "thread_id": thread.id,
-            "guild_id": thread.guild.id,
-            "total_users": len(user_ids),
-            "chunk_size": chunk_size,
-            "delay": initial_delay,
-        }
-        logger.info("准备为作者关注者发送幽灵提及", extra=log_context)
-        await asyncio.sleep(initial_delay)
-
-        for i in range(0, len(user_ids), chunk_size):
-            chunk = user_ids[i : i + chunk_size]
-            ping_message = " ".join([f"<@{user_id}>" for user_id in chunk])
-            try:
-                message = await retry_on_discord_error(
-                    lambda: thread.send(ping_message),
-                    f"发送作者关注幽灵提及到频道 {thread.id}",
-                )
-                await retry_on_discord_error(
-                    lambda: message.delete(), f"删除作者关注幽灵提及在频道 {thread.id}"
-                )
-                log_context["chunk_user_ids"] = chunk
-                logger.info("成功为作者关注者发送幽灵提及", extra=log_context)
-            except discord.errors.DiscordServerError:
-                logger.error(
-                    f"为频道 {thread.id} 发送或删除作者关注幽灵提及最终失败",
-                    extra=log_context,
-                    exc_info=True,
-                )
-            except Exception:
-                log_context["chunk_user_ids"] = chunk
-                logger.error(
-                    "为作者关注发送幽灵提及失败", extra=log_context, exc_info=True
-                )
-
-            if len(user_ids) > chunk_size:
-                await asyncio.sleep(chunk_delay)
-
     @app_commands.command(
         name="关注本贴作者", description="关注当前帖子的作者以接收作者新帖子的更新通知"
     )
@@ -1,6 +1,12 @@
-from src.core.database import Database
+import logging
+
+from src.core.repository import AuthorFollowRepository
+from src.core.write_behind import WriteBehindBuffer
+from src.modules.author_follow.services.follower_index import FollowerIndex
 from enum import Enum
-from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
 
 class FollowResult(Enum):
     SUCCESS = 1
@@ -13,26 +19,56 @@ class UnfollowResult(Enum):
 
 # 2. 修改类名
 class AuthorFollowService:
-    def __init__(self, db: Database):
+    def __init__(
+        self,
+        db: AuthorFollowRepository,
+        write_behind: Optional[WriteBehindBuffer] = None,
+        follower_index: Optional[FollowerIndex] = None,
+    ):
         self.db = db
+        self.write_behind = write_behind
+        # 作者 → 关注者的内存索引；为 None 或尚未构建时查询数据库
+        self.follower_index = follower_index
+
+    async def build_follower_index(self):
+        """从数据库读出全部关注关系，构建内存关注者索引（启动时、处理事件之前调用一次）。"""
+        if self.follower_index is None:
+            return
+        edges = await self.db.get_all_follower_edges()
+        self.follower_index.load(edges)
+        logger.info("关注者索引构建完成", extra=self.follower_index.stats())
+
+    def get_follower_index_stats(self) -> Optional[dict]:
+        """关注者索引的命中率与内存占用，未启用索引时返回 None。"""
+        return self.follower_index.stats() if self.follower_index is not None else None
 
-    async def process_new_thread(self, thread_id: int, author_id: int, author_name: str, created_at: datetime):
+    async def process_new_thread(self, thread_id: int, author_id: int, author_name: str):
         """
         处理一个新帖子的完整业务逻辑：
         1. 确保作者存在
         2. 记录新帖子
+        两步在同一个事务中完成，只提交一次；启用了延迟写入时只放入缓冲区，不等待落盘。
         """
-        await self.db.ensure_author_exists(author_id, author_name)
-        await self.db.add_post(thread_id, author_id, created_at)
+        if self.write_behind is not None:
+            self.write_behind.record_post(thread_id, author_id, author_name)
+            return
+        async with self.db.unit_of_work():
+            await self.db.ensure_author_exists(author_id, author_name)
+            await self.db.add_post(thread_id, author_id)
 
     async def follow_author(self, user_id: int, author_id: int, author_name: str) -> FollowResult:
         if user_id == author_id:
             return FollowResult.CANNOT_FOLLOW_SELF
         success = await self.db.add_follower(user_id, author_id, author_name)
+        # 写入提交之后再更新索引，索引中不会出现数据库里没有的关注关系
+        if success and self.follower_index is not None:
+            self.follower_index.add(author_id, user_id)
         return FollowResult.SUCCESS if success else FollowResult.ALREADY_FOLLOWED
 
     async def unfollow_author(self, user_id: int, author_id: int) -> UnfollowResult:
         success = await self.db.remove_follower(user_id, author_id)
+        if success and self.follower_index is not None:
+            self.follower_index.remove(author_id, user_id)
         return UnfollowResult.SUCCESS if success else UnfollowResult.NOT_FOLLOWED
 
     async def get_user_follows(self, user_id: int) -> list[int]:
@@ -44,5 +80,9 @@ class AuthorFollowService:
         return await self.db.get_followed_authors_with_names(user_id)
 
     async def get_author_followers(self, author_id: int) -> list[int]:
-        """业务逻辑：获取作者的关注者列表"""
+        """业务逻辑：获取作者的关注者列表。索引已构建时直接从内存返回，不读数据库。"""
+        if self.follower_index is not None:
+            followers = self.follower_index.get(author_id)
+            if followers is not None:
+                return followers
         return await self.db.get_followers_for_author(author_id)
@@ -1,12 +1,9 @@
 import discord
 from discord.ext import commands
 import logging
-import os
-import asyncio
 from typing import List, TYPE_CHECKING
 
 # --- Service and View Imports ---
-from src.core.utils import retry_on_discord_error
 from src.modules.channel_subscription.services.subscription_service import (
     SubscriptionService,
 )
@@ -40,6 +37,19 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
                 )
         return channels
 
+    @staticmethod
+    def _tag_names(channel, tag_ids: list[int]) -> str:
+        """把标签 ID 显示为论坛中的标签名；标签已被删除时显示 ID。"""
+        names = []
+        for tag_id in tag_ids:
+            tag = (
+                channel.get_tag(tag_id)
+                if isinstance(channel, discord.ForumChannel)
+                else None
+            )
+            names.append(f"`{tag.name}`" if tag else f"`已删除的标签 {tag_id}`")
+        return ", ".join(names)
+
     async def create_subscription_embed(
         self, user_id: int, channel_id: int
     ) -> discord.Embed:
@@ -53,11 +63,13 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
             user_id, channel_id
         )
 
-        is_subscribed = (
-            subscription.get("is_subscribed", False) if subscription else False
+        is_subscribed = subscription.is_subscribed if subscription else False
+        followed_kws = subscription.followed_keywords if subscription else []
+        blocked_kws = subscription.blocked_keywords if subscription else []
+        rule = subscription.rule if subscription else None
+        include_tag_ids, exclude_tag_ids = await self.subscription_service.get_tag_filters(
+            user_id, channel_id
         )
-        followed_kws = subscription.get("followed_keywords", []) if subscription else []
-        blocked_kws = subscription.get("blocked_keywords", []) if subscription else []
 
         status_text = "✅ **已关注**" if is_subscribed else "❌ **未关注**"
 
@@ -67,8 +79,11 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
                 f"当前状态: {status_text}\n\n"
                 "**通知规则:**\n"
                 "1. **关键词模式**: 设置关注词后，仅当新帖标题或标签匹配时才会通知。\n"
-                "2. **全量模式**: 不设置任何关注词时，接收所有新帖通知。\n"
-                "3. **屏蔽词优先**: 任何匹配屏蔽词的帖子都**不会**被通知。"
+                "2. **组合规则**: 可以用 AND / OR / NOT、括号和 `tag:标签名` 组合条件，"
+                "满足规则的新帖也会通知（要把 and / or / not 本身当作词时请加双引号）。\n"
+                "3. **全量模式**: 不设置任何关注词和组合规则时，接收所有新帖通知。\n"
+                "4. **标签筛选**: 可以按论坛标签限定或排除新帖。\n"
+                "5. **屏蔽词优先**: 任何匹配屏蔽词的帖子都**不会**被通知。"
             ),
             color=discord.Color.blue(),
         )
@@ -76,7 +91,7 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
             name="✅ 关注的关键词 (匹配则通知)",
             value=f"`{'`, `'.join(followed_kws)}`"
             if followed_kws
-            else "未设置 (接收此频道全部通知)",
+            else ("未设置" if rule else "未设置 (接收此频道全部通知)"),
             inline=False,
         )
         embed.add_field(
@@ -84,7 +99,22 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
             value=f"`{'`, `'.join(blocked_kws)}`" if blocked_kws else "无",
             inline=False,
         )
-        embed.set_footer(text="使用下面的按钮来管理关键词或取消关注。")
+        embed.add_field(
+            name="🧩 组合规则 (满足则通知)",
+            value=f"`{rule}`" if rule else "无",
+            inline=False,
+        )
+        tag_lines = []
+        if include_tag_ids:
+            tag_lines.append(f"包含任一: {self._tag_names(channel, include_tag_ids)}")
+        if exclude_tag_ids:
+            tag_lines.append(f"排除: {self._tag_names(channel, exclude_tag_ids)}")
+        embed.add_field(
+            name="🏷️ 标签筛选",
+            value="\n".join(tag_lines) if tag_lines else "无 (不限标签)",
+            inline=False,
+        )
+        embed.set_footer(text="使用下面的按钮来管理关键词、组合规则、标签筛选或取消关注。")
         return embed
 
     async def send_main_subscription_view(
@@ -101,7 +131,7 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
             # 从 Discord API 获取频道对象
             subscribed_channels = []
             for sub_data in subscribed_channels_data:
-                channel = self.bot.get_channel(sub_data["channel_id"])
+                channel = self.bot.get_channel(sub_data.channel_id)
                 if channel:
                     subscribed_channels.append(channel)
 
@@ -149,7 +179,9 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
         try:
             users_to_notify = await self.subscription_service.process_new_thread(thread)
             if users_to_notify:
-                await self.ghost_ping_users(thread, users_to_notify)
+                self.bot.notification_dispatcher.submit(
+                    thread, "channel_subscription", users_to_notify
+                )
         except Exception:
             log_context = {"thread_id": thread.id, "guild_id": thread.guild.id}
             logger.error(
@@ -158,64 +190,6 @@ class SubscriptionTracker(commands.Cog, name="SubscriptionTracker"):
                 exc_info=True,
             )
 
-    async def ghost_ping_users(self, thread: discord.Thread, user_ids: list[int]):
-        try:
-            initial_delay = int(os.getenv("GHOST_PING_INITIAL_DELAY_SECONDS", "3"))
-            chunk_size = int(os.getenv("GHOST_PING_CHUNK_SIZE", "50"))
-            chunk_delay = float(os.getenv("GHOST_PING_CHUNK_DELAY_SECONDS", "1.5"))
-        except (ValueError, TypeError):
-            initial_delay, chunk_size, chunk_delay = 3, 50, 1.5
-
-        log_context = {
-            "thread_id": thread.id,
-            "guild_id": thread.guild.id,
-            "total_users": len(user_ids),
-            "chunk_size": chunk_size,
-            "delay": initial_delay,
-        }
-        logger.info("准备为频道订阅者发送幽灵提及", extra=log_context)
-        await asyncio.sleep(initial_delay)
-
-        for i in range(0, len(user_ids), chunk_size):
-            chunk = user_ids[i : i + chunk_size]
-            ping_message = " ".join([f"<@{user_id}>" for user_id in chunk])
-            try:
-                try:
-                    # 使用重试逻辑发送消息
-                    message = await retry_on_discord_error(
-                        lambda: thread.send(ping_message),
-                        operation_name=f"发送幽灵提及到频道 {thread.id} (Chunk {i // chunk_size + 1})",
-                    )
-                    # 使用重试逻辑删除消息
-                    await retry_on_discord_error(
-                        lambda: message.delete(),
-                        operation_name=f"删除幽灵提及在频道 {thread.id} (Chunk {i // chunk_size + 1})",
-                    )
-                    log_context["chunk_user_ids"] = chunk  # type: ignore
-                    logger.info("成功为频道订阅发送幽灵提及", extra=log_context)
-                except discord.errors.DiscordServerError:
-                    # 如果重试最终失败，只记录错误，不中断循环
-                    logger.error(
-                        f"为频道 {thread.id} 发送或删除幽灵提及最终失败",
-                        extra=log_context,
-                        exc_info=True,
-                    )
-            except discord.Forbidden:
-                logger.error(
-                    "因权限不足，为频道订阅发送幽灵提及失败",
-                    extra=log_context,
-                    exc_info=True,
-                )
-                break
-            except Exception:
-                log_context["chunk_user_ids"] = chunk  # type: ignore
-                logger.error(
-                    "为频道订阅发送幽灵提及失败", extra=log_context, exc_info=True
-                )
-
-            if len(user_ids) > chunk_size:
-                await asyncio.sleep(chunk_delay)
-
 
 async def setup(bot: "OdysseiaBot"):
     await bot.add_cog(SubscriptionTracker(bot))
@@ -0,0 +1,423 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+from src.core.row_models import KeywordSubscription
+from src.core.tag_slots import tags_to_mask
+from src.modules.channel_subscription.services.keyword_rules import (
+    Clause,
+    Term,
+    compile_stored_rule,
+)
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick 多模式匹配自动机：对文本扫描一遍，找出出现在其中的所有关键词（子串匹配）。
+    扫描耗时只与文本长度和命中数有关，与关键词数量无关。
+    """
+
+    __slots__ = ("_goto", "_fail", "_output")
+
+    def __init__(self, keywords: Iterable[str]):
+        goto: list[dict[str, int]] = [{}]
+        output: list[tuple[str, ...]] = [()]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            if state:
+                output[state] = (keyword,)
+
+        # 按广度优先（BFS）顺序计算失配指针，并把失配链上的输出合并进来
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                if output[fail[next_state]]:
+                    output[next_state] = output[next_state] + output[fail[next_state]]
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def find(self, text: str) -> set[str]:
+        """返回出现在 text 中的所有关键词。"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: set[str] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class SubscriberSettings(NamedTuple):
+    """索引中一位用户的订阅设置，只修改其中一部分时用 _replace 保留其余部分。"""
+
+    followed: frozenset[str]
+    blocked: frozenset[str]
+    rule: Optional[str] = None
+    include_tags: int = 0
+    exclude_tags: int = 0
+
+
+class _UserEntry(NamedTuple):
+    settings: SubscriberSettings
+    # 关注词和只有一个正向项的规则子句：命中该项即通知，直接走倒排表
+    terms: frozenset[Term]
+    # 其余规则子句：每个帖子按位运算判断一次
+    clauses: frozenset[Clause]
+
+
+class ChannelKeywordIndex:
+    """
+    一个频道内已关注用户的关键词索引：关注词和屏蔽词各自的倒排表（项 → 用户），
+    以及没有设置关注词和组合规则、接收全部通知的用户。
+    通知规则与数据库实现相同：屏蔽词优先 > 命中关注词或满足组合规则 > 全量订阅。
+
+    组合规则按析取范式拆成子句。关注词与只有一个正向项的子句（例如规则 “a OR b” 中的 a）
+    进入同一张倒排表；其余子句按内容去重，频道中所有用户共用。匹配时为每个帖子算出一个
+    「出现了哪些项」的位掩码，每个不同的子句只需一次与运算，与使用它的用户数无关。
+
+    标签筛选按频道的标签位槽存为掩码，设置相同 (include_tags, exclude_tags) 的用户归为一组，
+    每组对新帖的标签掩码只做一次与运算，不通过的整组从收件人中去掉。
+
+    用户修改关键词或规则时只按差异更新倒排表；只有频道的项或子句集合变化时，
+    才在下一次匹配前重建自动机和子句的位掩码。
+    version 在每次实际改变索引内容时加一，匹配结果可以据此对应到某个快照版本。
+    """
+
+    def __init__(self):
+        self._users: dict[int, _UserEntry] = {}
+        self._terms: dict[Term, set[int]] = {}
+        self._blocked: dict[str, set[int]] = {}
+        self._clauses: dict[Clause, set[int]] = {}
+        self._all_posts: set[int] = set()
+        # (include_tags, exclude_tags) → 用户，只包含设置了标签筛选的用户
+        self._tag_groups: dict[tuple[int, int], set[int]] = {}
+        self._tag_slots: dict[int, int] = {}
+        # 由上面的结构编译得到，失效时为 None
+        self._automaton: Optional[KeywordAutomaton] = None
+        self._term_bits: dict[Term, int] = {}
+        self._program: list[tuple[int, int, set[int]]] = []
+        self.version = 0
+        self.rebuilds = 0
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @property
+    def keyword_count(self) -> int:
+        terms = set(self._terms) | {("text", kw) for kw in self._blocked}
+        for clause in self._clauses:
+            terms |= clause.must | clause.must_not
+        return len(terms)
+
+    def get_user(self, user_id: int) -> Optional[SubscriberSettings]:
+        """已登记用户的订阅设置。"""
+        entry = self._users.get(user_id)
+        return entry.settings if entry is not None else None
+
+    def set_user(
+        self,
+        user_id: int,
+        followed: Iterable[str],
+        blocked: Iterable[str],
+        rule: Optional[str] = None,
+        include_tags: int = 0,
+        exclude_tags: int = 0,
+    ) -> None:
+        """登记一位已关注用户的订阅设置，或替换已登记用户的设置。关键词和规则应当已经转为小写。"""
+        settings = SubscriberSettings(
+            frozenset(kw for kw in followed if kw),
+            frozenset(kw for kw in blocked if kw),
+            rule,
+            include_tags,
+            exclude_tags,
+        )
+        previous = self._users.get(user_id)
+        if previous is not None and previous.settings == settings:
+            return
+        terms = {("text", kw) for kw in settings.followed}
+        clauses = set()
+        for clause in compile_stored_rule(rule) if rule is not None else ():
+            if len(clause.must) == 1 and not clause.must_not:
+                terms |= clause.must
+            else:
+                clauses.add(clause)
+        entry = _UserEntry(settings, frozenset(terms), frozenset(clauses))
+        self._users[user_id] = entry
+        self._update_postings(user_id, previous, entry)
+        if settings.followed or rule is not None:
+            self._all_posts.discard(user_id)
+        else:
+            self._all_posts.add(user_id)
+        self.version += 1
+
+    def remove_user(self, user_id: int) -> None:
+        """移除一位用户（取消关注频道）。"""
+        previous = self._users.pop(user_id, None)
+        if previous is None:
+            return
+        self._update_postings(user_id, previous, None)
+        self._all_posts.discard(user_id)
+        self.version += 1
+
+    def set_tag_slots(self, slots: dict[int, int]) -> None:
+        """
+        替换频道的标签位槽 {tag_id: slot}。被回收的位槽已经在数据库中从所有订阅里清除，
+        这里同样从各用户的掩码中清除，使索引与数据库一致。
+        """
+        freed = {
+            slot for tag_id, slot in self._tag_slots.items() if slots.get(tag_id) != slot
+        }
+        self._tag_slots = dict(slots)
+        if not freed:
+            return
+        keep = ~sum(1 << slot for slot in freed)
+        for user_id, entry in list(self._users.items()):
+            settings = entry.settings
+            if (settings.include_tags | settings.exclude_tags) & ~keep:
+                self.set_user(
+                    user_id,
+                    *settings._replace(
+                        include_tags=settings.include_tags & keep,
+                        exclude_tags=settings.exclude_tags & keep,
+                    ),
+                )
+
+    def _update_postings(
+        self, user_id: int, old: Optional[_UserEntry], new: Optional[_UserEntry]
+    ) -> None:
+        empty: frozenset = frozenset()
+        self._apply_delta(
+            self._terms, user_id, old.terms if old else empty, new.terms if new else empty
+        )
+        self._apply_delta(
+            self._blocked,
+            user_id,
+            old.settings.blocked if old else empty,
+            new.settings.blocked if new else empty,
+        )
+        self._apply_delta(
+            self._clauses,
+            user_id,
+            old.clauses if old else empty,
+            new.clauses if new else empty,
+        )
+        old_group = (old.settings.include_tags, old.settings.exclude_tags) if old else (0, 0)
+        new_group = (new.settings.include_tags, new.settings.exclude_tags) if new else (0, 0)
+        if old_group != new_group:
+            if old_group != (0, 0):
+                users = self._tag_groups[old_group]
+                users.discard(user_id)
+                if not users:
+                    del self._tag_groups[old_group]
+            if new_group != (0, 0):
+                self._tag_groups.setdefault(new_group, set()).add(user_id)
+
+    def _apply_delta(
+        self,
+        postings: dict,
+        user_id: int,
+        old: frozenset,
+        new: frozenset,
+    ) -> None:
+        """只在倒排表中增删两组键的差异部分；键的集合变化时使自动机和子句位掩码失效。"""
+        for key in old - new:
+            users = postings[key]
+            users.discard(user_id)
+            if not users:
+                del postings[key]
+                self._automaton = None
+        for key in new - old:
+            users = postings.get(key)
+            if users is None:
+                users = postings[key] = set()
+                self._automaton = None
+            users.add(user_id)
+
+    def _compile(self) -> KeywordAutomaton:
+        """重建自动机（所有需要在文本中查找的词）和每个子句的 (必须出现, 不能出现) 位掩码。"""
+        texts = set(self._blocked)
+        term_bits: dict[Term, int] = {}
+        program = []
+        for term in self._terms:
+            if term[0] == "text":
+                texts.add(term[1])
+        for clause, users in self._clauses.items():
+            masks = []
+            for terms in (clause.must, clause.must_not):
+                mask = 0
+                for term in terms:
+                    bit = term_bits.get(term)
+                    if bit is None:
+                        bit = term_bits[term] = 1 << len(term_bits)
+                        if term[0] == "text":
+                            texts.add(term[1])
+                    mask |= bit
+                masks.append(mask)
+            program.append((masks[0], masks[1], users))
+        self._term_bits = term_bits
+        self._program = program
+        self.rebuilds += 1
+        return KeywordAutomaton(texts)
+
+    def match(
+        self,
+        search_content: str,
+        exclude_user_id: int = 0,
+        tag_names: Iterable[str] = (),
+        tag_ids: Iterable[int] = (),
+    ) -> set[int]:
+        """
+        返回需要通知的用户。search_content 和 tag_names 应当已经转为小写；
+        tag_ids 是新帖标签的 ID，用于标签筛选。
+        """
+        if self._automaton is None:
+            self._automaton = self._compile()
+        hits = self._automaton.find(search_content)
+        present = [("text", kw) for kw in hits]
+        present.extend(("tag", name) for name in tag_names)
+
+        recipients = set(self._all_posts)
+        for term in present:
+            users = self._terms.get(term)
+            if users:
+                recipients |= users
+        if self._program:
+            term_bits = self._term_bits
+            mask = 0
+            for term in present:
+                mask |= term_bits.get(term, 0)
+            for must, must_not, users in self._program:
+                if mask & must == must and not mask & must_not:
+                    recipients |= users
+        for keyword in hits:
+            users = self._blocked.get(keyword)
+            if users:
+                recipients -= users
+        if self._tag_groups and recipients:
+            post_mask = tags_to_mask(self._tag_slots, tag_ids)
+            for (include, exclude), users in self._tag_groups.items():
+                if (include and not include & post_mask) or exclude & post_mask:
+                    recipients -= users
+        recipients.discard(exclude_user_id)
+        return recipients
+
+
+# 对频道索引的一次修改，频道正在加载时先排队，加载完成后按顺序重放
+ChannelIndexUpdate = Callable[[ChannelKeywordIndex], None]
+
+
+class SubscriptionMatcher:
+    """
+    各频道关键词索引的集合。频道在第一次有新帖时从数据库加载，之后由 SubscriptionService
+    在订阅写入成功后同步更新（write-through），匹配新帖不再读数据库。
+    """
+
+    def __init__(self):
+        self._channels: dict[int, ChannelKeywordIndex] = {}
+        # 正在加载的频道：(加载完成的 Future, 加载期间到达的修改)
+        self._loading: dict[
+            int, tuple[asyncio.Future, list[ChannelIndexUpdate]]
+        ] = {}
+        self.matches = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    async def channel(
+        self,
+        channel_id: int,
+        load: Callable[
+            [], Awaitable[tuple[list[KeywordSubscription], dict[int, int]]]
+        ],
+    ) -> ChannelKeywordIndex:
+        """取得频道的索引，尚未加载时调用 load 读取该频道的全部有效订阅和标签位槽来构建。"""
+        index = self._channels.get(channel_id)
+        if index is not None:
+            return index
+        loading = self._loading.get(channel_id)
+        if loading is not None:
+            return await asyncio.shield(loading[0])
+
+        future = asyncio.get_running_loop().create_future()
+        pending: list[ChannelIndexUpdate] = []
+        self._loading[channel_id] = (future, pending)
+        started_at = time.perf_counter()
+        try:
+            subscriptions, tag_slots = await load()
+        except BaseException as e:
+            del self._loading[channel_id]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # 没有其他等待者时避免 "exception was never retrieved" 警告
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        index = ChannelKeywordIndex()
+        index.set_tag_slots(tag_slots)
+        for subscription in subscriptions:
+            index.set_user(
+                subscription.user_id,
+                subscription.followed_keywords,
+                subscription.blocked_keywords,
+                subscription.rule,
+                subscription.include_tags,
+                subscription.exclude_tags,
+            )
+        # 加载读取的快照可能已经包含这些修改；每个修改都是幂等的，重放一遍即可
+        for update in pending:
+            update(index)
+        del self._loading[channel_id]
+        self._channels[channel_id] = index
+        self.loads += 1
+        self.load_seconds += time.perf_counter() - started_at
+        future.set_result(index)
+        return index
+
+    def update(self, channel_id: int, update: ChannelIndexUpdate) -> None:
+        """修改已加载（或正在加载）的频道索引；尚未加载的频道之后会从数据库读到最新数据，忽略即可。"""
+        index = self._channels.get(channel_id)
+        if index is not None:
+            update(index)
+            return
+        loading = self._loading.get(channel_id)
+        if loading is not None:
+            loading[1].append(update)
+
+    def is_indexed(self, channel_id: int) -> bool:
+        return channel_id in self._channels or channel_id in self._loading
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._channels),
+            "subscribers": sum(len(index) for index in self._channels.values()),
+            "keywords": sum(index.keyword_count for index in self._channels.values()),
+            "rebuilds": sum(index.rebuilds for index in self._channels.values()),
+            "versions": {
+                channel_id: index.version for channel_id, index in self._channels.items()
+            },
+            "matches": self.matches,
+            "loads": self.loads,
+            "load_seconds": round(self.load_seconds, 3),
+        }
@@ -0,0 +1,246 @@
+"""
+频道订阅的组合规则。
+
+语法（不区分大小写）：
+    原创 AND (同人 OR 插画) NOT tag:r18
+- 词：标题或标签中包含该词即为真（与关注词相同的子串匹配）；包含空格的词用双引号括起来。
+- tag:名称 ：帖子带有该名称的标签（完全匹配）；名称包含空格时写作 tag:"名称"。
+- AND / & 、OR / | 、NOT / - / ! ，以及括号。相邻的两项之间省略运算符时按 AND 处理。
+  优先级：NOT > AND > OR。
+- 运算符不区分大小写，所以要把 and / or / not 这几个英文单词本身当作词时，需要加双引号，如 "or"。
+
+规则先化为析取范式（若干个子句的 OR，每个子句是「必须出现的项」与「不能出现的项」），
+匹配时每个帖子只需计算一次各个项是否出现，就能用位运算判断任意子句。
+"""
+
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 项：("text", 词) 表示标题/标签中的子串，("tag", 名称) 表示帖子带有该标签
+Term = tuple[str, str]
+
+
+class Clause(NamedTuple):
+    """析取范式中的一个子句：must 中的项全部出现，且 must_not 中的项都不出现。"""
+
+    must: frozenset[Term]
+    must_not: frozenset[Term]
+
+
+# 一条规则可以展开成的最多子句数和最多不同项数，防止恶意或误写的规则展开过大
+MAX_CLAUSES = 32
+MAX_TERMS = 24
+MAX_RULE_LENGTH = 500
+
+
+class RuleSyntaxError(ValueError):
+    """规则无法解析或过于复杂，消息可以直接展示给用户。"""
+
+
+class _Not(NamedTuple):
+    operand: "_Node"
+
+
+class _And(NamedTuple):
+    operands: tuple["_Node", ...]
+
+
+class _Or(NamedTuple):
+    operands: tuple["_Node", ...]
+
+
+_Node = Union[Term, _Not, _And, _Or]
+
+_OPERATORS = {"and": "AND", "&": "AND", "or": "OR", "|": "OR", "not": "NOT"}
+
+
+def _tokenize(text: str) -> list[str]:
+    """切分为词、运算符和括号。双引号中的内容（可含空格）作为一个词。"""
+    tokens: list[str] = []
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i]
+        if char.isspace():
+            i += 1
+        elif char in "()&|":
+            tokens.append(char)
+            i += 1
+        elif char in "-!" and (i + 1 < length and not text[i + 1].isspace()):
+            # 紧贴在词前面的 - 或 ! 表示 NOT
+            tokens.append("not")
+            i += 1
+        elif text.startswith('tag:"', i):
+            end = text.find('"', i + 5)
+            if end == -1:
+                raise RuleSyntaxError("引号没有闭合")
+            tokens.append(text[i : end + 1])
+            i = end + 1
+        elif char == '"':
+            end = text.find('"', i + 1)
+            if end == -1:
+                raise RuleSyntaxError("引号没有闭合")
+            tokens.append(text[i : end + 1])
+            i = end + 1
+        else:
+            start = i
+            while i < length and not text[i].isspace() and text[i] not in '()&|"':
+                i += 1
+            tokens.append(text[start:i])
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _operator(self) -> str | None:
+        token = self._peek()
+        return _OPERATORS.get(token) if token is not None else None
+
+    def parse(self) -> _Node:
+        if not self.tokens:
+            raise RuleSyntaxError("规则为空")
+        node = self._parse_or()
+        if self._peek() is not None:
+            raise RuleSyntaxError(f"无法理解 “{self._peek()}” 附近的内容")
+        return node
+
+    def _parse_or(self) -> _Node:
+        operands = [self._parse_and()]
+        while self._operator() == "OR":
+            self.position += 1
+            operands.append(self._parse_and())
+        return operands[0] if len(operands) == 1 else _Or(tuple(operands))
+
+    def _parse_and(self) -> _Node:
+        operands = [self._parse_unary()]
+        while True:
+            operator = self._operator()
+            if operator == "AND":
+                self.position += 1
+            elif operator == "OR" or self._peek() in (None, ")"):
+                break
+            # 其余情况（词、NOT、左括号）是省略了 AND 的相邻项
+            operands.append(self._parse_unary())
+        return operands[0] if len(operands) == 1 else _And(tuple(operands))
+
+    def _parse_unary(self) -> _Node:
+        if self._operator() == "NOT":
+            self.position += 1
+            return _Not(self._parse_unary())
+        return self._parse_primary()
+
+    def _parse_primary(self) -> _Node:
+        token = self._peek()
+        if token is None:
+            raise RuleSyntaxError("规则不完整：运算符后面缺少内容")
+        if token == "(":
+            self.position += 1
+            node = self._parse_or()
+            if self._peek() != ")":
+                raise RuleSyntaxError("括号没有闭合")
+            self.position += 1
+            return node
+        if token == ")" or self._operator() is not None:
+            raise RuleSyntaxError(f"“{token}” 的位置不正确")
+        self.position += 1
+        return _term(token)
+
+
+def _term(token: str) -> Term:
+    if token.startswith('"'):
+        value = token[1:-1].strip()
+        kind = "text"
+    elif token.startswith("tag:"):
+        value = token[4:].strip().strip('"')
+        kind = "tag"
+    else:
+        value = token
+        kind = "text"
+    if not value:
+        raise RuleSyntaxError("规则中有空的词或标签")
+    return (kind, value)
+
+
+def _to_dnf(node: _Node, negate: bool = False) -> list[Clause]:
+    """把语法树展开为析取范式；NOT 用德摩根定律下推到项上。"""
+    if isinstance(node, tuple) and len(node) == 2 and isinstance(node[0], str):
+        term = node  # type: ignore[assignment]
+        if negate:
+            return [Clause(frozenset(), frozenset((term,)))]
+        return [Clause(frozenset((term,)), frozenset())]
+    if isinstance(node, _Not):
+        return _to_dnf(node.operand, not negate)
+    # NOT 作用在 AND 上变为 OR，反之亦然
+    is_and = isinstance(node, _And) != negate
+    parts = [_to_dnf(operand, negate) for operand in node.operands]
+    if not is_and:
+        clauses = [clause for part in parts for clause in part]
+    else:
+        clauses = [Clause(frozenset(), frozenset())]
+        for part in parts:
+            clauses = [
+                Clause(a.must | b.must, a.must_not | b.must_not)
+                for a in clauses
+                for b in part
+            ]
+            # 同时要求出现和不出现某一项的子句永远为假
+            clauses = [c for c in clauses if not c.must & c.must_not]
+            if len(clauses) > MAX_CLAUSES:
+                raise RuleSyntaxError("规则过于复杂，请拆分或简化")
+    unique = list(dict.fromkeys(clauses))
+    if len(unique) > MAX_CLAUSES:
+        raise RuleSyntaxError("规则过于复杂，请拆分或简化")
+    return unique
+
+
+def normalize_rule(text: str) -> str:
+    """规则的存储形式：转为小写并合并空白。"""
+    return " ".join(text.lower().split())
+
+
+def compile_rule(text: str) -> frozenset[Clause]:
+    """
+    解析规则并展开为子句集合。规则为真当且仅当至少一个子句为真；
+    空集合表示永远为假的规则（例如 “a AND NOT a”）。
+    """
+    text = normalize_rule(text)
+    if len(text) > MAX_RULE_LENGTH:
+        raise RuleSyntaxError(f"规则过长（最多 {MAX_RULE_LENGTH} 个字符）")
+    clauses = _to_dnf(_Parser(_tokenize(text)).parse())
+    terms = {term for c in clauses for term in c.must | c.must_not}
+    if len(terms) > MAX_TERMS:
+        raise RuleSyntaxError(f"规则中的词和标签过多（最多 {MAX_TERMS} 个）")
+    return frozenset(clauses)
+
+
+@lru_cache(maxsize=4096)
+def compile_stored_rule(rule: str) -> frozenset[Clause]:
+    """
+    编译已保存的规则并缓存结果（同一频道中常有多人使用相同的规则）。
+    写入前已经校验过；无法解析时（例如语法收紧后的旧规则）记录警告并视为永远为假。
+    """
+    try:
+        return compile_rule(rule)
+    except RuleSyntaxError:
+        logger.warning("无法解析已保存的订阅规则", extra={"rule": rule})
+        return frozenset()
+
+
+def clause_matches(clause: Clause, text: str, tags: set[str]) -> bool:
+    """直接对一个帖子判断子句（不经过位运算），用于没有启用内存索引时的数据库路径。"""
+
+    def present(term: Term) -> bool:
+        kind, value = term
+        return value in tags if kind == "tag" else value in text
+
+    return all(present(t) for t in clause.must) and not any(
+        present(t) for t in clause.must_not
+    )
@@ -1,15 +1,32 @@
 import discord
-from src.core.database import Database
+from src.core.repository import SubscriptionRepository
+from src.core.row_models import KeywordSubscription
+from src.core.tag_slots import mask_to_tags, tags_to_mask
+from src.modules.channel_subscription.services.keyword_matcher import (
+    SubscriptionMatcher,
+)
+from src.modules.channel_subscription.services.keyword_rules import (
+    clause_matches,
+    compile_rule,
+    compile_stored_rule,
+    normalize_rule,
+)
 from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 class SubscriptionService:
-    def __init__(self, db: Database):
+    def __init__(self, db: SubscriptionRepository, matcher: Optional[SubscriptionMatcher] = None):
         self.db = db
+        # 各频道关键词的内存索引（Aho-Corasick 自动机 + 倒排表）；为 None 时在数据库中匹配
+        self.matcher = matcher
 
-    async def get_subscription(self, user_id: int, channel_id: int) -> Optional[dict]:
+    def get_matcher_stats(self) -> Optional[dict]:
+        """关键词索引的统计，未启用时返回 None。"""
+        return self.matcher.stats() if self.matcher is not None else None
+
+    async def get_subscription(self, user_id: int, channel_id: int) -> Optional[KeywordSubscription]:
         """获取用户的关键词订阅设置。"""
         return await self.db.get_keyword_subscription(user_id, channel_id)
 
@@ -19,73 +36,166 @@ class SubscriptionService:
         followed = sorted(list(set([kw.lower() for kw in followed_keywords if kw])))
         blocked = sorted(list(set([kw.lower() for kw in blocked_keywords if kw])))
 
-        # 获取当前的订阅状态，如果不存在则默认为未订阅
-        current_sub = await self.get_subscription(user_id, channel_id)
-        is_subscribed = current_sub.get('is_subscribed', False) if current_sub else False
-
-        await self.db.upsert_keyword_subscription(user_id, channel_id, is_subscribed, followed, blocked)
+        # 关注状态由数据库在同一次原子写入中保留（不存在时视为未订阅），不需要先读出来
+        await self.db.set_subscription_keywords(user_id, channel_id, followed, blocked)
+        if self.matcher is not None:
+            # 只有已关注频道的用户在索引中；未关注的用户关注时会连同关键词一起登记
+            def replace_keywords(index):
+                current = index.get_user(user_id)
+                if current is not None:
+                    index.set_user(
+                        user_id, *current._replace(followed=followed, blocked=blocked)
+                    )
+
+            self.matcher.update(channel_id, replace_keywords)
         logger.info(f"用户 {user_id} 在频道 {channel_id} 的关键词已更新。")
 
+    async def update_rule(self, user_id: int, channel_id: int, rule_text: str) -> Optional[str]:
+        """
+        设置用户在频道下的组合规则，空文本表示清除。不改变关注状态和关键词。
+        规则无法解析时抛出 RuleSyntaxError，不做任何修改。返回保存的规则文本。
+        """
+        rule = normalize_rule(rule_text) or None
+        if rule is not None:
+            compile_rule(rule)
+
+        await self.db.set_subscription_rule(user_id, channel_id, rule)
+        if self.matcher is not None:
+            def replace_rule(index):
+                current = index.get_user(user_id)
+                if current is not None:
+                    index.set_user(user_id, *current._replace(rule=rule))
+
+            self.matcher.update(channel_id, replace_rule)
+        logger.info(f"用户 {user_id} 在频道 {channel_id} 的组合规则已更新。")
+        return rule
+
+    async def get_tag_filters(self, user_id: int, channel_id: int) -> tuple[list[int], list[int]]:
+        """用户在频道下的标签筛选，返回 (包含的标签 ID, 排除的标签 ID)。"""
+        subscription = await self.db.get_keyword_subscription(user_id, channel_id)
+        if subscription is None or not (subscription.include_tags or subscription.exclude_tags):
+            return [], []
+        slots = await self.db.get_channel_tag_slots(channel_id)
+        return (
+            mask_to_tags(slots, subscription.include_tags),
+            mask_to_tags(slots, subscription.exclude_tags),
+        )
+
+    async def update_tag_filters(
+        self,
+        user_id: int,
+        channel_id: int,
+        include_tag_ids: list[int],
+        exclude_tag_ids: list[int],
+        available_tag_ids: list[int],
+    ):
+        """
+        设置用户在频道下的标签筛选，不改变关注状态、关键词和规则。
+        标签先在频道的位槽表中分配固定的位，再以位掩码保存；available_tag_ids 是论坛当前的全部标签，
+        位槽用完时据此回收已删除的标签。频道可筛选的标签过多时抛出 TagSlotsExhausted。
+        """
+        async with self.db.unit_of_work():
+            slots = await self.db.assign_channel_tag_slots(
+                channel_id, [*include_tag_ids, *exclude_tag_ids], available_tag_ids
+            )
+            include_tags = tags_to_mask(slots, include_tag_ids)
+            exclude_tags = tags_to_mask(slots, exclude_tag_ids)
+            await self.db.set_subscription_tag_filters(
+                user_id, channel_id, include_tags, exclude_tags
+            )
+        if self.matcher is not None:
+            def replace_tag_filters(index):
+                index.set_tag_slots(slots)
+                current = index.get_user(user_id)
+                if current is not None:
+                    index.set_user(
+                        user_id,
+                        *current._replace(
+                            include_tags=include_tags, exclude_tags=exclude_tags
+                        ),
+                    )
+
+            self.matcher.update(channel_id, replace_tag_filters)
+        logger.info(f"用户 {user_id} 在频道 {channel_id} 的标签筛选已更新。")
+
     async def follow_channel(self, user_id: int, channel_id: int):
         """用户关注一个频道。这将保留现有的关键词设置。"""
-        current_sub = await self.get_subscription(user_id, channel_id)
-        followed_kws = current_sub.get('followed_keywords', []) if current_sub else []
-        blocked_kws = current_sub.get('blocked_keywords', []) if current_sub else []
-        
-        await self.db.upsert_keyword_subscription(user_id, channel_id, True, followed_kws, blocked_kws)
+        await self.db.set_channel_subscribed(user_id, channel_id, True)
+        if self.matcher is not None and self.matcher.is_indexed(channel_id):
+            subscription = await self.db.get_keyword_subscription(user_id, channel_id)
+            if subscription is not None and subscription.is_subscribed:
+                self.matcher.update(
+                    channel_id,
+                    lambda index: index.set_user(
+                        user_id,
+                        subscription.followed_keywords,
+                        subscription.blocked_keywords,
+                        subscription.rule,
+                        subscription.include_tags,
+                        subscription.exclude_tags,
+                    ),
+                )
         logger.info(f"用户 {user_id} 已关注频道 {channel_id}。")
 
     async def unfollow_channel(self, user_id: int, channel_id: int):
         """用户取消关注一个频道。这将保留现有的关键词设置。"""
-        current_sub = await self.get_subscription(user_id, channel_id)
         # If there's no record at all, there's nothing to do.
-        if not current_sub:
+        if not await self.db.set_channel_subscribed(user_id, channel_id, False):
             logger.warning(f"用户 {user_id} 尝试取消关注一个从未订阅过的频道 {channel_id}。")
             return
-
-        followed_kws = current_sub.get('followed_keywords', [])
-        blocked_kws = current_sub.get('blocked_keywords', [])
-
-        await self.db.upsert_keyword_subscription(user_id, channel_id, False, followed_kws, blocked_kws)
+        if self.matcher is not None:
+            self.matcher.update(channel_id, lambda index: index.remove_user(user_id))
         logger.info(f"用户 {user_id} 已取消关注频道 {channel_id}。")
 
     async def process_new_thread(self, thread: discord.Thread) -> list[int]:
         """
         处理一个新创建的帖子，根据用户的频道订阅设置返回需要通知的用户ID列表。
-        通知逻辑优先级: 屏蔽词 > 关键词 > 全量订阅
+        通知逻辑优先级: 屏蔽词 > 关键词或组合规则 > 全量订阅；此外新帖的标签必须通过用户的标签筛选。
         """
         channel_id = thread.parent_id
         thread_title = thread.name.lower()
         tag_names = {tag.name.lower() for tag in thread.applied_tags}
+        tag_ids = [tag.id for tag in thread.applied_tags]
         search_content = thread_title + " " + " ".join(tag_names)
 
-        subscriptions = await self.db.get_all_subscriptions_for_channel(channel_id)
-        if not subscriptions:
-            return []
-
-        users_to_notify = []
-        for sub in subscriptions:
-            user_id = sub['user_id']
-            
-            if user_id == thread.owner_id:
-                continue
-
-            followed_kws = sub.get('followed_keywords', [])
-            blocked_kws = sub.get('blocked_keywords', [])
-
-            # 1. 最高优先级：检查屏蔽词
-            if any(kw in search_content for kw in blocked_kws):
-                continue
-
-            # 2. 次高优先级：检查关注关键词 (如果设置了)
-            if followed_kws:
-                if any(kw in search_content for kw in followed_kws):
-                    users_to_notify.append(user_id)
-                continue # 如果设置了关注词但没匹配上，则不进入全量订阅逻辑
-
-            # 3. 默认行为：全量订阅 (如果未设置关注词)
-            else:
-                users_to_notify.append(user_id)
-                
+        if self.matcher is not None:
+            async def load_channel():
+                subscriptions = await self.db.get_all_subscriptions_for_channel(channel_id)
+                return subscriptions, await self.db.get_channel_tag_slots(channel_id)
+
+            # 扫描一遍标题和标签找出命中的关键词，再经倒排表得到用户，不读数据库
+            index = await self.matcher.channel(channel_id, load_channel)
+            users_to_notify = index.match(
+                search_content, thread.owner_id or 0, tag_names, tag_ids
+            )
+            self.matcher.matches += 1
+            logger.debug(
+                "频道订阅索引匹配完成",
+                extra={"channel_id": channel_id, "snapshot_version": index.version},
+            )
+        else:
+            # 屏蔽词 / 关注词 / 全量订阅的判断直接在数据库中通过关键词索引完成
+            users_to_notify = await self.db.get_channel_keyword_recipients(
+                channel_id,
+                search_content,
+                exclude_user_id=thread.owner_id or 0,
+                tag_ids=tag_ids,
+            )
+            # 组合规则在这里逐条判断（已排除命中屏蔽词和未通过标签筛选的用户）
+            rule_subscriptions = await self.db.get_channel_rule_subscriptions(
+                channel_id,
+                search_content,
+                exclude_user_id=thread.owner_id or 0,
+                tag_ids=tag_ids,
+            )
+            users_to_notify.extend(
+                user_id
+                for user_id, rule in rule_subscriptions
+                if any(
+                    clause_matches(clause, search_content, tag_names)
+                    for clause in compile_stored_rule(rule)
+                )
+            )
+
         logger.info(f"帖子 '{thread.name}' (ID: {thread.id}) 在频道 {channel_id} 中触发了对 {len(users_to_notify)} 位用户的通知。")
         return list(set(users_to_notify)) # 使用 set 去重以防万一
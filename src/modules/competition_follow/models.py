@@ -1,21 +1,11 @@
 # src/modules/competition_follow/models.py
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
-@dataclass
-class Competition:
-    """
-    代表一个被关注的比赛。
-    对应数据库中的 'competitions' 表。
-    """
-    message_id: int
-    channel_id: int
-    guild_id: int
-    last_submission_ids: list[str] = field(default_factory=list)
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
+# 比赛记录直接使用数据库层的紧凑行类型 (NamedTuple)，不再逐行转换为 dataclass
+from src.core.row_models import Competition
 
 @dataclass
 class Subscription:
@@ -2,7 +2,7 @@
 
 import discord
 from typing import Optional, Union
-from src.core.database import Database
+from src.core.repository import CompetitionRepository
 from src.modules.competition_follow.models import Competition
 
 
@@ -11,7 +11,7 @@ class FollowService:
     负责管理比赛关注、用户订阅和作品状态的数据库交互。
     """
 
-    def __init__(self, db: Database):
+    def __init__(self, db: CompetitionRepository):
         self.db = db
 
     async def follow_competition(
@@ -53,10 +53,7 @@ class FollowService:
         Returns:
             Optional[Competition]: 如果比赛被关注，返回比赛的数据模型对象；否则返回None。
         """
-        competition_dict = await self.db.get_competition_by_id(message_id)
-        if competition_dict:
-            return Competition(**competition_dict)
-        return None
+        return await self.db.get_competition_by_id(message_id)
 
     async def get_subscribers_for_competition(self, message_id: int) -> list[int]:
         """
@@ -72,8 +69,7 @@ class FollowService:
 
     async def get_all_followed_competitions(self) -> list[Competition]:
         """获取所有被关注的比赛列表。"""
-        competitions_data = await self.db.get_all_followed_competitions()
-        return [Competition(**data) for data in competitions_data]
+        return await self.db.get_all_followed_competitions()
 
 
 # 注意：这个服务需要在Cog中用 bot.db 实例来初始化。
@@ -1,20 +1,57 @@
 import discord
 import os
 import asyncio
-from src.core.database import Database
-from typing import List, Tuple
+from collections import OrderedDict
+from src.core.repository import FavoritesCursor, FavoritesRepository
+from src.core.row_models import ActiveThread, Favorite
+from typing import List, Optional, Tuple
 from datetime import datetime, timezone
 
+# 页边界索引最多缓存多少个用户，超出时淘汰最久未翻页的用户
+_PAGE_BOUNDARY_CACHE_USERS = 1024
+
 class FavoritesService:
-    def __init__(self, db: Database):
+    def __init__(self, db: FavoritesRepository):
         self.db = db
         # 为批量离开操作添加一个锁，以防止并发调用导致速率限制
         self.leave_lock = asyncio.Lock()
+        # 稀疏页边界索引缓存：{user_id: {page_size: [每页起始游标]}}，收藏变动时失效，按最近使用淘汰
+        self._page_boundaries: OrderedDict[int, dict[int, list[Optional[FavoritesCursor]]]] = OrderedDict()
+
+    def _invalidate_page_boundaries(self, user_id: int):
+        self._page_boundaries.pop(user_id, None)
+
+    async def get_user_favorites(self, user_id: int, page: int, page_size: int) -> list[Favorite]:
+        """
+        获取用户收藏夹的第 page 页（从 1 开始）。
+        通过缓存的页边界索引找到该页的起始游标，再用游标查询，不再使用 OFFSET 扫描。
+        """
+        if page <= 1:
+            return await self.db.get_user_favorites_after(user_id, page_size)
+
+        by_size = self._page_boundaries.get(user_id)
+        if by_size is None:
+            by_size = self._page_boundaries[user_id] = {}
+            while len(self._page_boundaries) > _PAGE_BOUNDARY_CACHE_USERS:
+                self._page_boundaries.popitem(last=False)
+        self._page_boundaries.move_to_end(user_id)
+        boundaries = by_size.get(page_size)
+        if boundaries is None:
+            boundaries = await self.db.get_user_favorites_page_boundaries(user_id, page_size)
+            # 查询期间收藏发生变动（缓存已失效）时，结果可能是旧数据，只用于本次，不写回缓存
+            if self._page_boundaries.get(user_id) is by_size:
+                by_size[page_size] = boundaries
+        if page > len(boundaries):
+            return []
+        return await self.db.get_user_favorites_after(user_id, page_size, boundaries[page - 1])
+
+    async def get_favorites_after(self, user_id: int, cursor: FavoritesCursor, page_size: int) -> list[Favorite]:
+        """获取游标之后（更早收藏）的一页，用于"下一页"。"""
+        return await self.db.get_user_favorites_after(user_id, page_size, cursor)
 
-    async def get_user_favorites(self, user_id: int, page: int, page_size: int) -> list[dict]:
-        """获取用户收藏夹的分页列表。"""
-        offset = (page - 1) * page_size
-        return await self.db.get_user_favorites_paginated(user_id, page_size, offset)
+    async def get_favorites_before(self, user_id: int, cursor: FavoritesCursor, page_size: int) -> list[Favorite]:
+        """获取游标之前（更新收藏）的一页，用于"上一页"。"""
+        return await self.db.get_user_favorites_before(user_id, page_size, cursor)
 
     async def get_favorites_count(self, user_id: int) -> int:
         """获取用户的收藏总数。"""
@@ -23,15 +60,18 @@ class FavoritesService:
     async def add_favorite(self, user_id: int, thread: discord.Thread) -> bool:
         """通过右键菜单等方式，添加单个收藏。"""
         now = datetime.now(timezone.utc)
-        return await self.db.add_favorite(user_id, thread.id, thread.name, thread.guild.id, now)
+        added = await self.db.add_favorite(user_id, thread.id, thread.name, thread.guild.id, now)
+        # 写入完成后再失效：写入排队期间的翻页可能用旧数据重建了索引
+        self._invalidate_page_boundaries(user_id)
+        return added
 
-    async def get_active_threads_for_user(self, user: discord.User, guild: discord.Guild) -> List[dict]:
+    async def get_active_threads_for_user(self, user: discord.User, guild: discord.Guild) -> List[ActiveThread]:
         """
         从数据库快速获取用户所在的活跃帖子的ID和名称，不执行API调用。
         """
         return await self.db.get_user_active_threads(user.id, guild.id)
 
-    async def get_unfavorited_threads_for_user(self, user: discord.User, guild: discord.Guild) -> List[dict]:
+    async def get_unfavorited_threads_for_user(self, user: discord.User, guild: discord.Guild) -> List[ActiveThread]:
         """
         从数据库快速获取用户已加入但尚未收藏的帖子列表（ID和名称），不执行API调用。
         """
@@ -57,12 +97,15 @@ class FavoritesService:
         
         if threads_to_favorite_data:
             await self.db.add_favorites_in_batch(threads_to_favorite_data)
+            self._invalidate_page_boundaries(user.id)
         
         return len(threads_to_favorite_data)
 
     async def remove_favorite(self, user_id: int, thread_id: int) -> bool:
         """移除单个收藏。"""
-        return await self.db.remove_favorite(user_id, thread_id)
+        removed = await self.db.remove_favorite(user_id, thread_id)
+        self._invalidate_page_boundaries(user_id)
+        return removed
 
     async def batch_unfavorite_threads(self, user_id: int, thread_ids: List[int]) -> int:
         """
@@ -73,6 +116,7 @@ class FavoritesService:
         
         # The database method should return the number of rows deleted.
         removed_count = await self.db.remove_favorites_in_batch(user_id, thread_ids)
+        self._invalidate_page_boundaries(user_id)
         return removed_count
 
     async def batch_leave_threads(self, user: discord.User, threads_to_leave: List[discord.Thread]) -> Tuple[int, int]:
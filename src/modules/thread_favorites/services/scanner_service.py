@@ -2,12 +2,12 @@ import os
 import discord
 import asyncio
 import logging
-from src.core.database import Database
+from src.core.repository import FavoritesRepository
 
 logger = logging.getLogger(__name__)
 
 class ActiveThreadScanner:
-    def __init__(self, bot, db: Database):
+    def __init__(self, bot, db: FavoritesRepository):
         self.bot = bot
         self.db = db
         self.task: asyncio.Task = None
@@ -8,7 +8,10 @@ from typing import TYPE_CHECKING, List, Optional, cast, Any
 
 from src.modules.thread_favorites.services.favorites_service import FavoritesService
 
+from src.core.row_models import ActiveThread, Favorite
+from src.core.tag_slots import TagSlotsExhausted
 from src.core.utils import retry_on_discord_error
+from src.modules.channel_subscription.services.keyword_rules import RuleSyntaxError
 
 if TYPE_CHECKING:
     from .profile_cog import UserProfileCog
@@ -368,14 +371,49 @@ class SubscriptionManageView(ui.View):
             SubscriptionModal(self, "blocked", edit_mode=True)
         )
 
-    @ui.button(label="返回频道列表", style=discord.ButtonStyle.primary, row=2)
+    @ui.button(label="🧩 编辑组合规则", style=discord.ButtonStyle.secondary, row=2)
+    async def edit_rule(self, interaction: discord.Interaction, button: ui.Button):
+        subscription = await self.service.get_subscription(
+            self.user_id, self.channel_id
+        )
+        current_rule = subscription.rule if subscription else None
+        await interaction.response.send_modal(
+            SubscriptionRuleModal(self, current_rule)
+        )
+
+    @ui.button(label="🏷️ 标签筛选", style=discord.ButtonStyle.secondary, row=2)
+    async def edit_tag_filters(
+        self, interaction: discord.Interaction, button: ui.Button
+    ):
+        channel = self.sub_cog.bot.get_channel(self.channel_id)
+        tags = (
+            list(channel.available_tags)
+            if isinstance(channel, discord.ForumChannel)
+            else []
+        )
+        if not tags:
+            await interaction.response.send_message(
+                "此频道没有可用的标签。", ephemeral=True
+            )
+            return
+        include_ids, exclude_ids = await self.service.get_tag_filters(
+            self.user_id, self.channel_id
+        )
+        view = TagFilterView(self, tags, include_ids, exclude_ids)
+        await interaction.response.send_message(
+            "选择标签：新帖需带有任一「包含」标签（不选则不限），带有任一「排除」标签的新帖不会通知。",
+            view=view,
+            ephemeral=True,
+        )
+
+    @ui.button(label="返回频道列表", style=discord.ButtonStyle.primary, row=3)
     async def back_to_channel_select(
         self, interaction: discord.Interaction, button: ui.Button
     ):
         # This now goes back to the main subscription menu
         await self.sub_cog.send_main_subscription_view(interaction, self.profile_cog)
 
-    @ui.button(label="❌ 取消关注此频道", style=discord.ButtonStyle.danger, row=2)
+    @ui.button(label="❌ 取消关注此频道", style=discord.ButtonStyle.danger, row=3)
     async def unfollow_channel(
         self, interaction: discord.Interaction, button: ui.Button
     ):
@@ -432,10 +470,13 @@ class SubscriptionModal(ui.Modal):
 
         current_sub = await self.service.get_subscription(
             self.user_id, self.channel_id
-        ) or {"followed_keywords": [], "blocked_keywords": []}
+        )
+        keywords = {
+            "followed": list(current_sub.followed_keywords) if current_sub else [],
+            "blocked": list(current_sub.blocked_keywords) if current_sub else [],
+        }
 
-        key = f"{self.keyword_type}_keywords"
-        current_keywords = set(current_sub.get(key, []))
+        current_keywords = set(keywords[self.keyword_type])
 
         if self.edit_mode:
             # 编辑模式：删除指定的关键词
@@ -444,14 +485,118 @@ class SubscriptionModal(ui.Modal):
             # 添加模式：合并关键词
             current_keywords.update(new_keywords_set)
 
-        current_sub[key] = list(current_keywords)
+        keywords[self.keyword_type] = list(current_keywords)
 
         await self.service.update_subscription(
             self.user_id,
             self.channel_id,
-            current_sub["followed_keywords"],
-            current_sub["blocked_keywords"],
+            keywords["followed"],
+            keywords["blocked"],
+        )
+        await self.parent_view.update_embed()
+
+
+class SubscriptionRuleModal(ui.Modal, title="编辑组合规则"):
+    def __init__(self, parent_view: SubscriptionManageView, current_rule: Optional[str]):
+        super().__init__()
+        self.parent_view = parent_view
+        self.service: "SubscriptionService" = parent_view.service
+        self.user_id = parent_view.user_id
+        self.channel_id = parent_view.channel_id
+
+        self.rule_input = ui.TextInput(
+            label="规则 (留空则清除)",
+            style=discord.TextStyle.paragraph,
+            placeholder='例如: 原创 AND (同人 OR 插画) NOT tag:r18\n把 and/or/not 本身当作词时加双引号，如 "or"；含空格的标签写作 tag:"标签名"',
+            default=current_rule,
+            required=False,
+            max_length=500,
         )
+        self.add_item(self.rule_input)
+
+    async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            await self.service.update_rule(
+                self.user_id, self.channel_id, self.rule_input.value
+            )
+        except RuleSyntaxError as e:
+            await interaction.followup.send(f"规则有误：{e}", ephemeral=True)
+            return
+        await self.parent_view.update_embed()
+
+
+class TagFilterView(ui.View):
+    """按论坛标签筛选频道订阅：两个多选菜单分别设置包含和排除的标签，每次选择后立即保存。"""
+
+    def __init__(
+        self,
+        parent_view: SubscriptionManageView,
+        tags: List[discord.ForumTag],
+        include_ids: List[int],
+        exclude_ids: List[int],
+    ):
+        timeout = int(os.getenv("SUBSCRIPTION_MANAGE_VIEW_TIMEOUT_SECONDS", "300"))
+        super().__init__(timeout=timeout)
+        self.parent_view = parent_view
+        self.service: "SubscriptionService" = parent_view.service
+        # Discord 论坛最多 20 个标签，不会超过下拉菜单 25 个选项的上限
+        self.tags = tags[:25]
+        # 论坛中已删除的标签不再显示，保存时一并去掉
+        tag_ids = {tag.id for tag in self.tags}
+        self.include_ids = [tag_id for tag_id in include_ids if tag_id in tag_ids]
+        self.exclude_ids = [tag_id for tag_id in exclude_ids if tag_id in tag_ids]
+
+        self.include_select = self._make_select(
+            "包含的标签 (不选则不限)", self.include_ids, 0
+        )
+        self.include_select.callback = self.on_include_change
+        self.exclude_select = self._make_select("排除的标签", self.exclude_ids, 1)
+        self.exclude_select.callback = self.on_exclude_change
+
+    def _make_select(
+        self, placeholder: str, selected: List[int], row: int
+    ) -> ui.Select:
+        options = [
+            discord.SelectOption(
+                label=tag.name[:100],
+                value=str(tag.id),
+                emoji=tag.emoji,
+                default=tag.id in selected,
+            )
+            for tag in self.tags
+        ]
+        select = ui.Select(
+            placeholder=placeholder,
+            options=options,
+            min_values=0,
+            max_values=len(options),
+            row=row,
+        )
+        self.add_item(select)
+        return select
+
+    async def on_include_change(self, interaction: discord.Interaction):
+        self.include_ids = [int(value) for value in self.include_select.values]
+        await self._save(interaction)
+
+    async def on_exclude_change(self, interaction: discord.Interaction):
+        self.exclude_ids = [int(value) for value in self.exclude_select.values]
+        await self._save(interaction)
+
+    async def _save(self, interaction: discord.Interaction):
+        await interaction.response.defer()
+        try:
+            await self.service.update_tag_filters(
+                self.parent_view.user_id,
+                self.parent_view.channel_id,
+                self.include_ids,
+                self.exclude_ids,
+                [tag.id for tag in self.tags],
+            )
+        except TagSlotsExhausted as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
         await self.parent_view.update_embed()
 
 
@@ -793,6 +938,8 @@ class FavoritesManageView(ui.View):
         self.user = user
         self.current_page = initial_page
         self.total_pages = 0
+        # 当前页的收藏数据；其首尾两条的游标用于上一页/下一页
+        self.favorites: Optional[List[Favorite]] = None
 
     async def send_initial_message(self, interaction: discord.Interaction):
         await self.update_view_internals()
@@ -864,10 +1011,36 @@ class FavoritesManageView(ui.View):
         back_button.callback = self.back_to_main_menu
         self.add_item(back_button)
 
+    async def _load_page(self, direction: Optional[str] = None):
+        """
+        加载当前页的收藏。
+        "next"/"prev" 从当前页首尾的游标出发做游标查询；
+        其他情况（首次打开、跳页、刷新）通过服务层的页边界索引直接定位 current_page。
+        """
+        if direction == "next" and self.favorites:
+            self.favorites = await self.favorites_service.get_favorites_after(
+                self.user.id, self.favorites[-1].cursor, FAVORITES_PAGE_SIZE
+            )
+        elif direction == "prev" and self.favorites:
+            favorites = await self.favorites_service.get_favorites_before(
+                self.user.id, self.favorites[0].cursor, FAVORITES_PAGE_SIZE
+            )
+            if len(favorites) < FAVORITES_PAGE_SIZE:
+                # 已经回到最前面（或期间有收藏变动），直接显示第一页以保持页面对齐
+                self.current_page = 1
+                favorites = await self.favorites_service.get_user_favorites(
+                    self.user.id, 1, FAVORITES_PAGE_SIZE
+                )
+            self.favorites = favorites
+        else:
+            self.favorites = await self.favorites_service.get_user_favorites(
+                self.user.id, self.current_page, FAVORITES_PAGE_SIZE
+            )
+
     async def create_favorites_embed(self) -> discord.Embed:
-        favorites = await self.favorites_service.get_user_favorites(
-            self.user.id, self.current_page, FAVORITES_PAGE_SIZE
-        )
+        if self.favorites is None:
+            await self._load_page()
+        favorites = self.favorites
 
         embed = discord.Embed(
             title=f"📜 {self.user.display_name} 的收藏夹",
@@ -883,11 +1056,11 @@ class FavoritesManageView(ui.View):
         else:
             for fav in favorites:
                 thread_link = (
-                    f"https://discord.com/channels/{fav['guild_id']}/{fav['thread_id']}"
+                    f"https://discord.com/channels/{fav.guild_id}/{fav.thread_id}"
                 )
                 embed.add_field(
-                    name=f"🏷️ {fav['thread_name']}",
-                    value=f"[点击跳转]({thread_link}) - 收藏于 <t:{int(fav['added_at'].timestamp())}:R>",
+                    name=f"🏷️ {fav.thread_name}",
+                    value=f"[点击跳转]({thread_link}) - 收藏于 <t:{int(fav.added_at.timestamp())}:R>",
                     inline=False,
                 )
 
@@ -897,6 +1070,7 @@ class FavoritesManageView(ui.View):
     async def prev_page_button(self, interaction: discord.Interaction):
         if self.current_page > 1:
             self.current_page -= 1
+            await self._load_page("prev")
             await self.update_view_internals()
             embed = await self.create_favorites_embed()
             await interaction.response.edit_message(embed=embed, view=self)
@@ -904,6 +1078,7 @@ class FavoritesManageView(ui.View):
     async def next_page_button(self, interaction: discord.Interaction):
         if self.current_page < self.total_pages:
             self.current_page += 1
+            await self._load_page("next")
             await self.update_view_internals()
             embed = await self.create_favorites_embed()
             await interaction.response.edit_message(embed=embed, view=self)
@@ -914,6 +1089,7 @@ class FavoritesManageView(ui.View):
 
     async def _jump_to_page(self, interaction: discord.Interaction, page: int):
         self.current_page = page
+        await self._load_page()
         await self.update_view_internals()
         embed = await self.create_favorites_embed()
         await interaction.response.edit_message(embed=embed, view=self)
@@ -951,6 +1127,7 @@ class FavoritesManageView(ui.View):
 
             await scanner_service.scan_guild(interaction.guild)
 
+            await self._load_page()
             await self.update_view_internals()
             embed = await self.create_favorites_embed()
             embed.description = "✅ **刷新成功！**\n\n" + (embed.description or "")
@@ -1012,7 +1189,7 @@ class FavoritesManageView(ui.View):
             self.profile_cog,
             self.favorites_service,
             self.user,
-            cast(List[dict[str, Any]], unfavorited_threads_data),
+            unfavorited_threads_data,
         )
         embed = view.create_embed()
         await interaction.edit_original_response(content="", embed=embed, view=view)
@@ -1078,7 +1255,7 @@ class BatchFavoriteConfirmView(ui.View):
         profile_cog: "UserProfileCog",
         favorites_service: FavoritesService,
         user: discord.User,
-        unfavorited_threads: List[Any],
+        unfavorited_threads: List[ActiveThread],
     ):
         timeout = int(os.getenv("BATCH_FAVORITE_CONFIRM_VIEW_TIMEOUT_SECONDS", "180"))
         super().__init__(timeout=timeout)
@@ -1118,10 +1295,10 @@ class BatchFavoriteConfirmView(ui.View):
         )
         # Display a few thread names as examples
         if self.unfavorited_threads:
-            # The data is now a list of dicts, not thread objects
-            threads_data = cast(List[dict[str, Any]], self.unfavorited_threads)
+            # The data is now a list of ActiveThread rows, not thread objects
+            threads_data = self.unfavorited_threads
             sample_threads = "\n".join(
-                f"- {t['thread_name']}" for t in threads_data[:5]
+                f"- {t.thread_name}" for t in threads_data[:5]
             )
             embed.add_field(name="帖子示例:", value=sample_threads, inline=False)
 
@@ -1143,8 +1320,8 @@ class BatchFavoriteConfirmView(ui.View):
         await interaction.response.edit_message(embed=processing_embed, view=self)
 
         # We need to fetch the thread objects before favoriting
-        threads_data = cast(List[dict[str, Any]], self.unfavorited_threads)
-        thread_ids_to_fetch = [t["thread_id"] for t in threads_data]
+        threads_data = self.unfavorited_threads
+        thread_ids_to_fetch = [t.thread_id for t in threads_data]
 
         guild = interaction.guild
         if guild is None:
@@ -1197,14 +1374,16 @@ class BatchFavoriteConfirmView(ui.View):
 
 
 class BatchUnfavoriteSelect(ui.Select):
-    def __init__(self, favorites_on_page: List[dict], previously_selected_ids: set):
+    def __init__(
+        self, favorites_on_page: List[Favorite], previously_selected_ids: set
+    ):
         options = []
         for fav in favorites_on_page:
             options.append(
                 discord.SelectOption(
-                    label=fav["thread_name"][:100],
-                    value=str(fav["thread_id"]),
-                    default=(fav["thread_id"] in previously_selected_ids),
+                    label=fav.thread_name[:100],
+                    value=str(fav.thread_id),
+                    default=(fav.thread_id in previously_selected_ids),
                 )
             )
 
@@ -1224,7 +1403,7 @@ class BatchUnfavoriteSelect(ui.Select):
             options=options,
             disabled=(not favorites_on_page),
         )
-        self.threads_on_this_page_ids = {fav["thread_id"] for fav in favorites_on_page}
+        self.threads_on_this_page_ids = {fav.thread_id for fav in favorites_on_page}
 
     async def callback(self, interaction: discord.Interaction):
         parent_view = cast("BatchUnfavoriteView", self.view)
@@ -1243,7 +1422,7 @@ class BatchUnfavoriteView(ui.View):
         profile_cog: "UserProfileCog",
         favorites_service: FavoritesService,
         user: discord.User,
-        all_favorites: List[dict],
+        all_favorites: List[Favorite],
     ):
         timeout = int(os.getenv("BATCH_UNFAVORITE_VIEW_TIMEOUT_SECONDS", "180"))
         super().__init__(timeout=timeout)
@@ -1261,7 +1440,7 @@ class BatchUnfavoriteView(ui.View):
         )
         self.update_components()
 
-    def get_current_page_favorites(self) -> List[dict]:
+    def get_current_page_favorites(self) -> List[Favorite]:
         start = self.current_page * self.PAGE_SIZE
         return self.all_favorites[start : start + self.PAGE_SIZE]
 
@@ -1408,12 +1587,14 @@ class BatchUnfavoriteView(ui.View):
 
 
 class BatchLeaveSelect(ui.Select):
-    def __init__(self, threads_data_on_page: List[dict], previously_selected_ids: set):
+    def __init__(
+        self, threads_data_on_page: List[ActiveThread], previously_selected_ids: set
+    ):
         options = []
         for t_data in threads_data_on_page:
             # Use the name from the DB if available, otherwise create a default name
-            thread_name = t_data.get("thread_name") or f"帖子ID: {t_data['thread_id']}"
-            thread_id = t_data["thread_id"]
+            thread_name = t_data.thread_name or f"帖子ID: {t_data.thread_id}"
+            thread_id = t_data.thread_id
             options.append(
                 discord.SelectOption(
                     label=thread_name[:100],
@@ -1438,7 +1619,7 @@ class BatchLeaveSelect(ui.Select):
             options=options,
             disabled=(not threads_data_on_page),
         )
-        self.threads_on_this_page_ids = {t["thread_id"] for t in threads_data_on_page}
+        self.threads_on_this_page_ids = {t.thread_id for t in threads_data_on_page}
 
     async def callback(self, interaction: discord.Interaction):
         parent_view = cast("BatchLeaveView", self.view)
@@ -1457,7 +1638,7 @@ class BatchLeaveView(ui.View):
         profile_cog: "UserProfileCog",
         favorites_service: FavoritesService,
         user: discord.User,
-        all_threads_data: List[dict],
+        all_threads_data: List[ActiveThread],
     ):
         timeout = int(os.getenv("BATCH_LEAVE_VIEW_TIMEOUT_SECONDS", "180"))
         super().__init__(timeout=timeout)
@@ -1475,7 +1656,7 @@ class BatchLeaveView(ui.View):
         )
         self.update_components()
 
-    def get_current_page_threads_data(self) -> List[dict]:
+    def get_current_page_threads_data(self) -> List[ActiveThread]:
         start = self.current_page * self.PAGE_SIZE
         return self.all_threads_data[start : start + self.PAGE_SIZE]
 